@@ -0,0 +1,177 @@
+"""
+MIT License
+
+Copyright (c) 2024 OPPO
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import argparse
+import numpy as np
+import os
+import sys
+import time
+import torch
+from typing import Dict, List, Tuple
+sys.path.append(os.getcwd())
+
+from src.slam.splatam.exploration_map import ExplorationMap
+from src.slam.splatam.sparse_exploration_map import SparseExplorationMap
+
+
+def argument_parsing() -> argparse.Namespace:
+    """parse arguments
+
+    Returns:
+        args: arguments
+
+    """
+    parser = argparse.ArgumentParser(
+            description="Benchmark per-frame ExplorationMap integration cost on a synthetic box room."
+        )
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu", help="device")
+    parser.add_argument("--num_frames", type=int, default=30, help="number of integrated frames")
+    parser.add_argument("--room_size", type=float, nargs=3, default=[7.4, 7.4, 4.0], help="room size (X, Y, Z). Unit: meter")
+    parser.add_argument("--voxel_size", type=float, default=0.05, help="voxel size. Unit: meter")
+    parser.add_argument("--surface_dist_thre", type=float, default=0.3, help="free space surface distance threshold. Unit: meter")
+    parser.add_argument("--img_hw", type=int, nargs=2, default=[340, 600], help="image height and width")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--ray_stride", type=int, default=4, help="pixel stride of the raycast integration mode")
+    parser.add_argument("--skip_brute_force", action="store_true", help="skip the brute-force free-space truncation baseline")
+    args = parser.parse_args()
+    return args
+
+
+def render_box_room_depth(c2w: torch.Tensor, room_size: List, hw: Tuple, intrinsics: torch.Tensor) -> torch.Tensor:
+    """ render z-depth of the inner walls of an axis-aligned box room [0, room_size]
+
+    Args:
+        c2w (torch.Tensor, [4,4])       : camera-to-world pose, RDF
+        room_size (List, [3])           : room size. Unit: meter
+        hw (Tuple)                      : image height and width
+        intrinsics (torch.Tensor, [3,3]): camera intrinsics
+
+    Returns:
+        depth (torch.Tensor, [H,W]): z-depth map
+    """
+    H, W = hw
+    v, u = torch.meshgrid(torch.arange(H, device=c2w.device), torch.arange(W, device=c2w.device), indexing='ij')
+    dirs_cam = torch.stack([
+        (u + 0.5 - intrinsics[0, 2]) / intrinsics[0, 0],
+        (v + 0.5 - intrinsics[1, 2]) / intrinsics[1, 1],
+        torch.ones_like(u, dtype=torch.float32)
+        ], dim=-1).reshape(-1, 3)
+    dirs_world = dirs_cam @ c2w[:3, :3].T
+    origin = c2w[:3, 3]
+
+    ### distance to the exit wall along each axis ###
+    bound = torch.tensor(room_size, device=c2w.device)
+    t_max = torch.where(dirs_world > 0, (bound - origin) / dirs_world, -origin / dirs_world)
+    t_max[dirs_world == 0] = float('inf')
+    t = t_max.min(dim=1)[0] # z-depth since dirs_cam[:, 2] == 1
+    return t.reshape(H, W)
+
+
+def sample_camera_pose(room_size: List, margin: float = 0.8) -> torch.Tensor:
+    """ sample a horizontal-looking camera pose inside the room
+
+    Args:
+        room_size (List, [3]): room size. Unit: meter
+        margin (float)       : margin to the walls. Unit: meter
+
+    Returns:
+        c2w (torch.Tensor, [4,4]): camera-to-world pose, RDF
+    """
+    loc = [np.random.uniform(margin, s - margin) for s in room_size[:2]] + [1.5]
+    yaw = np.random.uniform(0, 2 * np.pi)
+    forward = np.array([np.cos(yaw), np.sin(yaw), 0.])
+    down = np.array([0., 0., -1.])
+    right = np.cross(down, forward)
+    c2w = np.eye(4)
+    c2w[:3, 0], c2w[:3, 1], c2w[:3, 2], c2w[:3, 3] = right, down, forward, loc
+    return torch.from_numpy(c2w).float()
+
+
+def run_benchmark(explr_map: ExplorationMap, poses: List, depths: List, intrinsics: torch.Tensor, args: argparse.Namespace, update_kwargs: Dict) -> Dict:
+    """ integrate all frames and record per-frame timing
+
+    Args:
+        explr_map (ExplorationMap): exploration map
+        poses (List)              : camera-to-world poses
+        depths (List)             : depth maps
+        intrinsics (torch.Tensor) : camera intrinsics
+        args (argparse.Namespace) : arguments
+        update_kwargs (Dict)      : extra arguments for update_from_depth_map
+
+    Returns:
+        result (Dict): per-frame time (ms) and number of occupied voxels
+    """
+    result = {"time (ms)": [], "occupied": []}
+    for c2w, depth in zip(poses, depths):
+        if args.device.startswith("cuda"):
+            torch.cuda.synchronize()
+        t0 = time.time()
+        explr_map.update_from_depth_map(depth, intrinsics, torch.inverse(c2w), args.surface_dist_thre, find_free_indices_bs=1000, **update_kwargs)
+        if args.device.startswith("cuda"):
+            torch.cuda.synchronize()
+        result["time (ms)"].append((time.time() - t0) * 1000)
+        result["occupied"].append(int(explr_map.occupied_mask().sum()))
+    return result
+
+
+if __name__ == "__main__":
+    args = argument_parsing()
+    np.random.seed(args.seed)
+    H, W = args.img_hw
+    intrinsics = torch.tensor([[W / 2, 0, W / 2], [0, W / 2, H / 2], [0, 0, 1]], device=args.device).float()
+    bbox = [[0., args.room_size[0]], [0., args.room_size[1]], [0., args.room_size[2]]]
+
+    ##################################################
+    ### generate synthetic observations
+    ##################################################
+    poses = [sample_camera_pose(args.room_size).to(args.device) for _ in range(args.num_frames)]
+    depths = [render_box_room_depth(c2w, args.room_size, (H, W), intrinsics) for c2w in poses]
+
+    ##################################################
+    ### benchmark
+    ##################################################
+    ### variant name: (map class, map kwargs, update_from_depth_map kwargs) ###
+    variants = {
+        "frustum": (ExplorationMap, {"use_dist_field": True}, {"use_frustum_culling": True}),
+        "sparse": (SparseExplorationMap, {"use_dist_field": True}, {}),
+        "raycast": (ExplorationMap, {"use_dist_field": True}, {"integration_mode": "raycast", "ray_pixel_stride": args.ray_stride}),
+        "dist_field": (ExplorationMap, {"use_dist_field": True}, {"use_frustum_culling": False}),
+    }
+    if not args.skip_brute_force:
+        variants["brute_force"] = (ExplorationMap, {"use_dist_field": False}, {"use_frustum_culling": False})
+
+    results, explr_maps = {}, {}
+    for name, (map_cls, map_kwargs, update_kwargs) in variants.items():
+        explr_maps[name] = map_cls(bbox, args.voxel_size, args.device, use_xyz_filter=False,
+                                   dist_field_trunc=args.surface_dist_thre, **map_kwargs)
+        results[name] = run_benchmark(explr_maps[name], poses, depths, intrinsics, args, update_kwargs)
+
+    print(f"==> grid shape: {list(explr_maps['frustum'].occupancy_grid.shape)} | device: {args.device}")
+    print(f"{'frame':>6} {'occupied':>10} " + " ".join(f"{name + ' (ms)':>17}" for name in results))
+    for i in range(args.num_frames):
+        print(f"{i:>6} {results['dist_field']['occupied'][i]:>10} "
+              + " ".join(f"{results[name]['time (ms)'][i]:>17.2f}" for name in results))
+    for name in ["frustum", "sparse"]:
+        print(f"==> memory ({name}): {explr_maps[name].memory_report()}")
@@ -188,6 +188,9 @@ if __name__ == "__main__":
 
             timer.end(planner_state)
 
+            if main_cfg.planner.method == "active_gs":
+                slam.save_explr_map_snapshot(i)
+
             if planner.planning_state in ["refinement", "post_refinement"]:
                 if force_map_update:
                     slam.config['mapping']['num_iters'] = main_cfg.slam.refine_map_iter
@@ -202,6 +205,8 @@ if __name__ == "__main__":
     ### Save Final Mesh and Checkpoint
     ##################################################
     slam.print_and_save_result("final", ignore_first_frame=True)
+    if main_cfg.planner.method == "active_gs":
+        planner.sim_mask_cache.flush(force=True)
 
     ##################################################
     ### Runtime Analysis
@@ -22,7 +22,6 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-from collections import defaultdict
 import math
 import mmengine
 import numpy as np
@@ -37,8 +36,11 @@ from src.utils.general_utils import InfoPrinter
 from src.planner.rotation_planning import rotation_planning
 from src.data.pose_loader import PoseLoader
 from src.planner.rotation_planner_v2 import smoothen_trajectory_v2 as smoothen_trajectory
-
-from third_party.splatam.utils.slam_external import calc_psnr
+from src.slam.splatam.exploration_map import ExplorationMap
+from src.planner.sim_validity_cache import SimValidityMaskCache
+from src.planner.explore_pool import ExplorePool
+from src.planner.refine_pool import RefinePool
+from src.planner.visibility_index import CandidateVisibilityIndex
 
 
 def remove_consecutive_duplicates(array_list: List[np.ndarray]) -> List[np.ndarray]:
@@ -98,13 +100,43 @@ class ActiveGSPlanner(NarutoPlanner):
         self.refine_pose_set = self.generate_circular_trajectory(0.3, 0.1, refine_steps).numpy() # refine_pose-to-center 
 
         ### initialize explore and refine pool ###
-        self.explore_pool = defaultdict(lambda: {})
-        self.refine_pool = {}
+        self.explore_pool = ExplorePool(self.device)
+        self.refine_pool = RefinePool(
+            self.device, 
+            batch_size=self.planner_cfg.get("render_batch_size", 16), 
+            use_fp16=self.planner_cfg.get("refine_pool_fp16", False)
+            )
+
+        ### inverted voxel-block -> explore candidate index for cached exploration I.G. (if planner.use_visibility_index) ###
+        self.visibility_index = None
+        if self.planner_cfg.get("use_visibility_index", True):
+            self.visibility_index = CandidateVisibilityIndex(
+                block_size=self.planner_cfg.get("visibility_index_block_size", 8),
+                max_depth=self.planner_cfg.get("visibility_index_max_depth", 4.0),
+                batch_size=self.planner_cfg.get("render_batch_size", 16),
+                device=self.device,
+            )
         self.planning_state = "exploration"
         self.exploration_stage = 0
         self.num_exploration_stage = self.planner_cfg.num_exploration_stage
         self.first_done_exploration = False
 
+        ### frontier cluster parameters for restricting exploration candidates (if planner.frontier_radius is set) ###
+        self.frontier_cluster_cfg = dict(
+            cluster_size=self.planner_cfg.get("frontier_cluster_size", 0.5),
+            min_cluster_voxels=self.planner_cfg.get("frontier_min_cluster_voxels", 10),
+        )
+
+        ### simulator-validity mask cache (optionally persisted per scene in planner.sim_mask_cache_dir) ###
+        self.sim_mask_cache = SimValidityMaskCache(
+            cache_dir=self.planner_cfg.get("sim_mask_cache_dir", None),
+            downsample=self.planner_cfg.get("sim_mask_cache_downsample", 1),
+            flush_size=self.planner_cfg.get("sim_mask_cache_flush_size", 256),
+        )
+
+        ### coarse-to-fine exploration scoring statistics (if planner.explore_ig_coarse_scale is set) ###
+        self.coarse_ranking_stats = {"num_evals": 0, "num_goal_changed": 0}
+
         ### initialize view direction sampling ###
         self.num_dir_samples = self.planner_cfg.num_dir_samples
         self.view_rot_samples = []
@@ -507,28 +539,22 @@ class ActiveGSPlanner(NarutoPlanner):
 
         return transformed_points
 
-    def convert_occ_grid_to_sdf(self, occ_grid):
-        """
+    def convert_occ_grid_to_sdf(self, occ_grid: torch.Tensor) -> np.ndarray:
+        """ convert occupancy grid to SDF volume: occupied as surface (0), free space as +ve (100)
     
         Args:
-            occ_grid: [D,H,W]
+            occ_grid (torch.Tensor, [D,H,W]): int8 voxel states
     
         Returns:
-            
-    
-        Attributes:
-            
+            sdf_vol (np.ndarray, [D,H,W]): float32 SDF volume on CPU
         """
-        sdf_vol = occ_grid.clone()
-        sdf_vol[sdf_vol==1] = 0 # convert occupied to surface
-        sdf_vol[sdf_vol<0] = 100 # convert free space to +ve
-        # sdf_vol[sdf_vol==-1] = 100 # convert free space to +ve
-        return sdf_vol
+        return ExplorationMap.occ_grid_to_sdf(occ_grid, occupied_val=0., free_val=100.)
 
     def local_path_planning_rrt(self,
                          sdf_vol : np.ndarray,
                          cur_vxl: np.ndarray,
-                         goal_vxl: np.ndarray
+                         goal_vxl: np.ndarray,
+                         grid_offset: np.ndarray = None
                          ) -> Tuple:
         """ Path planning
     
@@ -536,6 +562,7 @@ class ActiveGSPlanner(NarutoPlanner):
             sdf_vol (np.ndarray, [X,Y,Z]): SDF volume
             cur_vxl (np.ndarray, [4,4]) : current vxl. 
             goal_vxl (np.ndarray, [3])   : goal location. Unit : voxel
+            grid_offset (np.ndarray, [3]): global voxel index of voxel (0,0,0). Used by persistent local planners
     
         Returns:
             path (List)             : each element is a Node. [GoalNode, ..., CurrentNode]
@@ -545,10 +572,12 @@ class ActiveGSPlanner(NarutoPlanner):
         #     sdf_vol = sdf_vol * 0. + 100.
         
         ## run local path planner ##
+        plan_kwargs = {"grid_offset": grid_offset} if self.local_planner.persistent else {}
         self.local_planner.start_new_plan(
             start = cur_vxl,
             goal = goal_vxl,
-            sdf_map = sdf_vol
+            sdf_map = sdf_vol,
+            **plan_kwargs
         )
         target_reachable = self.local_planner.run(use_free_space=True)
 
@@ -592,9 +621,10 @@ class ActiveGSPlanner(NarutoPlanner):
             ### local path planner ###
             sdf_vol = self.convert_occ_grid_to_sdf(map)
             path = self.local_path_planning_rrt(
-                                sdf_vol.detach().cpu().numpy(), 
+                                sdf_vol, 
                                 (start_loc/self.voxel_size).detach().cpu().numpy(), 
-                                (end_loc/self.voxel_size).detach().cpu().numpy()
+                                (end_loc/self.voxel_size).detach().cpu().numpy(),
+                                (origin/self.voxel_size).detach().cpu().numpy()
                                 )
             path *= self.voxel_size
             
@@ -653,9 +683,10 @@ class ActiveGSPlanner(NarutoPlanner):
                 self.path = [self.goal_pose]
             else:
                 self.timer.start(f"rrt_planning_{planner_state}", "Planner")
+                occ_grid, grid_origin = self.gs_slam.explr_map.export_dense_grid()
                 self.path = self.path_planning(
-                    self.gs_slam.explr_map.occupancy_grid,
-                    self.gs_slam.explr_map.origin,
+                    occ_grid,
+                    grid_origin,
                     cur_pose, 
                     self.goal_pose, 
                     self.planner_cfg.trans_step_size, 
@@ -764,42 +795,6 @@ class ActiveGSPlanner(NarutoPlanner):
         transformations[:, :, 3, 3] = 1
         return transformations
 
-    def generate_candidate_poses(self, 
-                                points: torch.Tensor, 
-                                transform_pose: torch.Tensor = None,
-                                ) -> torch.Tensor:
-        """
-        Generates NxKx4x4 candidate poses for N points in space with K evenly distributed viewing directions per point.
-
-        Args:
-            points (torch.Tensor): A Nx3 tensor representing the locations of N points in space.
-            transform_pose (torch.Tensor): 4x4 pose that transform all created poses
-
-        Returns:
-            torch.Tensor: An NxKx4x4 tensor where each 4x4 matrix represents a transformation for a viewing direction.
-        """
-        if points.ndim != 2 or points.shape[1] != 3:
-            raise ValueError("Input points tensor must be of shape Kx3.")
-
-        N = points.shape[0]  ### Number of input points
-        K = self.view_rot_samples[self.exploration_stage].shape[1]
-
-        transformations = self.view_rot_samples[self.exploration_stage].repeat(N, 1, 1, 1)
-        
-        ### Create the 4x4 transformation matrices ###
-        transformations[:, :, :3, 3] = points.unsqueeze(1).expand(-1, K, -1)  ### Set translation part
-        
-        # If transform_pose is provided, apply it to all generated poses
-        if transform_pose is not None:
-            # Ensure the transform_pose is a 4x4 tensor for matrix multiplication
-            assert transform_pose.shape == (4, 4), "transform_pose must be a 4x4 tensor."
-            # Apply the transformation to each pose using matrix multiplication
-            transformations[:, :, :3, 1] *= -1
-            transformations[:, :, :3, 2] *= -1 # RUB @ Sim
-            transformations = transform_pose @ transformations
-
-        return transformations
-
     def create_skybox_poses(self, 
                             points: torch.Tensor, 
                             up_direction: torch.Tensor, 
@@ -866,56 +861,92 @@ class ActiveGSPlanner(NarutoPlanner):
 
         return poses
 
-    def add_explore_pool_cand(self, cand_poses: torch.Tensor, cand_keys: torch.Tensor):
-        """ add candiate poses to explore pool
+    def get_explore_cand_locs(self, cand_keys: torch.Tensor) -> torch.Tensor:
+        """ candidate locations from candidate keys
+    
+        Args:
+            cand_keys (torch.Tensor, [N,4]): candidate key with elements [X, Y, Z, R_i]
+    
+        Returns:
+            cand_locs (torch.Tensor, [N,3]): candidate locations. SLAM world
+        """
+        explr_map = self.gs_slam.explr_map
+        locs_sim = explr_map.origin.to(self.device) + cand_keys[:, :3].float() * explr_map.voxel_size
+        sim2slam = explr_map.sim2slam.to(self.device)
+        return locs_sim @ sim2slam[:3, :3].T + sim2slam[:3, 3]
+
+    def get_explore_cand_poses(self, cand_keys: torch.Tensor) -> torch.Tensor:
+        """ materialize candidate poses from candidate keys: the view rotation sample R_i of the current exploration stage, placed at voxel [X, Y, Z]
+    
+        Args:
+            cand_keys (torch.Tensor, [N,4]): candidate key with elements [X, Y, Z, R_i]
+    
+        Returns:
+            cand_poses (torch.Tensor, [N,4,4]): candidate poses. Format: camera-to-world, RDF
+        """
+        explr_map = self.gs_slam.explr_map
+        cand_poses = self.view_rot_samples[self.exploration_stage][0][cand_keys[:, 3].long()] # N,4,4 (copy)
+        cand_poses[:, :3, 3] = explr_map.origin.to(self.device) + cand_keys[:, :3].float() * explr_map.voxel_size
+        cand_poses[:, :3, 1] *= -1
+        cand_poses[:, :3, 2] *= -1 # RUB @ Sim
+        return explr_map.sim2slam.to(self.device) @ cand_poses
+
+    def add_explore_pool_cand(self, cand_keys: torch.Tensor):
+        """ add candiates to explore pool. Only the keys are stored, poses are materialized on demand
     
         Args:
-            cand_poses: [N, 4, 4], candidate poses
             cand_keys: [N, 4], candidate key with elements [X, Y, Z, R_i]
         """
-        for i in range(cand_keys.shape[0]):
-            key = tuple(cand_keys[i].cpu().numpy())
-            if key not in self.explore_pool:
-                self.explore_pool[key]['pose'] = cand_poses[i]
+        self.explore_pool.add(cand_keys)
+        if self.visibility_index is not None:
+            pose_batch_size = self.planner_cfg.get("explore_pose_batch_size", 1024)
+            for i in range(0, cand_keys.shape[0], pose_batch_size):
+                self.visibility_index.add(
+                    self.gs_slam.explr_map, 
+                    self.get_explore_cand_poses(cand_keys[i:i+pose_batch_size]), 
+                    cand_keys[i:i+pose_batch_size], 
+                    self.explore_pool.linearize_keys(cand_keys[i:i+pose_batch_size]), 
+                    self.gs_slam.intrinsics, 
+                    (self.gs_slam.cam.image_height, self.gs_slam.cam.image_width)
+                    )
     
-    def update_explore_pool_cand(self, explore_igs: torch.Tensor, cand_keys: List[Tuple]):
+    def update_explore_pool_cand(self, explore_igs: torch.Tensor, cand_keys: torch.Tensor):
         """update explore pool candidates's explore_ig
     
         Args:
             explore_igs: [N], exploration information gain
-            cand_keys: candidate key with elements [X, Y, Z, R_i]
-            explore_thre: percentage of missing pixel thre
+            cand_keys: [N, 4], candidate key with elements [X, Y, Z, R_i]
         """
-        for i in range(len(explore_igs)):
-            self.explore_pool[cand_keys[i]]['ig'] = explore_igs[i]
+        self.explore_pool.update_igs(cand_keys, explore_igs)
 
-    def del_explore_pool_cand(self, explore_igs: torch.Tensor, cand_keys: List[Tuple], explore_thre: float):
+    def del_explore_pool_cand(self, explore_igs: torch.Tensor, cand_keys: torch.Tensor, explore_thre: float):
         """delete explore pool candidates that do not need more observations
     
         Args:
             explore_igs: [N], exploration information gain
-            cand_keys: candidate key with elements [X, Y, Z, R_i]
+            cand_keys: [N, 4], candidate key with elements [X, Y, Z, R_i]
             explore_thre: percentage of missing pixel thre
         """
-        rm_idx = torch.where(explore_igs < (self.img_h * self.img_w) * explore_thre)[0]
-        # rm_idx = torch.where(explore_igs == 0)[0]
-        for i in rm_idx:
-            del self.explore_pool[cand_keys[i]]
+        rm_mask = explore_igs < (self.img_h * self.img_w) * explore_thre
+        # rm_mask = explore_igs == 0
+        self.explore_pool.remove(cand_keys[rm_mask.to(cand_keys.device)])
+        if self.visibility_index is not None:
+            self.visibility_index.remove(self.explore_pool.linearize_keys(cand_keys[rm_mask.to(cand_keys.device)]))
     
-    def get_explore_pool_poses(self) -> Tuple[torch.Tensor, List[Tuple]]:
-        """ get exploration pool poses and keys
+    def del_explore_pool_cand_far_from_frontier(self, explr_map, frontier_radius: float):
+        """delete explore pool candidates that are not within frontier_radius of any frontier cluster
     
-        Returns:
-            cand_poses: [N, 4, 4], candidate poses
-            cand_keys: candidate key with elements [X, Y, Z, R_i]
+        Args:
+            explr_map (ExplorationMap): exploration map
+            frontier_radius: radius around frontier clusters. Unit: meter
         """
-        cand_poses = []
-        cand_keys = []
-        for key, val in self.explore_pool.items():
-            cand_poses.append(val['pose'])
-            cand_keys.append(key)
-        cand_poses = torch.stack(cand_poses)
-        return cand_poses, cand_keys
+        if len(self.explore_pool) == 0:
+            return
+        near_frontier_mask = explr_map.near_frontier_mask(self.explore_pool.keys[:, :3], frontier_radius, **self.frontier_cluster_cfg)
+        near_frontier_mask = near_frontier_mask.to(self.explore_pool.device)
+        if self.visibility_index is not None:
+            self.visibility_index.remove(self.explore_pool.lin_keys[~near_frontier_mask])
+        self.explore_pool.compact(near_frontier_mask)
 
     def add_refine_pool_cand(self, kf_data: List):
         """ add keyframe candidates to refinement pool
@@ -927,36 +958,26 @@ class ActiveGSPlanner(NarutoPlanner):
             refine_pool: add candidates to refine_pool
             
         """
+        selected_kfs = []
         for kf in kf_data:
             if self.step != 0:
                 sim_c2w = self.pose_conversion_slam2sim(torch.inverse(kf['est_w2c']))
                 kf_vxl = self.gs_slam.explr_map.transform_xyz_to_vxl(sim_c2w[:3, 3].unsqueeze(0))
-                min_dist = self.gs_slam.explr_map.compute_min_distance_from_occ(
-                    self.gs_slam.explr_map.occupancy_grid, 
-                    kf_vxl
-                    )[0]
+                min_dist = self.gs_slam.explr_map.query_dist_to_occ(kf_vxl)[0]
                 if min_dist * self.gs_slam.explr_map.voxel_size > self.planner_cfg.surface_dist_thre:
-                    self.refine_pool[kf['id']] = kf    
+                    selected_kfs.append(kf)
             else:
-                self.refine_pool[kf['id']] = kf
+                selected_kfs.append(kf)
+        self.refine_pool.add(selected_kfs)
     
-    def get_refine_pool_data(self) -> Tuple[List[Tuple], List[Tuple], torch.Tensor]:
+    def get_refine_pool_data(self) -> Tuple[List, torch.Tensor]:
         """ get refine pool data
     
         Returns:
-            cand_data: refinement candidate data
             cand_keys: refinement candidate key
-            cand_poses: refinement candidate poses
+            cand_poses: refinement candidate poses (cached in the refine pool)
         """
-        cand_data = []
-        cand_keys = []
-        cand_poses = []
-        for key, val in self.refine_pool.items():
-            cand_data.append(val)
-            cand_keys.append(key)
-            cand_poses.append(torch.inverse(val['est_w2c']))
-        cand_poses = torch.stack(cand_poses)
-        return cand_data, cand_keys, cand_poses
+        return list(self.refine_pool.keys), self.refine_pool.poses
 
     def del_refine_pool_cand(self, 
                              color_igs: torch.Tensor, 
@@ -976,8 +997,196 @@ class ActiveGSPlanner(NarutoPlanner):
 
         """
         rm_idx = torch.where((color_igs > target_psnr) * (depth_igs < target_rel_depth_err))[0]
-        for i in rm_idx:
-            del self.refine_pool[cand_keys[i]]
+        self.refine_pool.remove([cand_keys[i] for i in rm_idx.tolist()])
+
+    @torch.no_grad()
+    def compute_explore_igs(self, gs_slam, cand_keys: torch.Tensor, scale: float = None) -> torch.Tensor:
+        """ compute exploration information gain (number of unobserved pixels) for candidates with batched rendering.
+        Candidate poses are materialized per render batch
+    
+        Args:
+            gs_slam: 3DGS SLAM
+            cand_keys (torch.Tensor, [N,4]): candidate key with elements [X, Y, Z, R_i]
+            scale (float): render at a reduced resolution (proxy render). The pixel count is rescaled to full resolution. Full resolution if None
+    
+        Returns:
+            explore_igs (torch.Tensor, [N]): exploration information gain
+    
+        Attributes:
+            img_h (int): rendered image height
+            img_w (int): rendered image width
+            sim_mask_cache (SimValidityMaskCache): stores simulator-validity masks of new candidates
+        """
+        batch_size = self.planner_cfg.get("render_batch_size", 16)
+        cam = gs_slam.get_explore_cam(scale) if scale is not None else None
+        self.img_h, self.img_w = gs_slam.cam.image_height, gs_slam.cam.image_width
+        explore_igs = []
+        for i in range(0, len(cand_keys), batch_size):
+            ### render data from candidate poses ###
+            cand_poses = self.get_explore_cand_poses(cand_keys[i:i+batch_size])
+            imgs, _, valid_masks = gs_slam.render_batch(cand_poses, cam)
+            _, _, render_h, render_w = imgs.shape
+
+            ##################################################
+            ### Ignore Simulation environement incomplete region
+            # FIXME: this simulation is time consuming.
+            # However, it is not related to our method but the imperfect simulation data.
+            ##################################################
+            sim_poses = [self.pose_conversion_slam2sim(cand_pose).detach().cpu().numpy() for cand_pose in cand_poses]
+            compute_valid_sim_mask = lambda sim_pose: self.sim.simulate(sim_pose, no_print=True)['depth'] > 0.2 # 0.0 / 0.2 is the value that ignore rendering
+            if self.planner_cfg.get("cache_sim_mask", True):
+                valid_sim_masks = self.sim_mask_cache.get_or_compute(sim_poses, compute_valid_sim_mask, valid_masks.device)
+            else:
+                valid_sim_masks = torch.stack([compute_valid_sim_mask(sim_pose) for sim_pose in sim_poses]).to(valid_masks.device)
+            if (render_h, render_w) != (self.img_h, self.img_w):
+                valid_sim_masks = F.interpolate(valid_sim_masks[:, None].float(), (render_h, render_w), mode='nearest')[:, 0] > 0
+
+            ### compute EXPLORE I.G. ###
+            explore_igs.append(((valid_masks[:, 0] == 0) * valid_sim_masks).sum(dim=(1, 2)))
+        self.sim_mask_cache.flush()
+        explore_igs = torch.cat(explore_igs).float()
+        if scale is not None:
+            explore_igs = explore_igs * (self.img_h * self.img_w) / (render_h * render_w)
+        return explore_igs
+
+    @torch.no_grad()
+    def compute_voxel_explore_igs(self, gs_slam, cand_keys: torch.Tensor) -> torch.Tensor:
+        """ estimate exploration information gain (number of unobserved pixels) for candidates from the exploration map, without rendering
+    
+        Args:
+            gs_slam: 3DGS SLAM
+            cand_keys (torch.Tensor, [N,4]): candidate key with elements [X, Y, Z, R_i]
+    
+        Returns:
+            explore_igs (torch.Tensor, [N]): estimated exploration information gain. Unit: full-resolution pixels
+    
+        Attributes:
+            img_h (int): image height
+            img_w (int): image width
+        """
+        self.img_h, self.img_w = gs_slam.cam.image_height, gs_slam.cam.image_width
+        pose_batch_size = self.planner_cfg.get("explore_pose_batch_size", 1024)
+        explore_igs = []
+        for i in range(0, len(cand_keys), pose_batch_size):
+            explore_igs.append(gs_slam.explr_map.estimate_unobserved_pixels(
+                torch.inverse(self.get_explore_cand_poses(cand_keys[i:i+pose_batch_size])),
+                gs_slam.intrinsics,
+                (self.img_h, self.img_w),
+                image_scale=self.planner_cfg.get("voxel_ig_image_scale", 1 / 16),
+                unknown_stride=self.planner_cfg.get("voxel_ig_unknown_stride", 2),
+                max_depth=self.planner_cfg.get("voxel_ig_max_depth", None),
+                batch_size=self.planner_cfg.get("render_batch_size", 16),
+                ))
+        return torch.cat(explore_igs).to(cand_keys.device)
+
+    def get_dirty_explore_cands(self, gs_slam, cand_keys: torch.Tensor) -> torch.Tensor:
+        """ find candidates whose cached exploration I.G. may be outdated, i.e. never scored, 
+        or their view frustum intersects a region changed (voxels or new Gaussians) since they were scored, or they were scored more than explore_ig_cache_max_age map versions ago.
+        Uses the inverted visibility index if available, otherwise tests the candidate frustums against the changed regions
+    
+        Args:
+            gs_slam: 3DGS SLAM
+            cand_keys (torch.Tensor, [N,4]): candidate key with elements [X, Y, Z, R_i]
+    
+        Returns:
+            dirty_mask (torch.Tensor, [N]): candidates to be re-scored
+        """
+        explr_map = gs_slam.explr_map
+        ### Gaussian optimization/pruning is not logged as a map change; bound the age of cached I.G. ###
+        max_age = self.planner_cfg.get("explore_ig_cache_max_age", 20)
+        cand_versions = self.explore_pool.ig_versions[self.explore_pool.lookup(cand_keys)].to(cand_keys.device)
+
+        ### inverted index: latest change over the blocks covered by each candidate ###
+        if self.visibility_index is not None:
+            self.visibility_index.sync(explr_map)
+            change_versions = self.visibility_index.get_change_versions(self.explore_pool.linearize_keys(cand_keys)).to(cand_keys.device)
+            dirty_mask = (cand_versions < 0) | (cand_versions < self.visibility_index.reset_version) | (change_versions > cand_versions)
+            if max_age is not None:
+                dirty_mask |= explr_map.map_version - cand_versions > max_age
+            return dirty_mask
+
+        dirty_mask = torch.zeros(len(cand_keys), dtype=torch.bool, device=cand_keys.device)
+        image_hw = (gs_slam.cam.image_height, gs_slam.cam.image_width)
+
+        ### candidates scored at the same map version share the changed regions ###
+        for version in torch.unique(cand_versions).tolist():
+            group = torch.where(cand_versions == version)[0]
+            regions = explr_map.get_changed_regions(version) if version >= 0 else None
+            if regions is None or (max_age is not None and explr_map.map_version - version > max_age):
+                dirty_mask[group] = True
+            elif regions.shape[0] > 0:
+                dirty_mask[group] = explr_map.regions_in_frustums(
+                    regions, 
+                    gs_slam.intrinsics, 
+                    torch.inverse(self.get_explore_cand_poses(cand_keys[group])), 
+                    image_hw, 
+                    self.planner_cfg.get("explore_ig_cache_max_depth", None)
+                    )
+        return dirty_mask
+
+    def compute_explore_igs_cached(self, gs_slam, cand_keys: torch.Tensor, scale: float = None, store: bool = True) -> torch.Tensor:
+        """ compute exploration information gain, re-rendering only candidates affected by map changes since they were scored
+    
+        Args:
+            gs_slam: 3DGS SLAM
+            cand_keys (torch.Tensor, [N,4]): candidate key with elements [X, Y, Z, R_i]
+            scale (float): proxy render scale, see compute_explore_igs()
+            store (bool): store re-scored I.G. in the pool. Disabled for proxy (coarse) scores so that the pool only caches full-resolution I.G.
+    
+        Returns:
+            explore_igs (torch.Tensor, [N]): exploration information gain
+    
+        Attributes:
+            explore_pool: ig and ig_version (map version of the last scoring) of re-scored candidates (if store)
+        """
+        dirty_mask = self.get_dirty_explore_cands(gs_slam, cand_keys)
+        dirty_idx = torch.where(dirty_mask)[0]
+        explore_igs = self.explore_pool.igs[self.explore_pool.lookup(cand_keys)].to(cand_keys.device)
+        if dirty_idx.shape[0] > 0:
+            explore_igs[dirty_idx] = self.compute_explore_igs(gs_slam, cand_keys[dirty_idx], scale)
+            if store:
+                self.explore_pool.update_igs(cand_keys[dirty_idx], explore_igs[dirty_idx], gs_slam.explr_map.map_version)
+        self.info_printer(f"                            Exploration I.G. re-scored: {dirty_idx.shape[0]}/{len(cand_keys)}", self.step, self.__class__.__name__)
+        return explore_igs
+
+    def compute_explore_travel_costs(self, gs_slam, cur_pose: torch.Tensor, cand_keys: torch.Tensor) -> torch.Tensor:
+        """ travel cost from the current pose to candidates: geodesic distance over observed free space (if planner.use_geodesic_dist), 
+        straight-line distance otherwise
+    
+        Args:
+            gs_slam: 3DGS SLAM
+            cur_pose (torch.Tensor, [4,4]): current pose. Format: camera-to-world
+            cand_keys (torch.Tensor, [N,4]): candidate key with elements [X, Y, Z, R_i]
+    
+        Returns:
+            dists (torch.Tensor, [N]): travel cost. Unit: meter. inf if unreachable through observed free space
+        """
+        if not self.planner_cfg.get("use_geodesic_dist", True):
+            return torch.norm(self.get_explore_cand_locs(cand_keys) - cur_pose[:3, 3], dim=1)
+        explr_map = gs_slam.explr_map
+        cur_loc_sim = explr_map.slam2sim[:3, :3] @ cur_pose[:3, 3].to(explr_map.device) + explr_map.slam2sim[:3, 3]
+        geodesic_field = explr_map.compute_geodesic_field(
+            cur_loc_sim, 
+            stride=self.planner_cfg.get("geodesic_stride", 2), 
+            max_dist=self.planner_cfg.get("geodesic_max_dist", None)
+            )
+        cand_locs_sim = explr_map.origin + cand_keys[:, :3].to(explr_map.device).float() * explr_map.voxel_size
+        return explr_map.lookup_geodesic_field(geodesic_field, cand_locs_sim).to(cand_keys.device)
+
+    def update_coarse_ranking_stats(self, coarse_best: torch.Tensor, fine_best: torch.Tensor) -> None:
+        """ record how often the full-resolution re-scoring of the top-K changes the goal chosen by the coarse ranking
+    
+        Args:
+            coarse_best: index of the best candidate from coarse scores
+            fine_best: index of the best candidate after top-K re-scoring
+    
+        Attributes:
+            coarse_ranking_stats (Dict): number of coarse-to-fine evaluations and goal changes
+        """
+        self.coarse_ranking_stats["num_evals"] += 1
+        self.coarse_ranking_stats["num_goal_changed"] += int(coarse_best != fine_best)
+        num_evals, num_changed = self.coarse_ranking_stats["num_evals"], self.coarse_ranking_stats["num_goal_changed"]
+        self.info_printer(f"                            Coarse-to-fine goal changed: {num_changed}/{num_evals} ({num_changed / num_evals * 100:.1f}%)", self.step, self.__class__.__name__)
 
     def rendering_based_planning(self, 
                                  cur_pose,
@@ -1007,37 +1216,34 @@ class ActiveGSPlanner(NarutoPlanner):
             ### get exploration map (explored free space @ Sim coordinate system) ###
             gs_z_levels = self.gs_z_levels[self.exploration_stage]
             xy_sampling_step = self.planner_cfg.xy_sampling_step[self.exploration_stage]
-            new_free_voxels = gs_slam.explr_map.get_new_free_voxels(
+            ### new free voxels since the last query, then update previous_free_grid ###
+            new_free_voxels = gs_slam.explr_map.pop_new_free_voxels(
                 use_xyz_filter=True, 
                 xy_sampling_step=xy_sampling_step,
                 gs_z_levels=gs_z_levels
                 )
-            new_free_locs_sim = gs_slam.explr_map.origin + new_free_voxels * gs_slam.explr_map.voxel_size
 
-            ### update previous_free_grid ###
-            gs_z_levels = self.gs_z_levels[self.exploration_stage]
-            xy_sampling_step = self.planner_cfg.xy_sampling_step[self.exploration_stage]
-            gs_slam.explr_map.update_prev_free_voxels(
-                use_xyz_filter=True, 
-                xy_sampling_step=xy_sampling_step,
-                gs_z_levels=gs_z_levels
-                )
+            ### keep candidates near frontier clusters ###
+            frontier_radius = self.planner_cfg.get("frontier_radius", None)
+            if frontier_radius is not None:
+                near_frontier_mask = gs_slam.explr_map.near_frontier_mask(new_free_voxels, frontier_radius, **self.frontier_cluster_cfg)
+                new_free_voxels = new_free_voxels[near_frontier_mask]
+            new_free_locs_sim = gs_slam.explr_map.origin + new_free_voxels * gs_slam.explr_map.voxel_size
 
             ##################################################
             ### sample new candidates
             ##################################################
             ### sample poses (SplaTAM system) from free space ###
             if new_free_locs_sim.shape[0] != 0:
-                new_cand_poses = self.generate_candidate_poses(
-                                        new_free_locs_sim, 
-                                        gs_slam.explr_map.sim2slam
-                                        ).reshape(-1, 4, 4)
-
                 free_vxl_idx_exp = new_free_voxels.unsqueeze(1).repeat(1, self.num_dir_samples[self.exploration_stage], 1)
                 view_rot_idx_exp = self.view_rot_idx[self.exploration_stage].repeat(new_free_voxels.shape[0], 1, 1)
                 new_cand_pose_key = torch.cat([free_vxl_idx_exp, view_rot_idx_exp], dim=-1).reshape(-1, 4)
 
-                self.add_explore_pool_cand(new_cand_poses, new_cand_pose_key)
+                self.add_explore_pool_cand(new_cand_pose_key)
+
+            ### drop explore pool candidates that are far from frontier clusters ###
+            if frontier_radius is not None:
+                self.del_explore_pool_cand_far_from_frontier(gs_slam.explr_map, frontier_radius)
 
             ##################################################
             ### Exploration
@@ -1084,7 +1290,7 @@ class ActiveGSPlanner(NarutoPlanner):
                     ### reset exploration map ###
                     gs_z_levels = self.gs_z_levels[self.exploration_stage]
                     xy_sampling_step = self.planner_cfg.xy_sampling_step[self.exploration_stage]
-                    gs_slam.explr_map.prev_free_voxels = torch.empty(0, 3).to(self.device)
+                    gs_slam.explr_map.reset_prev_free_voxels()
 
                 # if not(self.first_done_exploration):
                 #     # self.gs_slam.print_and_save_result("exploration_prune", is_prune_gaussians=True)
@@ -1096,41 +1302,64 @@ class ActiveGSPlanner(NarutoPlanner):
             else:
                 self.info_printer(f"Current state: {self.state} | {self.planning_state}: Evaluate Exploration Candidate I.G.", self.step, self.__class__.__name__)
                 self.planning_state = "exploration"
-                ### Get EXPLORE POOL poses and keys ###
-                cand_poses, cand_keys = self.get_explore_pool_poses()
-                explore_igs = []
-
-                ### compute distance between current pose and candidate poses ###
-                dists = torch.norm(cand_poses[:, :3, 3] - cur_pose[:3, 3], dim=1) + 1e-6 # avoid zero dist case
+                ### Get EXPLORE POOL keys (poses are materialized on demand) ###
+                cand_keys = self.explore_pool.keys
+
+                ### compute travel cost between current pose and candidate poses, skip candidates unreachable through observed free space ###
+                dists = self.compute_explore_travel_costs(gs_slam, cur_pose, cand_keys)
+                reachable_mask = torch.isfinite(dists)
+                if reachable_mask.any():
+                    cand_keys, dists = cand_keys[reachable_mask], dists[reachable_mask]
+                else:
+                    dists = torch.norm(self.get_explore_cand_locs(cand_keys) - cur_pose[:3, 3], dim=1)
+                self.info_printer(f"                            Reachable candidates: {len(cand_keys)}/{len(self.explore_pool)}", self.step, self.__class__.__name__)
+
+                ### render-free voxel-visibility I.G. (planner.explore_ig_mode: render / voxel / voxel_prefilter) ###
+                explore_ig_mode = self.planner_cfg.get("explore_ig_mode", "render")
+                if explore_ig_mode == "voxel_prefilter":
+                    ### drop hopeless candidates and keep the top-K voxel-I.G. candidates for render-based scoring ###
+                    voxel_igs = self.compute_voxel_explore_igs(gs_slam, cand_keys)
+                    topk_idx = torch.topk(voxel_igs, min(self.planner_cfg.get("voxel_ig_prefilter_topk", 64), len(cand_keys)))[1]
+                    topk_mask = torch.zeros_like(voxel_igs, dtype=torch.bool)
+                    topk_mask[topk_idx] = True
+                    self.del_explore_pool_cand(voxel_igs[~topk_mask], cand_keys[~topk_mask.to(cand_keys.device)], self.planner_cfg.explore_thre)
+                    cand_keys, dists = cand_keys[topk_idx], dists[topk_idx]
+
+                dists = dists + 1e-6 # avoid zero dist case
                 dists_sm = torch.nn.functional.softmax(dists, dim=0)
-                for i, cand_pose in enumerate(cand_poses):
-                    ### render data from candidate pose ###
-                    img, depth, valid_mask = gs_slam.render(cand_pose)
-
-                    ##################################################
-                    ### Ignore Simulation environement incomplete region
-                    # FIXME: this simulation is time consuming.
-                    # However, it is not related to our method but the imperfect simulation data.
-                    ##################################################
-                    depth_gt = self.sim.simulate(self.pose_conversion_slam2sim(cand_pose).detach().cpu().numpy(), no_print=True)['depth']
-                    valid_sim_mask = depth_gt > 0.2 # 0.0 / 0.2 is the value that ignore rendering
-                    valid_mask[0][~valid_sim_mask] = True
-
-                    _, self.img_h, self.img_w = img.shape
-
-                    ### compute EXPLORE I.G. ###
-                    explore_ig = (valid_mask==0).sum()
-                    explore_igs.append(explore_ig)
+                ### coarse-to-fine: score all candidates with low-resolution proxy renders first (if planner.explore_ig_coarse_scale is set) ###
+                ### with caching, up-to-date candidates reuse their cached full-resolution I.G. and only outdated ones get coarse scores ###
+                coarse_scale = self.planner_cfg.get("explore_ig_coarse_scale", None)
+                cache_explore_ig = self.planner_cfg.get("cache_explore_ig", True) and explore_ig_mode != "voxel"
+                if explore_ig_mode == "voxel":
+                    coarse_scale = None
+                    explore_igs = self.compute_voxel_explore_igs(gs_slam, cand_keys)
+                elif cache_explore_ig:
+                    explore_igs = self.compute_explore_igs_cached(gs_slam, cand_keys, coarse_scale, store=coarse_scale is None)
+                else:
+                    explore_igs = self.compute_explore_igs(gs_slam, cand_keys, coarse_scale)
 
                 ### compute weighted exploration I.G., weighted by distance ###
-                explore_igs = torch.stack(explore_igs).float()
                 explore_igs_sm = torch.nn.functional.softmax(torch.log(explore_igs), dim=0)
                 weighted_explore_igs = (1 - dists_sm) * explore_igs_sm
-                new_pose = cand_poses[torch.argmax(weighted_explore_igs)]
+
+                ### re-score the top-K coarse candidates at full resolution ###
+                if coarse_scale is not None:
+                    coarse_best = torch.argmax(weighted_explore_igs)
+                    topk_idx = torch.topk(weighted_explore_igs, min(self.planner_cfg.get("explore_ig_topk", 10), len(cand_keys)))[1]
+                    if cache_explore_ig:
+                        explore_igs[topk_idx] = self.compute_explore_igs_cached(gs_slam, cand_keys[topk_idx])
+                    else:
+                        explore_igs[topk_idx] = self.compute_explore_igs(gs_slam, cand_keys[topk_idx])
+                    explore_igs_sm = torch.nn.functional.softmax(torch.log(explore_igs), dim=0)
+                    weighted_explore_igs = (1 - dists_sm) * explore_igs_sm
+                    self.update_coarse_ranking_stats(coarse_best, torch.argmax(weighted_explore_igs))
+                new_pose = self.get_explore_cand_poses(cand_keys[torch.argmax(weighted_explore_igs)][None])[0]
                 # print("Best pose px num: ", explore_igs[torch.argmax(weighted_explore_igs)])
 
-                ### update explore pool ###
-                self.update_explore_pool_cand(explore_igs, cand_keys)
+                ### update explore pool (already up to date with full-resolution I.G. if cached) ###
+                if not cache_explore_ig:
+                    self.update_explore_pool_cand(explore_igs, cand_keys)
 
                 ### remove explored view from EXPLORE POOL
                 self.del_explore_pool_cand(explore_igs, cand_keys, self.planner_cfg.explore_thre)
@@ -1152,27 +1381,15 @@ class ActiveGSPlanner(NarutoPlanner):
             self.add_refine_pool_cand(selected_kf_list)
 
             ### render poses in REFINE_POOL ###
-            cand_data, cand_keys, cand_poses = self.get_refine_pool_data()
+            cand_keys, cand_poses = self.get_refine_pool_data()
             refine_igs = []
-            color_igs = []
-            depth_igs = []
 
             ### compute distance between current pose and candidate poses ###
             dists = torch.norm(cand_poses[:, :3, 3] - cur_pose[:3, 3], dim=1) + 1e-6 # avoid zero dist case
             dists_sm = torch.nn.functional.softmax(dists, dim=0)
-            for i, cand_pose in enumerate(cand_poses):
-                color, depth, valid_mask = gs_slam.render(cand_pose)
-
-                ### compute REFINE I.G. ###
-                valid_depth_mask = cand_data[i]['depth'] > 0
-                color_ig = calc_psnr(color*valid_depth_mask, cand_data[i]['color']*valid_depth_mask).mean()
-                color_igs.append(color_ig)
-                depth_ig = (torch.abs(depth*valid_depth_mask - cand_data[i]['depth']*valid_depth_mask)/(cand_data[i]['depth']+1e-8)).sum() / valid_depth_mask.sum() 
-                depth_igs.append(depth_ig)
+            color_igs, depth_igs = self.refine_pool.evaluate(gs_slam)
 
             ### compute weighted Refinement I.G., weighted by distance ###
-            color_igs = torch.stack(color_igs).float()
-            depth_igs = torch.stack(depth_igs).float()
 
             color_igs_sm = 1 - torch.nn.functional.softmax(color_igs, dim=0)
             depth_igs_sm = torch.nn.functional.softmax(depth_igs, dim=0)
@@ -1214,27 +1431,15 @@ class ActiveGSPlanner(NarutoPlanner):
                     self.add_refine_pool_cand(selected_kf_list)
 
                 ### render poses in REFINE_POOL ###
-                cand_data, cand_keys, cand_poses = self.get_refine_pool_data()
+                cand_keys, cand_poses = self.get_refine_pool_data()
                 refine_igs = []
-                color_igs = []
-                depth_igs = []
 
                 ### compute distance between current pose and candidate poses ###
                 dists = torch.norm(cand_poses[:, :3, 3] - cur_pose[:3, 3], dim=1) + 1e-6 # avoid zero dist case
                 dists_sm = torch.nn.functional.softmax(dists, dim=0)
-                for i, cand_pose in enumerate(cand_poses):
-                    color, depth, valid_mask = gs_slam.render(cand_pose)
-
-                    ### compute REFINE I.G. ###
-                    valid_depth_mask = cand_data[i]['depth'] > 0
-                    color_ig = calc_psnr(color*valid_depth_mask, cand_data[i]['color']*valid_depth_mask).mean()
-                    color_igs.append(color_ig)
-                    depth_ig = (torch.abs(depth*valid_depth_mask - cand_data[i]['depth']*valid_depth_mask)/(cand_data[i]['depth']+1e-8)).sum() / valid_depth_mask.sum() 
-                    depth_igs.append(depth_ig)
+                color_igs, depth_igs = self.refine_pool.evaluate(gs_slam)
 
                 ### compute weighted Refinement I.G., weighted by distance ###
-                color_igs = torch.stack(color_igs).float()
-                depth_igs = torch.stack(depth_igs).float()
 
                 color_igs_sm = 1 - torch.nn.functional.softmax(color_igs, dim=0)
                 depth_igs_sm = torch.nn.functional.softmax(depth_igs, dim=0) # Not Used
@@ -0,0 +1,156 @@
+"""
+MIT License
+
+Copyright (c) 2024 OPPO
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import torch
+
+
+class ExplorePool():
+    """ Struct-of-arrays exploration candidate pool.
+    Candidates are identified by keys [X, Y, Z, R_i] (free voxel index and view rotation index) and
+    kept sorted by their linearized key, so that dedup, lookup and removal are vectorized searchsorted / masked compaction.
+    Poses are not stored; they are materialized from the keys on demand (see ActiveGSPlanner.get_explore_cand_poses).
+    """
+    ### linearized key: per-axis offset and stride for voxel indices (|index| < 2^15), stride for rotation indices (< 2^10) ###
+    VXL_OFFSET = 2 ** 15
+    VXL_STRIDE = 2 ** 16
+    ROT_STRIDE = 2 ** 10
+
+    def __init__(self, device: str = 'cpu') -> None:
+        """
+        Args:
+            device (str): device of the pool tensors
+
+        Attributes:
+            keys (torch.Tensor, [N,4])       : candidate keys [X, Y, Z, R_i] (int16)
+            igs (torch.Tensor, [N])          : last exploration information gain. 0 if never scored
+            ig_versions (torch.Tensor, [N])  : map version of the last scoring (int32). -1 if never scored
+            lin_keys (torch.Tensor, [N])     : sorted linearized keys (int64, the searchsorted index)
+        """
+        self.device = device
+        self.keys = torch.zeros(0, 4, dtype=torch.int16, device=device)
+        self.igs = torch.zeros(0, device=device)
+        self.ig_versions = torch.zeros(0, dtype=torch.int32, device=device)
+        self.lin_keys = torch.zeros(0, dtype=torch.long, device=device)
+
+    def __len__(self) -> int:
+        return self.keys.shape[0]
+
+    def linearize_keys(self, keys: torch.Tensor) -> torch.Tensor:
+        """ linearize candidate keys
+
+        Args:
+            keys (torch.Tensor, [N,4]): candidate keys [X, Y, Z, R_i]
+
+        Returns:
+            lin_keys (torch.Tensor, [N]): linearized keys
+        """
+        keys = keys.to(self.device)
+        keys = (torch.round(keys) if keys.is_floating_point() else keys).long()
+        vxl = keys[:, :3] + self.VXL_OFFSET
+        return ((vxl[:, 0] * self.VXL_STRIDE + vxl[:, 1]) * self.VXL_STRIDE + vxl[:, 2]) * self.ROT_STRIDE + keys[:, 3]
+
+    def lookup(self, keys: torch.Tensor) -> torch.Tensor:
+        """ find candidates in the pool
+
+        Args:
+            keys (torch.Tensor, [N,4]): candidate keys [X, Y, Z, R_i]
+
+        Returns:
+            idx (torch.Tensor, [N]): pool indices. -1 if not in the pool
+        """
+        lin_keys = self.linearize_keys(keys)
+        idx = torch.full_like(lin_keys, -1)
+        if len(self) == 0:
+            return idx
+        pos = torch.searchsorted(self.lin_keys, lin_keys).clamp(max=len(self) - 1)
+        found_mask = self.lin_keys[pos] == lin_keys
+        idx[found_mask] = pos[found_mask]
+        return idx
+
+    def add(self, keys: torch.Tensor) -> int:
+        """ add candidates that are not in the pool yet
+
+        Args:
+            keys (torch.Tensor, [N,4]): candidate keys [X, Y, Z, R_i]
+
+        Returns:
+            num_added (int): number of added candidates
+        """
+        lin_keys = self.linearize_keys(keys)
+
+        ### first occurrence of each new key ###
+        uniq_keys, inverse = torch.unique(lin_keys, return_inverse=True)
+        first_idx = torch.full_like(uniq_keys, lin_keys.shape[0]).scatter_reduce_(
+            0, inverse, torch.arange(lin_keys.shape[0], device=self.device), reduce='amin')
+        first_idx = first_idx[~torch.isin(uniq_keys, self.lin_keys)]
+        num_added = first_idx.shape[0]
+        if num_added == 0:
+            return 0
+
+        ### merge and keep the pool sorted by linearized key ###
+        lin_keys = torch.cat([self.lin_keys, lin_keys[first_idx]])
+        self.lin_keys, order = torch.sort(lin_keys)
+        keys = keys.to(self.device)[first_idx]
+        keys = (torch.round(keys) if keys.is_floating_point() else keys).to(torch.int16)
+        self.keys = torch.cat([self.keys, keys])[order]
+        self.igs = torch.cat([self.igs, torch.zeros(num_added, device=self.device)])[order]
+        self.ig_versions = torch.cat([self.ig_versions, torch.full((num_added,), -1, dtype=torch.int32, device=self.device)])[order]
+        return num_added
+
+    def update_igs(self, keys: torch.Tensor, igs: torch.Tensor, ig_version: int = None) -> None:
+        """ update information gain (and the map version it was computed against) of candidates in the pool
+
+        Args:
+            keys (torch.Tensor, [N,4]): candidate keys [X, Y, Z, R_i]
+            igs (torch.Tensor, [N])   : exploration information gain
+            ig_version (int)          : map version. Unchanged if None
+        """
+        idx = self.lookup(keys)
+        found_mask = idx >= 0
+        self.igs[idx[found_mask]] = igs.to(self.device).float()[found_mask]
+        if ig_version is not None:
+            self.ig_versions[idx[found_mask]] = ig_version
+
+    def remove(self, keys: torch.Tensor) -> None:
+        """ remove candidates from the pool (masked compaction)
+
+        Args:
+            keys (torch.Tensor, [N,4]): candidate keys [X, Y, Z, R_i]
+        """
+        idx = self.lookup(keys)
+        keep_mask = torch.ones(len(self), dtype=torch.bool, device=self.device)
+        keep_mask[idx[idx >= 0]] = False
+        self.compact(keep_mask)
+
+    def compact(self, keep_mask: torch.Tensor) -> None:
+        """ keep a subset of the pool. Sorted order is preserved
+
+        Args:
+            keep_mask (torch.Tensor, [N]): candidates to keep
+        """
+        self.keys = self.keys[keep_mask]
+        self.igs = self.igs[keep_mask]
+        self.ig_versions = self.ig_versions[keep_mask]
+        self.lin_keys = self.lin_keys[keep_mask]
@@ -0,0 +1,409 @@
+"""
+MIT License
+
+Copyright (c) 2024 OPPO
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+
+import itertools
+import numpy as np
+from scipy import ndimage
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from typing import List
+
+from src.planner.path_planner import PathPlanner
+from src.planner.rrt import Node
+from src.utils.general_utils import InfoPrinter
+
+
+class GridDijkstra(PathPlanner):
+    """ Deterministic local planner: shortest path over the 26-connected voxel grid of the (pseudo-)SDF volume.
+    Voxels with SDF above the collision threshold are passable; moves are penalized near obstacles (clearance cost)
+    and diagonal moves may not cut corners. The search runs scipy's compiled Dijkstra over the passable-voxel graph,
+    so its worst case is bounded by the grid size (O(E log V)) rather than by random sampling.
+    The voxel path is optionally shortcut by line-of-sight (any-angle smoothing), resampled at step_size,
+    and returned as RRT-style Nodes so that it is a drop-in replacement of RRT/RRTNaruto.
+    """
+    def __init__(self, 
+                 step_size       : float = 1.,
+                 maxz            : int = None,
+                 z_levels        : List = None,
+                 collision_thre  : float = 0.5,
+                 clearance_dist  : float = 2.,
+                 clearance_weight: float = 1.,
+                 smooth_path     : bool = True,
+                 snap_dist       : float = 2.,
+                 device          : str = 'cuda',
+                 enable_eval     : bool = False,
+                 ):
+        """ 
+        Args:
+            step_size (float)       : waypoint spacing. Unit: voxel
+            maxz (int)              : maximum z level. Unit: voxel
+            z_levels (List)         : Z levels. Unit: voxel. Min and Max level. Overrides maxz
+            collision_thre (float)  : collision threshold. Unit: voxel
+            clearance_dist (float)  : voxels closer than this to an obstacle are penalized. Unit: voxel
+            clearance_weight (float): step cost multiplier at zero clearance is (1 + clearance_weight)
+            smooth_path (bool)      : shortcut the voxel path by line-of-sight checks
+            snap_dist (float)       : start/goal in blocked voxels are snapped to the nearest passable voxel within this distance. Unit: voxel
+            device (str)            : device of the returned Nodes
+            enable_eval (bool)      : enable evaluation, including timing
+        
+        Attributes:
+            nbr_offsets (np.ndarray, [13,3]) : neighbour offsets (one per undirected edge direction)
+            nbr_comps (np.ndarray, [13,7,3]) : voxels spanned by each move (corner cutting check), padded with the zero offset
+            nbr_lens (np.ndarray, [13])      : move lengths
+            graph (csr_matrix, [P,P])        : passable-voxel graph, cached across plans. None before the first plan
+            eval_results (Dict)              : evaluation results
+        """
+        self.step_size = step_size
+        self.maxz = maxz
+        self.z_levels = z_levels
+        self.collision_thre = collision_thre
+        self.clearance_dist = clearance_dist
+        self.clearance_weight = clearance_weight
+        self.smooth_path = smooth_path
+        self.snap_dist = snap_dist
+        self._device = device
+        self.enable_eval = enable_eval
+
+        ### 26-neighbourhood: half of the offsets, edges are undirected ###
+        self.nbr_offsets = np.asarray([o for o in itertools.product([-1, 0, 1], repeat=3) if o > (0, 0, 0)], dtype=np.int64)
+        self.nbr_comps = np.zeros((13, 7, 3), dtype=np.int64)
+        for i, offset in enumerate(self.nbr_offsets):
+            comps = [o for o in itertools.product(*[[0, v] if v else [0] for v in offset]) if any(o)]
+            self.nbr_comps[i, :len(comps)] = comps
+        self.nbr_lens = np.linalg.norm(self.nbr_offsets, axis=1)
+        self.graph = None
+
+        ### evaluation metrics ###
+        self.eval_results = {
+            "time (ms)": [],
+            "node_num": [],
+        }
+
+    def start_new_plan(self, 
+                       start  : np.ndarray,
+                       goal   : np.ndarray,
+                       sdf_map: np.ndarray
+                       ) -> None:
+        """ initialize a new planning request 
+    
+        Args:
+            start (np.ndarray, [3])      : start location. Unit: voxel
+            goal (np.ndarray, [3])       : goal location. Unit: voxel
+            sdf_map (np.ndarray, [X,Y,Z]): SDF volume
+        
+        Attributes:
+            start (Node)                          : start location
+            goal (Node)                           : goal location
+            sdf_map (np.ndarray, [X,Y,Z])         : SDF volume
+            passable (np.ndarray, [X+2,Y+2,Z+2])  : passable voxels, padded with a blocked border
+            cost_mult (np.ndarray, [P])           : per-voxel step cost multiplier (clearance cost). P = (X+2)*(Y+2)*(Z+2)
+            strides (np.ndarray, [3])             : flat index strides of the padded grid
+            path (List)                           : planned path. [GoalNode, ..., StartNode]. Empty before run()
+            dist (np.ndarray, [P])                : travel cost from the start. None before run() / run_full()
+            graph (csr_matrix, [P,P])             : passable-voxel graph, updated around changed voxels, see update_graph()
+        """
+        self.start = Node(*start, device=self._device)
+        self.goal = Node(*goal, device=self._device)
+        self.sdf_map = sdf_map
+        self.path = []
+        self.dist = None
+
+        ##################################################
+        ### passable voxels and clearance cost
+        ##################################################
+        passable = np.asarray(sdf_map) > self.collision_thre
+        z_range = self.z_levels if self.z_levels is not None else [0, self.maxz]
+        if z_range[0] is not None:
+            passable[:, :, :max(int(np.ceil(z_range[0])), 0)] = False
+        if z_range[1] is not None:
+            passable[:, :, int(np.floor(z_range[1])) + 1:] = False
+        self.passable = np.pad(passable, 1, constant_values=False)
+
+        ### clearance on the unpadded grid: the bbox boundary is not an obstacle ###
+        clearance = ndimage.distance_transform_edt(passable)
+        penalty = np.clip(1 - clearance / max(self.clearance_dist, 1e-8), 0, 1)
+        self.cost_mult = np.pad(1 + self.clearance_weight * penalty, 1, constant_values=1 + self.clearance_weight).reshape(-1)
+        self.strides = np.asarray(self.passable.strides, dtype=np.int64) // self.passable.itemsize
+        self.update_graph()
+
+    def snap_to_passable(self, loc: np.ndarray) -> int:
+        """ find the passable voxel of a location. Locations in blocked voxels are snapped to the nearest passable voxel
+    
+        Args:
+            loc (np.ndarray, [3]): location. Unit: voxel
+    
+        Returns:
+            flat_idx (int): flat index in the padded grid. -1 if no passable voxel within snap_dist
+        """
+        vxl = np.round(loc).astype(np.int64) + 1
+        if (vxl >= 0).all() and (vxl < self.passable.shape).all() and self.passable[tuple(vxl)]:
+            return int(vxl @ self.strides)
+
+        ### search the neighbourhood within snap_dist ###
+        r = int(np.ceil(self.snap_dist))
+        lo = np.clip(vxl - r, 0, self.passable.shape)
+        hi = np.clip(vxl + r + 1, 0, self.passable.shape)
+        cand = np.argwhere(self.passable[lo[0]:hi[0], lo[1]:hi[1], lo[2]:hi[2]]) + lo
+        if cand.shape[0] == 0:
+            return -1
+        dist = np.linalg.norm(cand - (loc + 1), axis=1)
+        if dist.min() > self.snap_dist:
+            return -1
+        return int(cand[np.argmin(dist)] @ self.strides)
+
+    def edge_weights(self, idx: np.ndarray) -> np.ndarray:
+        """ weights of the undirected passable-voxel graph edges from the given voxels, one per neighbour offset. 
+        Edge weight is the move length times the mean cost multiplier of both ends
+    
+        Args:
+            idx (np.ndarray, [N]): source voxels. Flat index in the padded grid, not on the padded border
+
+        Returns:
+            weights (np.ndarray, [N,13]): edge weights. inf if the move is blocked
+        """
+        passable = self.passable.reshape(-1)
+        weights = np.full((idx.shape[0], self.nbr_offsets.shape[0]), np.inf)
+        for i, (offset, comps, length) in enumerate(zip(self.nbr_offsets @ self.strides, self.nbr_comps @ self.strides, self.nbr_lens)):
+            valid = passable[idx] & passable[idx + offset]
+            for comp in comps[comps != 0]:
+                valid &= passable[idx + comp]
+            weights[valid, i] = length * 0.5 * (self.cost_mult[idx[valid]] + self.cost_mult[idx[valid] + offset])
+        return weights
+
+    def update_graph(self) -> None:
+        """ update the passable-voxel graph, cached across plans. The graph has a fixed slot per (voxel, neighbour offset), 
+        so only the edge weights of voxels around those whose passability or cost changed since the previous plan are rewritten 
+        (an edge spans its source's 3x3x3 neighbourhood). The graph is built on the first plan or when the grid shape changes
+    
+        Attributes:
+            graph (csr_matrix, [P,P])        : voxel graph over flat indices of the padded grid. Blocked moves have infinite weight
+            graph_passable (np.ndarray, [P]) : passable voxels the graph weights were computed with
+            graph_cost_mult (np.ndarray, [P]): cost multipliers the graph weights were computed with
+        """
+        passable = self.passable.reshape(-1)
+        num_vxls, num_nbrs = passable.shape[0], self.nbr_offsets.shape[0]
+        if self.graph is None or self.graph.shape[0] != num_vxls:
+            ### neighbours outside the padded grid (border voxels only, never passable) point back to the voxel ###
+            cols = np.arange(num_vxls)[:, None] + self.nbr_offsets @ self.strides
+            cols = np.where((cols >= 0) & (cols < num_vxls), cols, np.arange(num_vxls)[:, None])
+            self.graph = csr_matrix(
+                (np.full(cols.size, np.inf), cols.reshape(-1), np.arange(0, cols.size + 1, num_nbrs)), 
+                shape=(num_vxls, num_vxls)
+                )
+            dirty = passable
+        else:
+            changed = (passable != self.graph_passable) | (self.cost_mult != self.graph_cost_mult)
+            if not changed.any():
+                return
+            dirty = ndimage.binary_dilation(changed.reshape(self.passable.shape), structure=np.ones((3, 3, 3), dtype=bool)).reshape(-1)
+
+        ### padded border voxels are never passable: their edges stay blocked ###
+        border = np.ones(self.passable.shape, dtype=bool)
+        border[1:-1, 1:-1, 1:-1] = False
+        dirty_idx = np.nonzero(dirty & ~border.reshape(-1))[0]
+        if dirty_idx.shape[0] > 0:
+            self.graph.data.reshape(num_vxls, num_nbrs)[dirty_idx] = self.edge_weights(dirty_idx)
+        self.graph_passable = passable.copy()
+        self.graph_cost_mult = self.cost_mult.copy()
+
+    def search(self, start_idx: int) -> None:
+        """ Dijkstra from the start voxel over the passable-voxel graph
+    
+        Args:
+            start_idx (int): start flat index in the padded grid
+
+        Attributes:
+            dist (np.ndarray, [P])       : travel cost from the start. inf if not reachable
+            predecessors (np.ndarray, [P]): predecessor flat index. -9999 if none
+        """
+        self.dist, self.predecessors = dijkstra(self.graph, directed=False, indices=start_idx, return_predecessors=True)
+
+    def backtrack(self, start_idx: int, goal_idx: int) -> np.ndarray:
+        """ backtrack the voxel path from the goal
+    
+        Args:
+            start_idx (int): start flat index in the padded grid
+            goal_idx (int) : goal flat index in the padded grid
+    
+        Returns:
+            vxl_path (np.ndarray, [N,3]): voxel path from start to goal. Unit: voxel
+        """
+        flat_path = [goal_idx]
+        while flat_path[-1] != start_idx:
+            flat_path.append(self.predecessors[flat_path[-1]])
+        return np.stack(np.unravel_index(np.asarray(flat_path[::-1]), self.passable.shape), 1) - 1
+
+    def line_of_sight(self, pa: np.ndarray, pbs: np.ndarray) -> np.ndarray:
+        """ check straight lines pa->pb on the voxel grid: every voxel touched by the densely sampled line must be passable
+    
+        Args:
+            pa (np.ndarray, [3])   : line start. Unit: voxel
+            pbs (np.ndarray, [E,3]): line ends. Unit: voxel
+    
+        Returns:
+            visible (np.ndarray, [E]): is pa->pb in line of sight
+        """
+        num_pts = np.ceil(np.linalg.norm(pbs - pa, axis=1) / 0.25).astype(np.int64) + 1
+        edge_idx = np.repeat(np.arange(pbs.shape[0]), num_pts)
+        t = (np.arange(edge_idx.shape[0]) - np.repeat(np.cumsum(num_pts) - num_pts, num_pts)) / np.maximum(num_pts - 1, 1)[edge_idx]
+        points = pa + t[:, None] * (pbs - pa)[edge_idx]
+
+        ### voxels touched by each sample (both neighbours when on a voxel boundary) ###
+        lo = np.clip(np.floor(points + 0.5 - 1e-6).astype(np.int64) + 1, 0, np.asarray(self.passable.shape) - 1)
+        hi = np.clip(np.floor(points + 0.5 + 1e-6).astype(np.int64) + 1, 0, np.asarray(self.passable.shape) - 1)
+        blocked = ~(self.passable[lo[:, 0], lo[:, 1], lo[:, 2]] & self.passable[hi[:, 0], hi[:, 1], hi[:, 2]])
+        return np.bincount(edge_idx[blocked], minlength=pbs.shape[0]) == 0
+
+    def shortcut_path(self, points: np.ndarray) -> np.ndarray:
+        """ any-angle smoothing: from each kept waypoint, jump to the farthest waypoint in line of sight
+    
+        Args:
+            points (np.ndarray, [N,3]): waypoints. Unit: voxel
+    
+        Returns:
+            points (np.ndarray, [M,3]): kept waypoints. Unit: voxel
+        """
+        keep = [0]
+        while keep[-1] < points.shape[0] - 1:
+            i = keep[-1]
+            visible_idx = np.nonzero(self.line_of_sight(points[i], points[i+1:]))[0]
+            keep.append(i + 1 + (visible_idx[-1] if visible_idx.shape[0] > 0 else 0))
+        return points[keep]
+
+    def resample_path(self, points: np.ndarray) -> np.ndarray:
+        """ resample each segment with step_size spacing, see RRTNaruto.extend_tree()
+    
+        Args:
+            points (np.ndarray, [N,3]): waypoints. Unit: voxel
+    
+        Returns:
+            points (np.ndarray, [M,3]): resampled waypoints, including both ends. Unit: voxel
+        """
+        ### merge collinear moves ###
+        dirs = np.diff(points, axis=0)
+        dirs = dirs / np.maximum(np.linalg.norm(dirs, axis=1, keepdims=True), 1e-8)
+        corner = np.ones(points.shape[0], dtype=bool)
+        corner[1:-1] = (dirs[1:] * dirs[:-1]).sum(1) < 1 - 1e-6
+        points = points[corner]
+
+        new_points = [points[:1]]
+        for pa, pb in zip(points[:-1], points[1:]):
+            dist = np.linalg.norm(pb - pa)
+            steps = np.append(np.arange(1, np.ceil(dist / self.step_size)) * self.step_size, dist)
+            new_points.append(pa + (pb - pa) / max(dist, 1e-8) * steps[:, None])
+        return np.concatenate(new_points)
+
+    def run(self, use_free_space: bool = False) -> bool:
+        """ plan a path from start to goal
+    
+        Args:
+            use_free_space (bool): unused. Kept for interface compatibility with RRTNaruto.run()
+    
+        Returns:
+            target_reachable (bool): is target reachable
+
+        Attributes:
+            path (List): planned path. [GoalNode, ..., StartNode]
+        """
+        self.path = []
+        start_idx = self.snap_to_passable(self.start._xyz_arr)
+        goal_idx = self.snap_to_passable(self.goal._xyz_arr)
+        if start_idx < 0 or goal_idx < 0:
+            return False
+
+        self.search(start_idx)
+        if np.isinf(self.dist[goal_idx]):
+            return False
+        vxl_path = self.backtrack(start_idx, goal_idx)
+
+        ### exact start and goal at both ends ###
+        points = np.concatenate([self.start._xyz_arr[None], vxl_path[1:-1], self.goal._xyz_arr[None]]).astype(np.float64)
+        if self.smooth_path:
+            points = self.shortcut_path(points)
+        points = self.resample_path(points)
+
+        ### link nodes: [GoalNode, ..., StartNode] ###
+        self.path = [self.goal] + [Node(*pt, device=self._device) for pt in points[-2:0:-1]] + [self.start]
+        for node, parent in zip(self.path[:-1], self.path[1:]):
+            node.parent = parent
+        return True
+
+    def run_full(self) -> None:
+        """ compute travel costs from the start to the whole map, see get_reachable_mask() """
+        start_idx = self.snap_to_passable(self.start._xyz_arr)
+        if start_idx >= 0:
+            self.search(start_idx)
+
+    def find_path(self) -> List[Node]:
+        """ find path
+
+        Returns:
+            path (List): planned path. [GoalNode, ..., StartNode]. [GoalNode] if not reachable
+        """
+        return self.path if len(self.path) > 0 else [self.goal]
+
+    def get_reachable_mask(self) -> np.ndarray:
+        """ get reachable/traversability mask: voxels with a finite travel cost from the start. Requires run() or run_full()
+
+        Returns:    
+            reachable_3d_mask (np.ndarray, [X,Y,Z]): reachable mask
+        """
+        reachable = np.zeros(self.passable.shape, dtype=bool)
+        if self.dist is not None:
+            reachable = np.isfinite(self.dist).reshape(self.passable.shape)
+        return reachable[1:-1, 1:-1, 1:-1].astype(np.float32)
+
+    def update_eval(self, 
+                    is_valid_planning: bool,
+                    time             : float,
+                    path             : List[Node]
+                    ) -> None:
+        """update evaluation result
+    
+        Args:
+            is_valid_planning: is planning valid/sucess
+            time             : overall planning time
+            path             : planned path
+    
+        Attributes:
+            eval_results (Dict): update evaluation results
+        """
+        if not(is_valid_planning):
+            return 
+        self.eval_results['time (ms)'].append(time * 1000)
+        self.eval_results['node_num'].append(len(path))
+
+    def print_eval_result(self, info_printer: InfoPrinter) -> None:
+        """ print average evaluation results
+
+        Args:
+            info_printer: information printer
+        """
+        info_printer("Running GridDijkstra Evaluation.")
+        for key, val in self.eval_results.items():
+            key_str = info_printer.adjust_string_length(20, key)
+            avg_val = np.mean(np.asarray(val))
+            info_printer(f"{key_str}: {avg_val:.2f}")
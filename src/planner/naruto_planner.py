@@ -56,7 +56,7 @@ class NarutoPlanner(Planner):
         """ initialize local planner 
     
         Attributes:
-            local_planner (RRTNaruto)
+            local_planner (RRTNaruto / RRT / GridDijkstra / PersistentPRM)
             
         """
         if self.planner_cfg.local_planner_method == 'RRTNaruto':
@@ -86,6 +86,31 @@ class NarutoPlanner(Planner):
                 collision_thre = self.planner_cfg.get("collision_thre", 0.05) / self.voxel_size, # Unit: xovel
                 enable_eval    = self.planner_cfg.get("enable_eval", False)
             )
+        elif self.planner_cfg.local_planner_method == 'GridDijkstra':
+            from src.planner.grid_dijkstra import GridDijkstra
+            self.local_planner = GridDijkstra(
+                step_size        = self.planner_cfg.get("rrt_step_size", self.planner_cfg.trans_step_size / self.voxel_size), # Unit: voxel
+                maxz             = self.planner_cfg.get("rrt_maxz", None),
+                z_levels         = self.planner_cfg.get("rrt_z_levels", None),
+                collision_thre   = self.planner_cfg.get("collision_thre", 0.05) / self.voxel_size, # Unit: xovel
+                clearance_dist   = self.planner_cfg.get("grid_clearance_dist", 0.1) / self.voxel_size, # Unit: voxel
+                clearance_weight = self.planner_cfg.get("grid_clearance_weight", 1.),
+                smooth_path      = self.planner_cfg.get("grid_smooth_path", True),
+                enable_eval      = self.planner_cfg.get("enable_eval", False)
+            )
+        elif self.planner_cfg.local_planner_method == 'PersistentPRM':
+            from src.planner.prm import PersistentPRM
+            self.local_planner = PersistentPRM(
+                step_size        = self.planner_cfg.get("rrt_step_size", self.planner_cfg.trans_step_size / self.voxel_size), # Unit: voxel
+                maxz             = self.planner_cfg.get("rrt_maxz", None),
+                z_levels         = self.planner_cfg.get("rrt_z_levels", None),
+                collision_thre   = self.planner_cfg.get("collision_thre", 0.05) / self.voxel_size, # Unit: xovel
+                connect_radius   = self.planner_cfg.get("prm_connect_radius", 0.3) / self.voxel_size, # Unit: voxel
+                k_neighbors      = self.planner_cfg.get("prm_k_neighbors", 10),
+                samples_per_plan = self.planner_cfg.get("prm_samples_per_plan", 500),
+                max_rounds       = self.planner_cfg.get("prm_max_rounds", 10),
+                enable_eval      = self.planner_cfg.get("enable_eval", False)
+            )
         return
 
     def init_data(self, bbox: List) -> None:
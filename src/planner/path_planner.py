@@ -1,4 +1,7 @@
 class PathPlanner():
+    ### persistent planners keep their state across plans and take the grid offset in start_new_plan() ###
+    persistent = False
+
     def __init__(self, *argv, **kwargs):
         """
     
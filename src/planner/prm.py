@@ -0,0 +1,418 @@
+"""
+MIT License
+
+Copyright (c) 2024 OPPO
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+
+import numpy as np
+from scipy import ndimage
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+from typing import List
+
+from src.planner.path_planner import PathPlanner
+from src.planner.rrt import Node, is_collision_free_batch, query_sdf_np
+from src.utils.general_utils import InfoPrinter
+
+
+class PersistentPRM(PathPlanner):
+    """ Probabilistic roadmap kept across planning requests.
+    Nodes and collision-validated edges are stored in a global voxel frame (local voxel + grid offset), so they stay
+    aligned when the origin of the dense grid moves; nodes falling outside the current grid are dropped.
+    On each new plan only the edges passing through updated voxels are re-checked, new samples are biased towards
+    the updated region, and start/goal are connected as temporary query vertices and answered with Dijkstra on the roadmap.
+    """
+    persistent = True
+
+    def __init__(self, 
+                 step_size       : float = 1.,
+                 maxz            : int = None,
+                 z_levels        : List = None,
+                 collision_thre  : float = 0.5,
+                 connect_radius  : float = 6.,
+                 k_neighbors     : int = 10,
+                 samples_per_plan: int = 500,
+                 max_rounds      : int = 10,
+                 device          : str = 'cuda',
+                 enable_eval     : bool = False,
+                 ):
+        """ 
+        Args:
+            step_size (float)      : waypoint spacing of the returned path. Unit: voxel
+            maxz (int)             : maximum z level for sampling. Unit: voxel
+            z_levels (List)        : Z levels for sampling. Unit: voxel. Min and Max level. Overrides maxz
+            collision_thre (float) : collision threshold. Unit: voxel
+            connect_radius (float) : maximum edge length. Unit: voxel
+            k_neighbors (int)      : number of nearest nodes each new node tries to connect to
+            samples_per_plan (int) : number of new samples per round
+            max_rounds (int)       : maximum sampling rounds per plan before the goal is considered unreachable
+            device (str)           : device of the returned Nodes
+            enable_eval (bool)     : enable evaluation, including timing
+        
+        Attributes:
+            nodes (np.ndarray, [N,3])   : roadmap nodes. Unit: voxel, global frame
+            edges (np.ndarray, [E,2])   : collision-free edges (node index pairs, a < b)
+            kdtree (cKDTree)            : nearest-neighbour index over nodes
+            sdf_map (np.ndarray, [X,Y,Z]): SDF volume of the current plan
+            grid_offset (np.ndarray, [3]): global voxel index of the current grid's voxel (0,0,0)
+            eval_results (Dict)         : evaluation results
+        """
+        self.step_size = step_size
+        self.maxz = maxz
+        self.z_levels = z_levels
+        self.collision_thre = collision_thre
+        self.connect_radius = connect_radius
+        self.k_neighbors = k_neighbors
+        self.samples_per_plan = samples_per_plan
+        self.max_rounds = max_rounds
+        self._device = device
+        self.enable_eval = enable_eval
+
+        self.nodes = np.zeros((0, 3))
+        self.edges = np.zeros((0, 2), dtype=np.int64)
+        self.kdtree = None
+        self.sdf_map = None
+        self.grid_offset = np.zeros(3, dtype=np.int64)
+
+        ### evaluation metrics ###
+        self.eval_results = {
+            "time (ms)": [],
+            "node_num": [],
+            "edge_num": [],
+            "edge_checks": [],
+        }
+
+    ##################################################
+    ### roadmap maintenance
+    ##################################################
+    def sync_map(self, sdf_map: np.ndarray, grid_offset: np.ndarray) -> None:
+        """ update the SDF volume; drop nodes that became blocked and re-check edges passing through updated voxels
+    
+        Args:
+            sdf_map (np.ndarray, [X,Y,Z]): SDF volume
+            grid_offset (np.ndarray, [3]): global voxel index of voxel (0,0,0)
+
+        Attributes:
+            changed_mask (np.ndarray, [X,Y,Z]): voxels updated since the last plan (all voxels for the first plan)
+        """
+        ### align the previous volume to the new grid; voxels outside the previous grid count as updated ###
+        prev_sdf = np.full(sdf_map.shape, np.nan, dtype=np.float32)
+        if self.sdf_map is not None:
+            shift = self.grid_offset - grid_offset
+            lo = np.maximum(shift, 0)
+            hi = np.minimum(shift + np.asarray(self.sdf_map.shape), sdf_map.shape)
+            if (hi > lo).all():
+                prev_sdf[lo[0]:hi[0], lo[1]:hi[1], lo[2]:hi[2]] = self.sdf_map[
+                    lo[0]-shift[0]:hi[0]-shift[0], lo[1]-shift[1]:hi[1]-shift[1], lo[2]-shift[2]:hi[2]-shift[2]]
+        self.changed_mask = ~(prev_sdf == sdf_map)
+        self.sdf_map = sdf_map
+        self.grid_offset = grid_offset
+        if self.nodes.shape[0] == 0 or not self.changed_mask.any():
+            return
+
+        ##################################################
+        ### drop blocked nodes (and their edges)
+        ##################################################
+        node_sdf = query_sdf_np(self.sdf_map, self.nodes - self.grid_offset)
+        keep_mask = node_sdf > self.collision_thre # NaN (outside the grid) is dropped
+        if not keep_mask.all():
+            new_idx = np.cumsum(keep_mask) - 1
+            self.edges = self.edges[keep_mask[self.edges].all(1)]
+            self.edges = new_idx[self.edges]
+            self.nodes = self.nodes[keep_mask]
+            self.kdtree = cKDTree(self.nodes) if self.nodes.shape[0] > 0 else None
+        if self.edges.shape[0] == 0:
+            return
+
+        ##################################################
+        ### re-check edges touching updated voxels
+        ### a point interpolates voxels within 1 of its nearest voxel, and 0.5-voxel
+        ### sampling keeps every point on the edge within that range of a sample
+        ##################################################
+        dirty_mask = ndimage.binary_dilation(self.changed_mask, structure=np.ones((3, 3, 3)))
+        pas = self.nodes[self.edges[:, 0]] - self.grid_offset
+        pbs = self.nodes[self.edges[:, 1]] - self.grid_offset
+        num_pts = np.ceil(np.linalg.norm(pbs - pas, axis=1) / 0.5).astype(np.int64) + 1
+        edge_idx = np.repeat(np.arange(self.edges.shape[0]), num_pts)
+        t = (np.arange(edge_idx.shape[0]) - np.repeat(np.cumsum(num_pts) - num_pts, num_pts)) / np.maximum(num_pts - 1, 1)[edge_idx]
+        vxl = np.round(pas[edge_idx] + t[:, None] * (pbs - pas)[edge_idx]).astype(np.int64)
+        vxl = np.clip(vxl, 0, np.asarray(self.sdf_map.shape) - 1)
+        dirty_edges = np.unique(edge_idx[dirty_mask[vxl[:, 0], vxl[:, 1], vxl[:, 2]]])
+        if dirty_edges.shape[0] == 0:
+            return
+        _, complete_free = is_collision_free_batch(pas[dirty_edges], pbs[dirty_edges], self.sdf_map, self.step_size, self.collision_thre)
+        self.num_edge_checks += dirty_edges.shape[0]
+        keep_mask = np.ones(self.edges.shape[0], dtype=bool)
+        keep_mask[dirty_edges[~complete_free]] = False
+        self.edges = self.edges[keep_mask]
+
+    def sample_nodes(self, num_samples: int) -> np.ndarray:
+        """ sample collision-free locations, half of them in the updated region if any
+    
+        Args:
+            num_samples (int): number of samples
+    
+        Returns:
+            samples (np.ndarray, [M,3]): collision-free samples. Unit: voxel, global frame
+        """
+        free_mask = self.sdf_map > self.collision_thre
+        z_range = self.z_levels if self.z_levels is not None else [0, self.maxz]
+        if z_range[0] is not None:
+            free_mask[:, :, :max(int(np.ceil(z_range[0])), 0)] = False
+        if z_range[1] is not None:
+            free_mask[:, :, int(np.floor(z_range[1])) + 1:] = False
+
+        samples = []
+        for mask, num in [(free_mask & self.changed_mask, num_samples // 2), (free_mask, num_samples)]:
+            free_vxl = np.argwhere(mask)
+            num = min(num - sum(s.shape[0] for s in samples), free_vxl.shape[0])
+            if num <= 0 or free_vxl.shape[0] == 0:
+                continue
+            pts = free_vxl[np.random.choice(free_vxl.shape[0], num, replace=False)] + np.random.uniform(-0.5, 0.5, (num, 3))
+            samples.append(pts[query_sdf_np(self.sdf_map, pts) > self.collision_thre])
+        if len(samples) == 0:
+            return np.zeros((0, 3))
+        return np.concatenate(samples) + self.grid_offset
+
+    def add_nodes(self, pts: np.ndarray) -> np.ndarray:
+        """ add nodes and connect them to their nearest nodes with collision-free edges
+    
+        Args:
+            pts (np.ndarray, [M,3]): node locations. Unit: voxel, global frame
+    
+        Returns:
+            node_idx (np.ndarray, [M]): indices of the added nodes
+        """
+        node_idx = np.arange(self.nodes.shape[0], self.nodes.shape[0] + pts.shape[0])
+        if pts.shape[0] == 0:
+            return node_idx
+        self.nodes = np.concatenate([self.nodes, pts])
+        self.kdtree = cKDTree(self.nodes)
+
+        ### candidate edges to the k nearest nodes within connect_radius ###
+        k = min(self.k_neighbors + 1, self.nodes.shape[0])
+        dists, nbrs = self.kdtree.query(pts, k=k, distance_upper_bound=self.connect_radius)
+        dists, nbrs = dists.reshape(pts.shape[0], k), nbrs.reshape(pts.shape[0], k)
+        valid = np.isfinite(dists) & (nbrs != node_idx[:, None])
+        cand_edges = np.sort(np.stack([np.repeat(node_idx, k)[valid.reshape(-1)], nbrs[valid]], 1), axis=1)
+        if cand_edges.shape[0] == 0:
+            return node_idx
+
+        ### skip duplicates and known edges ###
+        lin_edges = cand_edges[:, 0] * self.nodes.shape[0] + cand_edges[:, 1]
+        lin_edges, uniq_idx = np.unique(lin_edges, return_index=True)
+        cand_edges = cand_edges[uniq_idx[~np.isin(lin_edges, self.edges[:, 0] * self.nodes.shape[0] + self.edges[:, 1])]]
+
+        _, complete_free = is_collision_free_batch(
+            self.nodes[cand_edges[:, 0]] - self.grid_offset, self.nodes[cand_edges[:, 1]] - self.grid_offset,
+            self.sdf_map, self.step_size, self.collision_thre)
+        self.num_edge_checks += cand_edges.shape[0]
+        self.edges = np.concatenate([self.edges, cand_edges[complete_free]])
+        return node_idx
+
+    def connect_queries(self, query_pts: np.ndarray) -> np.ndarray:
+        """ connect temporary query vertices (start/goal) to their nearest roadmap nodes and to each other.
+        Query vertex q is indexed as N+q; neither the vertices nor their edges are added to the roadmap
+    
+        Args:
+            query_pts (np.ndarray, [Q,3]): query locations. Unit: voxel, global frame
+    
+        Returns:
+            query_edges (np.ndarray, [M,2]): collision-free edges (query vertex index, node or query vertex index)
+        """
+        N, Q = self.nodes.shape[0], query_pts.shape[0]
+        cand_edges = [np.stack(np.triu_indices(Q, 1), 1) + N]
+        if N > 0:
+            k = min(self.k_neighbors, N)
+            dists, nbrs = self.kdtree.query(query_pts, k=k, distance_upper_bound=self.connect_radius)
+            dists, nbrs = dists.reshape(Q, k), nbrs.reshape(Q, k)
+            valid = np.isfinite(dists)
+            cand_edges.append(np.stack([np.repeat(np.arange(N, N + Q), k)[valid.reshape(-1)], nbrs[valid]], 1))
+        cand_edges = np.concatenate(cand_edges)
+
+        ### collision check; query-query edges also need to be within connect_radius ###
+        pts = np.concatenate([self.nodes, query_pts])
+        pas, pbs = pts[cand_edges[:, 0]], pts[cand_edges[:, 1]]
+        cand_edges = cand_edges[np.linalg.norm(pas - pbs, axis=1) <= self.connect_radius]
+        if cand_edges.shape[0] == 0:
+            return cand_edges
+        _, complete_free = is_collision_free_batch(
+            pts[cand_edges[:, 0]] - self.grid_offset, pts[cand_edges[:, 1]] - self.grid_offset,
+            self.sdf_map, self.step_size, self.collision_thre)
+        self.num_edge_checks += cand_edges.shape[0]
+        return cand_edges[complete_free]
+
+    def search(self, query_pts: np.ndarray) -> None:
+        """ Dijkstra from the first query vertex over the roadmap extended by the temporary query vertices
+    
+        Args:
+            query_pts (np.ndarray, [Q,3]): query locations, the first one is the start. Unit: voxel, global frame
+
+        Attributes:
+            search_pts (np.ndarray, [N+Q,3]): roadmap nodes followed by the query vertices. Unit: voxel, global frame
+            dist (np.ndarray, [N+Q])        : travel distance from the start. Unit: voxel. inf if not connected
+            predecessors (np.ndarray, [N+Q]): predecessor index. -9999 if none
+        """
+        edges = np.concatenate([self.edges, self.connect_queries(query_pts)])
+        self.search_pts = np.concatenate([self.nodes, query_pts])
+        lengths = np.linalg.norm(self.search_pts[edges[:, 0]] - self.search_pts[edges[:, 1]], axis=1)
+        graph = csr_matrix((lengths + 1e-8, (edges[:, 0], edges[:, 1])), shape=(self.search_pts.shape[0],) * 2)
+        self.dist, self.predecessors = dijkstra(graph, directed=False, indices=self.nodes.shape[0], return_predecessors=True)
+
+    ##################################################
+    ### PathPlanner interface
+    ##################################################
+    def start_new_plan(self, 
+                       start      : np.ndarray,
+                       goal       : np.ndarray,
+                       sdf_map    : np.ndarray,
+                       grid_offset: np.ndarray = None,
+                       ) -> None:
+        """ initialize a new planning request. The roadmap is kept and synchronized with the new SDF volume
+    
+        Args:
+            start (np.ndarray, [3])      : start location. Unit: voxel
+            goal (np.ndarray, [3])       : goal location. Unit: voxel
+            sdf_map (np.ndarray, [X,Y,Z]): SDF volume
+            grid_offset (np.ndarray, [3]): global voxel index of voxel (0,0,0). Zero if None
+        
+        Attributes:
+            start (Node)           : start location
+            goal (Node)            : goal location
+            path (List)            : planned path. [GoalNode, ..., StartNode]. Empty before run()
+            dist (np.ndarray, [N+Q]): travel distance from the start, see search(). None before run() / run_full()
+            num_edge_checks (int)  : number of collision-checked edges in this plan
+        """
+        self.start = Node(*start, device=self._device)
+        self.goal = Node(*goal, device=self._device)
+        self.path = []
+        self.dist = None
+        self.num_edge_checks = 0
+        grid_offset = np.zeros(3, dtype=np.int64) if grid_offset is None else np.round(np.asarray(grid_offset)).astype(np.int64)
+        self.sync_map(np.array(sdf_map, dtype=np.float32), grid_offset) # copy: the previous volume is compared against on the next plan
+
+    def run(self, use_free_space: bool = False) -> bool:
+        """ connect start and goal to the roadmap and search it, adding samples until the goal is connected
+    
+        Args:
+            use_free_space (bool): unused. Kept for interface compatibility with RRTNaruto.run()
+    
+        Returns:
+            target_reachable (bool): is target reachable
+
+        Attributes:
+            path (List): planned path. [GoalNode, ..., StartNode]
+        """
+        query_pts = np.stack([self.start._xyz_arr, self.goal._xyz_arr]) + self.grid_offset
+        if not (query_sdf_np(self.sdf_map, query_pts - self.grid_offset)[1] > self.collision_thre):
+            return False # goal in blocked/unknown space: no sampling can connect it
+        self.search(query_pts)
+        for _ in range(self.max_rounds):
+            if np.isfinite(self.dist[-1]):
+                break
+            self.add_nodes(self.sample_nodes(self.samples_per_plan))
+            self.search(query_pts)
+        if not np.isfinite(self.dist[-1]):
+            return False
+
+        ### backtrack and resample each edge with step_size spacing ###
+        start_idx, goal_idx = self.search_pts.shape[0] - 2, self.search_pts.shape[0] - 1
+        node_path = [goal_idx]
+        while node_path[-1] != start_idx:
+            node_path.append(self.predecessors[node_path[-1]])
+        points = self.search_pts[node_path] - self.grid_offset # goal -> start
+        path_pts = []
+        for pa, pb in zip(points[:-1], points[1:]):
+            dist = np.linalg.norm(pb - pa)
+            steps = np.arange(0, dist, self.step_size)
+            path_pts.append(pa + (pb - pa) / max(dist, 1e-8) * steps[:, None])
+        path_pts = np.concatenate(path_pts)[1:]
+
+        ### link nodes: [GoalNode, ..., StartNode] ###
+        self.path = [self.goal] + [Node(*pt, device=self._device) for pt in path_pts] + [self.start]
+        for node, parent in zip(self.path[:-1], self.path[1:]):
+            node.parent = parent
+        return True
+
+    def run_full(self) -> None:
+        """ grow the roadmap for max_rounds sampling rounds and search it from the start """
+        for _ in range(self.max_rounds):
+            self.add_nodes(self.sample_nodes(self.samples_per_plan))
+        self.search((self.start._xyz_arr + self.grid_offset)[None])
+
+    def find_path(self) -> List[Node]:
+        """ find path
+
+        Returns:
+            path (List): planned path. [GoalNode, ..., StartNode]. [GoalNode] if not reachable
+        """
+        return self.path if len(self.path) > 0 else [self.goal]
+
+    def get_reachable_mask(self) -> np.ndarray:
+        """ get reachable/traversability mask: voxels within connect_radius of a roadmap node connected to the start. Requires run() or run_full()
+
+        Returns:    
+            reachable_3d_mask (np.ndarray, [X,Y,Z]): reachable mask
+        """
+        reachable = np.zeros(self.sdf_map.shape, dtype=bool)
+        if self.dist is not None:
+            reachable_nodes = self.search_pts[np.isfinite(self.dist)] - self.grid_offset
+            points = np.argwhere(np.ones(self.sdf_map.shape, dtype=bool))
+            dists, _ = cKDTree(reachable_nodes).query(points, distance_upper_bound=self.connect_radius)
+            reachable = np.isfinite(dists).reshape(self.sdf_map.shape)
+        return reachable.astype(np.float32)
+
+    def update_eval(self, 
+                    is_valid_planning: bool,
+                    time             : float,
+                    path             : List[Node]
+                    ) -> None:
+        """update evaluation result
+    
+        Args:
+            is_valid_planning: is planning valid/sucess
+            time             : overall planning time
+            path             : planned path
+    
+        Attributes:
+            eval_results (Dict): update evaluation results
+        """
+        if not(is_valid_planning):
+            return 
+        self.eval_results['time (ms)'].append(time * 1000)
+        self.eval_results['node_num'].append(self.nodes.shape[0])
+        self.eval_results['edge_num'].append(self.edges.shape[0])
+        self.eval_results['edge_checks'].append(self.num_edge_checks)
+
+    def print_eval_result(self, info_printer: InfoPrinter) -> None:
+        """ print average evaluation results
+
+        Args:
+            info_printer: information printer
+        """
+        info_printer("Running PersistentPRM Evaluation.")
+        for key, val in self.eval_results.items():
+            key_str = info_printer.adjust_string_length(20, key)
+            avg_val = np.mean(np.asarray(val))
+            info_printer(f"{key_str}: {avg_val:.2f}")
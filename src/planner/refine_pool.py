@@ -0,0 +1,127 @@
+"""
+MIT License
+
+Copyright (c) 2024 OPPO
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+
+import torch
+from typing import Dict, List, Tuple
+
+
+class RefinePool():
+    """ Refinement candidate pool with batched evaluation.
+    Keyframe camera-to-world poses and masked GT color / depth are cached once in contiguous (optionally fp16) buffers,
+    so that every evaluation is batched rendering plus a few fused reductions over all candidates.
+    """
+    def __init__(self, 
+                 device    : str = 'cuda',
+                 batch_size: int = 16,
+                 use_fp16  : bool = False
+                 ) -> None:
+        """
+        Args:
+            device (str)    : device of the buffers
+            batch_size (int): number of candidates rendered at once
+            use_fp16 (bool) : store GT color / depth in half precision
+
+        Attributes:
+            keys (List)                         : keyframe ids
+            poses (torch.Tensor, [N,4,4])       : keyframe poses. Format: camera-to-world, RDF
+            gt_colors (torch.Tensor, [N,3,H,W]) : GT colors, masked by valid GT depth
+            gt_depths (torch.Tensor, [N,1,H,W]) : GT depths
+        """
+        self.device = device
+        self.batch_size = batch_size
+        self.dtype = torch.float16 if use_fp16 else torch.float32
+        self.keys = []
+        self.poses = None
+        self.gt_colors = None
+        self.gt_depths = None
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key) -> bool:
+        return key in self.keys
+
+    def add(self, kf_data: List[Dict]) -> None:
+        """ add keyframes that are not in the pool yet
+
+        Args:
+            kf_data (List): keyframes, each with 'id', 'est_w2c', 'color' [3,H,W] and 'depth' [1,H,W]
+        """
+        new_kf_data = {}
+        for kf in kf_data:
+            if kf['id'] not in self.keys:
+                new_kf_data[kf['id']] = kf
+        kf_data = list(new_kf_data.values())
+        if len(kf_data) == 0:
+            return
+        poses = torch.inverse(torch.stack([kf['est_w2c'] for kf in kf_data]).to(self.device))
+        gt_depths = torch.stack([kf['depth'] for kf in kf_data]).to(self.device)
+        gt_colors = torch.stack([kf['color'] for kf in kf_data]).to(self.device) * (gt_depths > 0)
+
+        self.keys += [kf['id'] for kf in kf_data]
+        if self.poses is None:
+            self.poses, self.gt_colors, self.gt_depths = poses, gt_colors.to(self.dtype), gt_depths.to(self.dtype)
+        else:
+            self.poses = torch.cat([self.poses, poses])
+            self.gt_colors = torch.cat([self.gt_colors, gt_colors.to(self.dtype)])
+            self.gt_depths = torch.cat([self.gt_depths, gt_depths.to(self.dtype)])
+
+    def remove(self, keys: List) -> None:
+        """ remove keyframes from the pool
+
+        Args:
+            keys (List): keyframe ids
+        """
+        keep_mask = torch.tensor([key not in keys for key in self.keys], dtype=torch.bool, device=self.device)
+        self.keys = [key for key, keep in zip(self.keys, keep_mask.tolist()) if keep]
+        self.poses, self.gt_colors, self.gt_depths = self.poses[keep_mask], self.gt_colors[keep_mask], self.gt_depths[keep_mask]
+
+    @torch.no_grad()
+    def evaluate(self, gs_slam) -> Tuple[torch.Tensor, torch.Tensor]:
+        """ compute refinement information gain for all candidates
+
+        Args:
+            gs_slam: 3DGS SLAM
+
+        Returns:
+            color_igs (torch.Tensor, [N]): color information gain (PSNR per channel, averaged over channels)
+            depth_igs (torch.Tensor, [N]): depth information gain (rel. depth error)
+        """
+        color_igs, depth_igs = [], []
+        for i in range(0, len(self), self.batch_size):
+            colors, depths, _ = gs_slam.render_batch(self.poses[i:i+self.batch_size])
+            gt_colors = self.gt_colors[i:i+self.batch_size].float()
+            gt_depths = self.gt_depths[i:i+self.batch_size].float()
+            valid_depth_masks = gt_depths > 0
+
+            ### PSNR: per-channel MSE over masked images ###
+            mse = ((colors * valid_depth_masks - gt_colors) ** 2).mean(dim=(2, 3))
+            color_igs.append((20 * torch.log10(1.0 / torch.sqrt(mse))).mean(dim=1))
+
+            ### relative depth error over valid GT depth ###
+            depth_errs = torch.abs((depths - gt_depths) * valid_depth_masks) / (gt_depths + 1e-8)
+            depth_igs.append(depth_errs.sum(dim=(1, 2, 3)) / valid_depth_masks.sum(dim=(1, 2, 3)))
+        return torch.cat(color_igs).float(), torch.cat(depth_igs).float()
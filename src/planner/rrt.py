@@ -1,5 +1,6 @@
 import numpy as np
 import torch
+from scipy.spatial import cKDTree
 from tqdm import tqdm
 from typing import List, Tuple
 
@@ -86,6 +87,71 @@ def trilinear_interpolation(voxel_grid: np.ndarray, point: np.ndarray) -> np.nda
     return interpolated_value
 
 
+def trilinear_interpolation_np(voxel_grid: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """ batched trilinear interpolation (NumPy backend). Same weights as trilinear_interpolation()
+
+    Args:
+        voxel_grid (np.ndarray, [H,W,D]): voxel grid
+        points (np.ndarray, [N,3])      : query points
+
+    Returns
+        interpolated_value (np.ndarray, [N]): interpolated values. NaN for points outside the grid
+    """
+    H, W, D = voxel_grid.shape
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    inside = ((points >= 0) & (points <= np.array([H - 1, W - 1, D - 1]))).all(axis=1)
+
+    ### lower corner, clipped so that points on the upper boundary use the last cell ###
+    p0 = np.clip(np.floor(points).astype(np.int64), 0, np.maximum(np.array([H, W, D]) - 2, 0))
+    d = points - p0
+    x0, y0, z0 = p0[:, 0], p0[:, 1], p0[:, 2]
+    x1, y1, z1 = np.minimum(x0 + 1, H - 1), np.minimum(y0 + 1, W - 1), np.minimum(z0 + 1, D - 1)
+    dx, dy, dz = d[:, 0], d[:, 1], d[:, 2]
+
+    interpolated_value = (1 - dx) * (1 - dy) * (1 - dz) * voxel_grid[x0, y0, z0] + \
+                        (1 - dx) * (1 - dy) * dz * voxel_grid[x0, y0, z1] + \
+                        (1 - dx) * dy * (1 - dz) * voxel_grid[x0, y1, z0] + \
+                        (1 - dx) * dy * dz * voxel_grid[x0, y1, z1] + \
+                        dx * (1 - dy) * (1 - dz) * voxel_grid[x1, y0, z0] + \
+                        dx * (1 - dy) * dz * voxel_grid[x1, y0, z1] + \
+                        dx * dy * (1 - dz) * voxel_grid[x1, y1, z0] + \
+                        dx * dy * dz * voxel_grid[x1, y1, z1]
+    return np.where(inside, interpolated_value, np.nan)
+
+
+def trilinear_interpolation_torch(voxel_grid: torch.Tensor, points: torch.Tensor) -> torch.Tensor:
+    """ batched trilinear interpolation (torch backend). Same weights as trilinear_interpolation()
+
+    Args:
+        voxel_grid (torch.Tensor, [H,W,D]): voxel grid
+        points (torch.Tensor, [N,3])      : query points
+
+    Returns
+        interpolated_value (torch.Tensor, [N]): interpolated values. NaN for points outside the grid
+    """
+    H, W, D = voxel_grid.shape
+    dims = torch.tensor([H, W, D], device=voxel_grid.device)
+    points = points.to(voxel_grid.device).reshape(-1, 3).double()
+    inside = ((points >= 0) & (points <= dims - 1)).all(dim=1)
+
+    ### lower corner, clipped so that points on the upper boundary use the last cell ###
+    p0 = torch.minimum(torch.floor(points).long().clamp(min=0), (dims - 2).clamp(min=0))
+    d = points - p0
+    p1 = torch.minimum(p0 + 1, dims - 1)
+    (x0, y0, z0), (x1, y1, z1), (dx, dy, dz) = p0.unbind(dim=1), p1.unbind(dim=1), d.unbind(dim=1)
+
+    grid = voxel_grid.double()
+    interpolated_value = (1 - dx) * (1 - dy) * (1 - dz) * grid[x0, y0, z0] + \
+                        (1 - dx) * (1 - dy) * dz * grid[x0, y0, z1] + \
+                        (1 - dx) * dy * (1 - dz) * grid[x0, y1, z0] + \
+                        (1 - dx) * dy * dz * grid[x0, y1, z1] + \
+                        dx * (1 - dy) * (1 - dz) * grid[x1, y0, z0] + \
+                        dx * (1 - dy) * dz * grid[x1, y0, z1] + \
+                        dx * dy * (1 - dz) * grid[x1, y1, z0] + \
+                        dx * dy * dz * grid[x1, y1, z1]
+    return torch.where(inside, interpolated_value, torch.full_like(interpolated_value, float('nan')))
+
+
 def query_sdf_np(sdf_grid, points):
     """ Query sdf values (numpy implementation)
 
@@ -94,12 +160,62 @@ def query_sdf_np(sdf_grid, points):
         points (np.ndarray, [N, 3])   : query points
 
     Returns
-        sdf (np.ndarray, [N]): queried SDF values
+        sdf (np.ndarray, [N]): queried SDF values. NaN for points outside the grid
     """
-    sdf = np.array([trilinear_interpolation(sdf_grid, point) for point in points])
+    sdf = trilinear_interpolation_np(sdf_grid, points)
     return sdf
 
 
+def is_collision_free_batch(
+                      pas           : np.ndarray,
+                      pbs           : np.ndarray,
+                      sdf_map       : np.ndarray,
+                      step_size     : float = 1,
+                      collision_thre: float = 0.5
+                    ) -> Tuple : 
+    """ check many edges pa->pb at once using sdf values in between, see is_collision_free()
+
+    Args:
+        pas (np.ndarray, [E,3])                     : edge start points
+        pbs (np.ndarray, [E,3])                     : edge end points
+        sdf_map (np.ndarray or torch.Tensor, [X,Y,Z]): SDF volume. The torch backend is used for torch.Tensor (e.g. on GPU)
+        step_size (float)                           : rrt step size
+        collision_thre (float)                      : collision threshold. Unit: voxel
+    
+    Returns:
+        Tuple: num_collision_free, complete_free
+            - num_collision_free (np.ndarray, [E]): number of collision-free points in between
+            - complete_free (np.ndarray, [E]): is pa->pb completely collision free
+    """
+    pas = np.asarray(pas, dtype=np.float64).reshape(-1, 3)
+    pbs = np.asarray(pbs, dtype=np.float64).reshape(-1, 3)
+    E = pas.shape[0]
+
+    ### sample points in between with a step < rrt_step_size/5 (np.linspace per edge) ###
+    num_pts = np.ceil(np.linalg.norm(pbs - pas, axis=1) / (step_size / 5)).astype(np.int64) + 1
+    edge_idx = np.repeat(np.arange(E), num_pts)
+    pt_idx = np.arange(edge_idx.shape[0]) - np.repeat(np.cumsum(num_pts) - num_pts, num_pts)
+    steps = (pbs - pas) / np.maximum(num_pts - 1, 1)[:, None]
+    points = pas[edge_idx] + pt_idx[:, None] * steps[edge_idx]
+    is_last = (pt_idx == num_pts[edge_idx] - 1) & (num_pts[edge_idx] > 1)
+    points[is_last] = pbs[edge_idx[is_last]]
+
+    if isinstance(sdf_map, torch.Tensor):
+        points_sdf = trilinear_interpolation_torch(sdf_map, torch.from_numpy(points)).cpu().numpy()
+    else:
+        points_sdf = query_sdf_np(sdf_map, points)
+
+    ### check collision: first colliding point of each edge ###
+    collision_check = (points_sdf > collision_thre)
+    first_collision = num_pts.copy()
+    np.minimum.at(first_collision, edge_idx[~collision_check], pt_idx[~collision_check])
+
+    ### get number of collision-free points ###
+    complete_free = first_collision == num_pts
+    num_collision_free = np.where(complete_free, np.maximum((num_pts - 1) // 5, 1), (first_collision - 1) // 5)
+    return num_collision_free, complete_free
+
+
 def is_collision_free(
                       pa            : np.ndarray,
                       pb            : np.ndarray,
@@ -121,26 +237,13 @@ def is_collision_free(
             - num_collision_free (int): number of collision-free points in between
             - complete_free (bool): is pa->pb completely collision free
     """
-    ### sample points in between with a step < rrt_step_size/5 ###
-    points = np.linspace(pa, pb, num=int(np.ceil(np.linalg.norm(pb - pa) / (step_size / 5))) + 1)
-    points_sdf = query_sdf_np(sdf_map, points)
-
-    ### check collision ###
-    collision_check = (points_sdf > collision_thre)
     """
     FIXME: there can be potential issue!
     if agent moves to a location where simulator doesn't give collision but incorrect sdf map give collision
     Agent can be trapped and stayed without moving out
     """
-
-    ### get number of collision-free points ###
-    if collision_check.sum() == len(collision_check):
-        num_collision_free = max((len(collision_check) - 1) // 5, 1)
-        complete_free = True
-    else:
-        num_collision_free = (np.argmax(~collision_check) - 1) // 5
-        complete_free = False
-    return num_collision_free, complete_free
+    num_collision_free, complete_free = is_collision_free_batch(pa, pb, sdf_map, step_size, collision_thre)
+    return int(num_collision_free[0]), bool(complete_free[0])
 
 
 class Node: 
@@ -210,8 +313,7 @@ class RRT(PathPlanner):
             max_iter (int)                           : maximum base number of iteration for generating RRT nodes
             x/y/z_range (List)                       : x/y/z range
             full_x/y/z_range (List)                  : full x/y/z range
-            points (torch.Tensor, [X*Y*Z, 3])        : full grid points
-            reachable_3d_mask (torch.Tensor, [X,Y,Z]): reachable 3D mask
+            vol_shape (Tuple)                        : volume shape (X, Y, Z)
             eval_results (Dict)                      : update evaluation results
         """
         ### load arguments ###
@@ -236,15 +338,8 @@ class RRT(PathPlanner):
         self.full_y_range = [0, vol_shape[1] - 1]
         self.full_z_range = [0, vol_shape[2] - 1]
         
-        ### create regular grid for computing traversability mask when necessary ###
-        sdf_x_range = torch.arange(0, vol_shape[0])
-        sdf_y_range = torch.arange(0, vol_shape[1])
-        sdf_z_range = torch.arange(0, vol_shape[2])
-        x, y, z = torch.meshgrid(sdf_x_range, sdf_y_range, sdf_z_range, indexing="ij")
-        self.points = torch.cat([x.reshape(-1, 1), 
-                            y.reshape(-1, 1), 
-                            z.reshape(-1, 1)], dim=1).to(self._device).float()
-        self.reachable_3d_mask = torch.ones(*vol_shape).to(self._device).float()
+        ### volume shape for computing traversability mask when necessary ###
+        self.vol_shape = tuple(vol_shape)
 
         ### evaluation metrics ###
         self.eval_results = {
@@ -286,17 +381,15 @@ class RRT(PathPlanner):
         Attributes:
             start (Node)                 : start location
             goal (Node)                  : goal location
-            nodes (List)                 : RRT nodes
-            nodes_tensor (torch.Tensor)  : RRT nodes as tensor
+            tree_xyz / tree_parents      : RRT nodes, see init_tree()
             sdf_map (np.ndarray, [X,Y,Z]): SDF volume.
             rrt_iter (int)               : rrt iteration
             
         """
-        self.start = Node(*start)
-        self.goal = Node(*goal)
+        self.start = Node(*start, device=self._device)
+        self.goal = Node(*goal, device=self._device)
 
-        self.nodes = [self.start]
-        self.nodes_tensor = torch.cat([self.start.get_xyz()], dim=0).to(self._device)
+        self.init_tree(self.start._xyz_arr)
 
         self.sdf_map = sdf_map
         ## FIXME: tmp added for ActiveGS ##
@@ -304,6 +397,53 @@ class RRT(PathPlanner):
 
         self.rrt_iter = 0
 
+    ##################################################
+    ### array-backed tree
+    ##################################################
+    def init_tree(self, root: np.ndarray, capacity: int = 1024) -> None:
+        """ initialize the tree with the root node
+
+        Args:
+            root (np.ndarray, [3]): root location. Unit: voxel
+            capacity (int)        : initial capacity. Doubled when full
+
+        Attributes:
+            tree_xyz (np.ndarray, [cap,3])    : node locations. Unit: voxel
+            tree_parents (np.ndarray, [cap])  : parent node index. -1 for the root
+            num_nodes (int)                   : number of nodes
+            goal_parent (int)                 : parent node index of the goal. -1 if not connected
+            kdtree (cKDTree)                  : nearest-neighbour index over the first kdtree_size nodes. Rebuilt periodically
+        """
+        self.tree_xyz = np.zeros((capacity, 3))
+        self.tree_parents = np.full(capacity, -1, dtype=np.int64)
+        self.tree_xyz[0] = root
+        self.num_nodes = 1
+        self.goal_parent = -1
+        self.kdtree = None
+        self.kdtree_size = 0
+
+    @property
+    def nodes_tensor(self) -> torch.Tensor:
+        """ RRT node locations, [N,3] torch.Tensor """
+        return torch.from_numpy(self.tree_xyz[:self.num_nodes]).to(self._device).float()
+
+    def add_node_chain(self, xyz: np.ndarray, parent: int) -> None:
+        """ append nodes as a chain: the first node is attached to parent, each following node to the previous one
+
+        Args:
+            xyz (np.ndarray, [K,3]): node locations. Unit: voxel
+            parent (int)           : parent node index of the first node
+        """
+        K = xyz.shape[0]
+        if self.num_nodes + K > self.tree_xyz.shape[0]:
+            capacity = max(self.tree_xyz.shape[0] * 2, self.num_nodes + K)
+            self.tree_xyz = np.concatenate([self.tree_xyz, np.zeros((capacity - self.tree_xyz.shape[0], 3))])
+            self.tree_parents = np.concatenate([self.tree_parents, np.full(capacity - self.tree_parents.shape[0], -1, dtype=np.int64)])
+        idx = np.arange(self.num_nodes, self.num_nodes + K)
+        self.tree_xyz[idx] = xyz
+        self.tree_parents[idx] = np.concatenate([[parent], idx[:-1]])
+        self.num_nodes += K
+
     def generate_random_point(self, full_range: bool = False, use_free_space: bool = False) -> np.ndarray:
         """ Generate random point.
 
@@ -327,19 +467,29 @@ class RRT(PathPlanner):
         xyz = np.array([x, y, z])
         return xyz
 
-    def find_nearest_node(self, point: np.ndarray) -> Node:
-        """ find the nearest node from the tree
+    def find_nearest_node(self, point: np.ndarray) -> int:
+        """ find the nearest node from the tree. 
+        The KD-tree covers the first kdtree_size nodes and is rebuilt once the newer nodes (searched brute-force) outnumber them
 
         Args:
             point (np.ndarray, [3]): point coordinate
         
         Returns:
-            Node: nearest node to the point
+            nearest_node_index (int): index of the nearest node to the point
         """
-        distances = torch.norm(torch.from_numpy(point).reshape(1,3).to(self._device) - self.nodes_tensor, dim=1, keepdim=True)
-        nearest_node_index = torch.argmin(distances).item()
-    
-        return self.nodes[nearest_node_index]
+        if self.num_nodes - self.kdtree_size > max(self.kdtree_size, 64):
+            self.kdtree = cKDTree(self.tree_xyz[:self.num_nodes])
+            self.kdtree_size = self.num_nodes
+
+        nearest_dist, nearest_node_index = np.inf, -1
+        if self.kdtree is not None:
+            nearest_dist, nearest_node_index = self.kdtree.query(point)
+        if self.num_nodes > self.kdtree_size:
+            distances = np.linalg.norm(self.tree_xyz[self.kdtree_size:self.num_nodes] - point, axis=1)
+            i = np.argmin(distances)
+            if distances[i] < nearest_dist:
+                nearest_node_index = self.kdtree_size + i
+        return int(nearest_node_index)
 
     def extend_tree(self, full_range: bool = False) -> None:
         """ Extend tree.
@@ -348,35 +498,32 @@ class RRT(PathPlanner):
             full_range (bool): sample points from full range
         
         Attributes:
-            nodes (List): RRT nodes
-            nodes_tensor (torch.Tensor, [N, 3]): RRT nodes as torch.Tensor
+            tree_xyz / tree_parents: RRT nodes
         """
         ##################################################
         ### genreate random point and find the nearest node from RRT
         ##################################################
         random_point = self.generate_random_point(full_range)
-        nearest_node = self.find_nearest_node(random_point)
+        nearest_idx = self.find_nearest_node(random_point)
+        nearest_node_arr = self.tree_xyz[nearest_idx]
 
         ##################################################
         ### add new nodes
         ##################################################
         ### compute the random point to be added ###
-        diff = random_point - nearest_node._xyz_arr
+        diff = random_point - nearest_node_arr
         distance = np.linalg.norm(diff)
         if distance > self.step_size:
-            new_node_arr = nearest_node._xyz_arr + diff / distance * min(self.step_size, distance)
+            new_node_arr = nearest_node_arr + diff / distance * min(self.step_size, distance)
         else:
             new_node_arr = random_point
-        new_node = Node(*new_node_arr)
 
         ### detetermine collision-free ###
-        _, complete_free = is_collision_free(nearest_node._xyz_arr, new_node._xyz_arr, self.sdf_map, step_size=self.step_size, collision_thre=self.collision_thre)
+        _, complete_free = is_collision_free(nearest_node_arr, new_node_arr, self.sdf_map, step_size=self.step_size, collision_thre=self.collision_thre)
 
         ### add new point into the tree ###
         if complete_free:
-            new_node.parent = nearest_node
-            self.nodes.append(new_node)
-            self.nodes_tensor = torch.cat([self.nodes_tensor, new_node.get_xyz()])
+            self.add_node_chain(new_node_arr[None], nearest_idx)
         
     def run_full(self) -> None:
         """ Run RRT planning with max number of iterations
@@ -392,29 +539,32 @@ class RRT(PathPlanner):
             target_reachable (bool): is target reachable
 
         Attributes:
-            goal (Node): update goal.parent
+            goal_parent (int): parent node index of the goal
         """
         for rrt_iter in tqdm(range(self.max_iter), desc='RRT planning: '):
             self.rrt_iter += 1
 
             ### add straightlines if possible ###
             self.extend_tree()
-            target_reachable = torch.norm(self.nodes_tensor[-1] - self.goal.get_xyz(), dim=1) < self.step_size
+            target_reachable = np.linalg.norm(self.tree_xyz[self.num_nodes - 1] - self.goal._xyz_arr) < self.step_size
             if target_reachable:
+                self.goal_parent = self.num_nodes - 1
                 return True
         return False
                 
     def find_path(self) -> List[Node]:
-        """ find path
+        """ find path by walking parent indices from the goal
 
         Returns:
-            path (List): planned path
+            path (List): planned path. [GoalNode, ..., StartNode]
         """
         path = [self.goal]
-        current_node = self.goal
-        while current_node.parent is not None:
-            path.append(current_node.parent)
-            current_node = current_node.parent
+        node_idx = self.goal_parent
+        while node_idx >= 0:
+            node = Node(*self.tree_xyz[node_idx], device=self._device)
+            path[-1].parent = node
+            path.append(node)
+            node_idx = self.tree_parents[node_idx]
         return path
     
     def get_reachable_mask(self) -> np.ndarray:
@@ -424,55 +574,32 @@ class RRT(PathPlanner):
             reachable_3d_mask (np.ndarray, [X,Y,Z]): reachable mask
         """
         ##################################################
-        ### compute distance between full grid points and 
-        ###     RRT nodes. If distance is larger than 
-        ###     step size, it is considered non-reachable.
-        ##################################################
-        batch_size = 1000
-        num_repeat = self.points.shape[0] // batch_size
-        invalid_mask = []
-        ### first N-1 batches ###
-        for i in range(num_repeat):
-            points2nodes = (self.points[i*batch_size:(i+1)*batch_size].reshape(-1, 1, 3) - self.nodes_tensor.reshape(1, -1, 3))
-            dist = torch.norm(points2nodes, dim=2)
-            min_dist, min_dist_idx = torch.min(dist, dim=1)
-            invalid_pt_idx = torch.where(min_dist > self.step_size)[0]
-            invalid_mask.append(i * batch_size + invalid_pt_idx)
-        
-        ### last batch ###
-        i += 1
-        points2nodes = (self.points[(i)*batch_size:].reshape(-1, 1, 3) - self.nodes_tensor.reshape(1, -1, 3))
-        dist = torch.norm(points2nodes, dim=2)
-        min_dist, min_dist_idx = torch.min(dist, dim=1)
-        invalid_pt_idx = torch.where(min_dist > self.step_size)[0]
-        invalid_mask.append(i * batch_size + invalid_pt_idx)
-
-        ### gather all invalid masks ###
-        invalid_mask = torch.cat(invalid_mask)
-
-        ##################################################
-        ### update reachable mask
+        ### a voxel is reachable if it is within step size 
+        ###     of any RRT node. Each node marks the voxels 
+        ###     of its local neighbourhood, addressed by 
+        ###     flat index arithmetic.
         ##################################################
-        ### update reachable_mask ###
-        reachable_3d_mask = self.update_reachable_mask(invalid_mask)
+        X, Y, Z = self.vol_shape
+        nodes_tensor = self.nodes_tensor
+        r = int(np.ceil(self.step_size))
+        offset_range = torch.arange(-r, r + 2, device=self._device)
+        offsets = torch.stack(torch.meshgrid(offset_range, offset_range, offset_range, indexing="ij"), -1).reshape(1, -1, 3)
+        vol_shape = torch.tensor([X, Y, Z], device=self._device)
+
+        reachable_3d_mask = torch.zeros(X * Y * Z, dtype=torch.bool, device=self._device)
+        batch_size = max(1, 2 ** 22 // offsets.shape[1])
+        for i in range(0, nodes_tensor.shape[0], batch_size):
+            nodes = nodes_tensor[i:i+batch_size].reshape(-1, 1, 3)
+            vxl = torch.floor(nodes).long() + offsets
+            valid = (torch.norm(vxl.float() - nodes, dim=2) <= self.step_size) & ((vxl >= 0) & (vxl < vol_shape)).all(2)
+            vxl = vxl[valid]
+            reachable_3d_mask[(vxl[:, 0] * Y + vxl[:, 1]) * Z + vxl[:, 2]] = True
 
         ### convert to numpy ###
-        reachable_3d_mask = reachable_3d_mask.detach().cpu().numpy()
+        reachable_3d_mask = reachable_3d_mask.reshape(X, Y, Z).float().cpu().numpy()
 
         return reachable_3d_mask
     
-    def update_reachable_mask(self, invalid_mask: torch.Tensor) -> torch.Tensor:
-        """ update reachable mask by making non-reachable voxel to be zero
-    
-        Args:
-            reachable_3d_mask (torch.Tensor, [X,Y,Z]): reachable mask
-        """
-        h, w, d = self.reachable_3d_mask.shape
-        reachable_3d_mask = self.reachable_3d_mask.reshape(-1).clone()
-        reachable_3d_mask[invalid_mask] = 0
-        reachable_3d_mask = reachable_3d_mask.reshape(h, w, d)
-        return reachable_3d_mask
-    
     def update_eval(self, 
                     is_valid_planning: bool,
                     time             : float,
@@ -500,7 +627,7 @@ class RRT(PathPlanner):
         self.eval_results['time (ms)'].append(time * 1000)
 
         ### node_num ###
-        self.eval_results['node_num'].append(len(self.nodes))
+        self.eval_results['node_num'].append(self.num_nodes)
 
         ### step_num ###
         self.eval_results['rrt_iter'].append(self.rrt_iter)
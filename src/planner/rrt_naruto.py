@@ -71,8 +71,7 @@ class RRTNaruto(RRT):
             max_iter (int)                           : maximum base number of iteration for generating RRT nodes
             x/y/z_range (List)                       : x/y/z range
             full_x/y/z_range (List)                  : full x/y/z range
-            points (torch.Tensor, [X*Y*Z, 3])        : full grid points
-            reachable_3d_mask (torch.Tensor, [X,Y,Z]): reachable 3D mask
+            vol_shape (Tuple)                        : volume shape (X, Y, Z)
         """
         super(RRTNaruto, self).__init__(
                 bbox           = bbox,
@@ -96,36 +95,25 @@ class RRTNaruto(RRT):
             is_target_reached (bool): is target reached. if the distance is less than step size 
 
         Attributes:
-            nodes (List): RRT nodes
-            nodes_tensor (torch.Tensor, [N, 3]): RRT nodes as torch.Tensor
+            tree_xyz / tree_parents: RRT nodes
         """
+        last_idx = self.num_nodes - 1
+        last_node_arr = self.tree_xyz[last_idx].copy()
         num_collision_free_step, _ = is_collision_free(
-                            self.nodes[-1]._xyz_arr,
+                            last_node_arr,
                             self.goal._xyz_arr, 
                             self.sdf_map,
                             self.step_size,
                             )
         # if complete_free:
         if num_collision_free_step > 0:
-            x_diff = self.goal.x - self.nodes[-1].x
-            y_diff = self.goal.y - self.nodes[-1].y
-            z_diff = self.goal.z - self.nodes[-1].z
-            distance = np.linalg.norm([x_diff, y_diff, z_diff])
-            cur_nearest_node = nearest_node = self.nodes[-1]
-            for i in range(num_collision_free_step):
-                x_new2 = nearest_node.x + (x_diff / distance) * min(self.step_size * (i + 1), distance)
-                y_new2 = nearest_node.y + (y_diff / distance) * min(self.step_size * (i + 1), distance)
-                z_new2 = nearest_node.z + (z_diff / distance) * min(self.step_size * (i + 1), distance)
-                new_node = Node(x_new2, y_new2, z_new2)
-                new_node.parent = cur_nearest_node
-                self.nodes.append(new_node)
-                self.nodes_tensor = torch.cat([self.nodes_tensor, new_node.get_xyz()])
-
-                ### update current_node ###
-                cur_nearest_node = new_node
+            diff = self.goal._xyz_arr - last_node_arr
+            distance = np.linalg.norm(diff)
+            steps = np.minimum(self.step_size * np.arange(1, num_collision_free_step + 1), distance)
+            self.add_node_chain(last_node_arr + (diff / distance) * steps[:, None], last_idx)
             
             ### return True if target is reached ###
-            if torch.norm(self.nodes_tensor[-1] - self.goal.get_xyz(), dim=1) < self.step_size:
+            if np.linalg.norm(self.tree_xyz[self.num_nodes - 1] - self.goal._xyz_arr) < self.step_size:
                 return True
             else:
                 return False
@@ -144,45 +132,35 @@ class RRTNaruto(RRT):
             num_collision_free_step (int): number of collision free steps
         
         Attributes:
-            nodes (List): RRT nodes
-            nodes_tensor (torch.Tensor, [N, 3]): RRT nodes as torch.Tensor
+            tree_xyz / tree_parents: RRT nodes
         """
         ##################################################
         ### genreate random point and find the nearest node from RRT
         ##################################################
         random_point = self.generate_random_point(full_range, use_free_space)
-        nearest_node = self.find_nearest_node(random_point)
+        nearest_idx = self.find_nearest_node(random_point)
+        nearest_node_arr = self.tree_xyz[nearest_idx].copy()
 
         ##################################################
         ### add new nodes
         ##################################################
         ### compute the random point to be added ###
-        diff = random_point - nearest_node._xyz_arr
+        diff = random_point - nearest_node_arr
         distance = np.linalg.norm(diff)
         if distance > self.step_size * self.step_amplifier:
-            new_node_arr = nearest_node._xyz_arr + diff / distance * min(self.step_size * self.step_amplifier, distance)
+            new_node_arr = nearest_node_arr + diff / distance * min(self.step_size * self.step_amplifier, distance)
         else:
             new_node_arr = random_point
-        new_node = Node(*new_node_arr)
 
         ### detetermine how many interpolated points are collision-free ###
-        num_collision_free_step, _ = is_collision_free(nearest_node._xyz_arr, new_node._xyz_arr, self.sdf_map, step_size=self.step_size, collision_thre=self.collision_thre)
+        num_collision_free_step, _ = is_collision_free(nearest_node_arr, new_node_arr, self.sdf_map, step_size=self.step_size, collision_thre=self.collision_thre)
 
         ## add new collision-free points into the nodes ##
         if num_collision_free_step > 0:
-            diff = new_node._xyz_arr - nearest_node._xyz_arr
+            diff = new_node_arr - nearest_node_arr
             distance = np.linalg.norm(diff)
-            cur_nearest_node = nearest_node
-            for i in range(num_collision_free_step):
-                new_node_arr = nearest_node._xyz_arr + diff / (distance+1e-8) * min(self.step_size * (i+1), distance)
-
-                new_node = Node(*new_node_arr)
-                new_node.parent = cur_nearest_node
-                self.nodes.append(new_node)
-                self.nodes_tensor = torch.cat([self.nodes_tensor, new_node.get_xyz()])
-
-                ### update nearest_node ###
-                cur_nearest_node = new_node
+            steps = np.minimum(self.step_size * np.arange(1, num_collision_free_step + 1), distance)
+            self.add_node_chain(nearest_node_arr + diff / (distance+1e-8) * steps[:, None], nearest_idx)
         
         return num_collision_free_step
 
@@ -193,7 +171,7 @@ class RRTNaruto(RRT):
             target_reachable (bool): is target reachable
 
         Attributes:
-            goal (Node): update goal.parent
+            goal_parent (int): parent node index of the goal
         """
         ### RRT planning ###
         for step in tqdm(range(self.max_iter), desc='RRT planning: '):
@@ -210,27 +188,27 @@ class RRTNaruto(RRT):
                 
                 ### early break if newly added line points can reach target ###
                 if num_new_nodes > 0:
-                    dist_new_nodes_to_goal = torch.norm(self.nodes_tensor[-num_new_nodes:] - self.goal.get_xyz(), dim=1)
-                    min_dist = torch.min(dist_new_nodes_to_goal).item()
+                    dist_new_nodes_to_goal = np.linalg.norm(self.tree_xyz[self.num_nodes-num_new_nodes:self.num_nodes] - self.goal._xyz_arr, axis=1)
+                    min_dist = np.min(dist_new_nodes_to_goal)
                     if min_dist < self.step_size:
                         break
             else:
                 num_new_nodes = target_reached = self.extend_tree()
                 ### early break if newly added line points can reach target ###
                 if num_new_nodes > 0:
-                    dist_new_nodes_to_goal = torch.norm(self.nodes_tensor[-num_new_nodes:] - self.goal.get_xyz(), dim=1)
-                    min_dist = torch.min(dist_new_nodes_to_goal).item()
+                    dist_new_nodes_to_goal = np.linalg.norm(self.tree_xyz[self.num_nodes-num_new_nodes:self.num_nodes] - self.goal._xyz_arr, axis=1)
+                    min_dist = np.min(dist_new_nodes_to_goal)
                     if min_dist < self.step_size:
                         break
         
         ### check if RRT sucess ###
         last = self.find_nearest_node(self.goal._xyz_arr)
-        dist_last2goal = np.linalg.norm(last._xyz_arr - self.goal._xyz_arr) # voxel unit
+        dist_last2goal = np.linalg.norm(self.tree_xyz[last] - self.goal._xyz_arr) # voxel unit
         if dist_last2goal > self.step_size:
             target_reachable = False
         else:
             target_reachable = True
-        self.goal.parent = last
+        self.goal_parent = last
         return target_reachable
 
     ##################################################
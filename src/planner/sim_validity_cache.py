@@ -0,0 +1,176 @@
+"""
+MIT License
+
+Copyright (c) 2024 OPPO
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import glob
+import numpy as np
+import os
+import torch
+from typing import Callable, Dict, List, Tuple
+
+
+class SimValidityMaskCache():
+    """ Cache of simulator-validity masks (pixels with valid simulated depth), keyed by the quantized simulator pose.
+    Masks are stored bit-packed, optionally at a reduced resolution, in memory and in an optional per-scene directory
+    so that they are reused across planning steps and across runs.
+    """
+    def __init__(self,
+                 cache_dir   : str = None,
+                 downsample  : int = 1,
+                 trans_res   : float = 1e-3,
+                 rot_res     : float = 1e-3,
+                 flush_size  : int = 256,
+                 ) -> None:
+        """
+        Args:
+            cache_dir (str)  : on-disk store. In-memory only if None
+            downsample (int) : store masks at 1/downsample resolution (nearest), upsampled on lookup
+            trans_res (float): pose quantization of the translation. Unit: meter
+            rot_res (float)  : pose quantization of the rotation matrix entries
+            flush_size (int) : minimum number of new masks written per chunk (unless flushing is forced)
+
+        Attributes:
+            masks (Dict): pose key -> bit-packed mask (np.ndarray, uint8)
+            image_hw (Tuple): full-resolution mask height and width. Set by the first stored mask
+            new_keys (List): keys not yet flushed to cache_dir
+            num_chunks (int): number of chunk files in cache_dir, i.e. index of the next chunk
+        """
+        self.cache_dir = cache_dir
+        self.downsample = downsample
+        self.trans_res = trans_res
+        self.rot_res = rot_res
+        self.flush_size = flush_size
+        self.masks = {}
+        self.image_hw = None
+        self.new_keys = []
+        self.num_chunks = 0
+        if self.cache_dir is not None:
+            self.load()
+
+    def pose_key(self, sim_pose: np.ndarray) -> Tuple:
+        """ quantize a simulator pose into a hashable key
+
+        Args:
+            sim_pose (np.ndarray, [4,4]): simulator camera-to-world pose
+
+        Returns:
+            key (Tuple): 12 integers (quantized rotation and translation)
+        """
+        rot = np.round(sim_pose[:3, :3].reshape(-1) / self.rot_res)
+        trans = np.round(sim_pose[:3, 3] / self.trans_res)
+        return tuple(np.concatenate([rot, trans]).astype(np.int64).tolist())
+
+    def get(self, key: Tuple, device: str = 'cpu') -> torch.Tensor:
+        """ look up a mask
+
+        Args:
+            key (Tuple) : pose key
+            device (str): device of the returned mask
+
+        Returns:
+            mask (torch.Tensor, [H,W]): validity mask. None if not cached
+        """
+        packed = self.masks.get(key, None)
+        if packed is None:
+            return None
+        H, W = self.image_hw
+        h, w = -(-H // self.downsample), -(-W // self.downsample)
+        mask = torch.from_numpy(np.unpackbits(packed, count=h * w).reshape(h, w).astype(bool)).to(device)
+        if self.downsample > 1:
+            mask = mask.repeat_interleave(self.downsample, dim=0).repeat_interleave(self.downsample, dim=1)[:H, :W]
+        return mask
+
+    def put(self, key: Tuple, mask: torch.Tensor) -> None:
+        """ store a mask
+
+        Args:
+            key (Tuple)              : pose key
+            mask (torch.Tensor, [H,W]): validity mask
+        """
+        if self.image_hw is None:
+            self.image_hw = tuple(mask.shape)
+        assert tuple(mask.shape) == self.image_hw, "all cached masks must share the same resolution"
+        mask = mask[::self.downsample, ::self.downsample].cpu().numpy().astype(bool)
+        self.masks[key] = np.packbits(mask.reshape(-1))
+        self.new_keys.append(key)
+
+    def get_or_compute(self, sim_poses: List[np.ndarray], compute_fn: Callable, device: str = 'cpu') -> torch.Tensor:
+        """ look up masks, computing (and caching) the missing ones
+
+        Args:
+            sim_poses (List): simulator camera-to-world poses, each (np.ndarray, [4,4])
+            compute_fn (Callable): sim_pose -> mask (torch.Tensor, [H,W])
+            device (str): device of the returned masks
+
+        Returns:
+            masks (torch.Tensor, [N,H,W]): validity masks
+        """
+        masks = []
+        for sim_pose in sim_poses:
+            key = self.pose_key(sim_pose)
+            mask = self.get(key, device)
+            if mask is None:
+                self.put(key, compute_fn(sim_pose))
+                mask = self.get(key, device) # same (reduced) resolution as cache hits
+            masks.append(mask)
+        return torch.stack(masks)
+
+    def flush(self, force: bool = False) -> None:
+        """ append masks stored since the last flush to cache_dir as a new chunk, 
+        once at least flush_size masks are pending (or whenever pending if force)
+
+        Args:
+            force (bool): write pending masks regardless of flush_size, e.g. at the end of a run
+        """
+        if self.cache_dir is None or len(self.new_keys) == 0:
+            return
+        if not force and len(self.new_keys) < self.flush_size:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        np.savez(
+            os.path.join(self.cache_dir, f"chunk_{self.num_chunks:05}.npz"),
+            keys=np.asarray(self.new_keys, dtype=np.int64),
+            masks=np.stack([self.masks[key] for key in self.new_keys]),
+            meta=np.asarray([*self.image_hw, self.downsample, self.trans_res, self.rot_res]),
+            )
+        self.num_chunks += 1
+        self.new_keys = []
+
+    def load(self) -> None:
+        """ load all chunks in cache_dir. Chunks written with different settings are skipped """
+        chunk_paths = sorted(glob.glob(os.path.join(self.cache_dir, "chunk_*.npz")))
+        self.num_chunks = len(chunk_paths)
+        for chunk_path in chunk_paths:
+            chunk = np.load(chunk_path)
+            H, W, downsample, trans_res, rot_res = chunk['meta'].tolist()
+            if (int(downsample), trans_res, rot_res) != (self.downsample, self.trans_res, self.rot_res):
+                continue
+            if self.image_hw is not None and self.image_hw != (int(H), int(W)):
+                continue
+            self.image_hw = (int(H), int(W))
+            for key, packed in zip(chunk['keys'], chunk['masks']):
+                self.masks[tuple(key.tolist())] = packed
+
+    def __len__(self) -> int:
+        return len(self.masks)
@@ -0,0 +1,188 @@
+"""
+MIT License
+
+Copyright (c) 2024 OPPO
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import torch
+from typing import Tuple
+
+
+class CandidateVisibilityIndex():
+    """ Visibility index of the exploration candidates: the voxel-block bounding box of each candidate's view frustum (up to max_depth).
+    Map changes are stamped into the candidates whose bounding box they overlap, so the candidates affected by map updates
+    are found with one lookup, instead of re-testing every frustum against the changed regions.
+    Candidates are kept sorted by linearized key (see ExplorePool) and cost six int16 block bounds and one int32 version each.
+    """
+    def __init__(self,
+                 block_size: int = 8,
+                 max_depth : float = 4.0,
+                 batch_size: int = 16,
+                 device    : str = 'cpu'
+                 ) -> None:
+        """
+        Args:
+            block_size (int) : block size. Unit: voxel
+            max_depth (float): candidate frustum far plane. Changes beyond it do not affect the candidate. Unit: meter
+            batch_size (int) : candidates per frustum-block test batch
+            device (str)     : device of the index tensors
+
+        Attributes:
+            lin_keys (torch.Tensor, [N])       : sorted linearized keys (ExplorePool.linearize_keys) of the indexed candidates
+            bounds (torch.Tensor, [N,2,3])     : inclusive [min, max] block indices covered by each candidate frustum. min > max if none
+            change_versions (torch.Tensor, [N]): map version of the latest change overlapping each candidate's bounds. -1 if none since indexing
+            synced_version (int)               : map version up to which changes are stamped into change_versions
+            reset_version (int)                : candidates scored before this version are outdated (change log did not reach back)
+        """
+        self.block_size = block_size
+        self.max_depth = max_depth
+        self.batch_size = batch_size
+        self.device = device
+        self.lin_keys = torch.zeros(0, dtype=torch.long, device=device)
+        self.bounds = torch.zeros(0, 2, 3, dtype=torch.int16, device=device)
+        self.change_versions = torch.zeros(0, dtype=torch.int32, device=device)
+        self.synced_version = 0
+        self.reset_version = -1
+
+    def __len__(self) -> int:
+        return self.lin_keys.shape[0]
+
+    def lookup(self, lin_keys: torch.Tensor) -> torch.Tensor:
+        """ index position of candidates
+
+        Args:
+            lin_keys (torch.Tensor, [N]): linearized candidate keys
+
+        Returns:
+            idx (torch.Tensor, [N]): position in the index. -1 if not indexed
+        """
+        lin_keys = lin_keys.to(self.device)
+        if len(self) == 0:
+            return torch.full_like(lin_keys, -1)
+        pos = torch.searchsorted(self.lin_keys, lin_keys).clamp(max=len(self) - 1)
+        return torch.where(self.lin_keys[pos] == lin_keys, pos, torch.full_like(pos, -1))
+
+    @torch.no_grad()
+    def add(self,
+            explr_map,
+            cand_poses: torch.Tensor,
+            cand_keys : torch.Tensor,
+            lin_keys  : torch.Tensor,
+            intrinsics: torch.Tensor,
+            image_hw  : Tuple
+            ) -> None:
+        """ index the blocks covered by the frustums of new candidates. Already indexed candidates are skipped
+
+        Args:
+            explr_map (ExplorationMap)        : exploration map
+            cand_poses (torch.Tensor, [N,4,4]): candidate poses. Format: camera-to-world, RDF (SLAM world)
+            cand_keys (torch.Tensor, [N,4])   : candidate keys [X, Y, Z, R_i]
+            lin_keys (torch.Tensor, [N])      : linearized candidate keys
+            intrinsics (torch.Tensor, [3,3])  : camera intrinsics
+            image_hw (Tuple)                  : image height and width
+        """
+        lin_keys = lin_keys.to(self.device)
+
+        ### first occurrence of each candidate not indexed yet ###
+        uniq_keys, inverse = torch.unique(lin_keys, return_inverse=True)
+        first_idx = torch.full_like(uniq_keys, lin_keys.shape[0]).scatter_reduce_(
+            0, inverse, torch.arange(lin_keys.shape[0], device=self.device), reduce='amin')
+        first_idx = first_idx[self.lookup(uniq_keys) < 0]
+        if first_idx.shape[0] == 0:
+            return
+        cand_poses, cand_keys, lin_keys = cand_poses[first_idx.to(cand_poses.device)], cand_keys[first_idx.to(cand_keys.device)], lin_keys[first_idx]
+
+        ### blocks within max_depth of the candidate location (a cube of block offsets), clipped to the grid ###
+        radius = int(self.max_depth / explr_map.voxel_size / self.block_size) + 1
+        offsets = torch.arange(-radius, radius + 1, device=explr_map.device)
+        offsets = torch.stack(torch.meshgrid(offsets, offsets, offsets, indexing='ij'), dim=-1).reshape(-1, 3)
+        cand_blocks = torch.div(cand_keys[:, :3].to(explr_map.device).long(), self.block_size, rounding_mode='floor')
+        grid_dims = explr_map.get_grid_dims()
+
+        ### bounding box of the blocks covered by each frustum ###
+        bounds = []
+        extrinsics = torch.inverse(cand_poses.to(explr_map.device))
+        for i in range(0, cand_blocks.shape[0], self.batch_size):
+            blocks = cand_blocks[i:i+self.batch_size, None] + offsets # C,M,3
+            regions = torch.stack([blocks * self.block_size, (blocks + 1) * self.block_size], dim=2) # C,M,2,3
+            covered = explr_map.regions_frustums_overlap(regions, intrinsics, extrinsics[i:i+self.batch_size], image_hw, self.max_depth)
+            if grid_dims is not None:
+                covered &= ((regions[:, :, 1] > 0) & (regions[:, :, 0] < grid_dims)).all(dim=-1)
+            covered = covered[..., None]
+            bounds.append(torch.stack([
+                torch.where(covered, blocks, torch.full_like(blocks, torch.iinfo(torch.int16).max)).amin(dim=1),
+                torch.where(covered, blocks, torch.full_like(blocks, torch.iinfo(torch.int16).min)).amax(dim=1),
+                ], dim=1))
+        bounds = torch.cat(bounds).clamp(torch.iinfo(torch.int16).min, torch.iinfo(torch.int16).max).to(self.device, torch.int16)
+
+        ### merge and keep the index sorted by linearized key ###
+        self.lin_keys, order = torch.sort(torch.cat([self.lin_keys, lin_keys]))
+        self.bounds = torch.cat([self.bounds, bounds])[order]
+        self.change_versions = torch.cat([self.change_versions, torch.full_like(lin_keys, -1, dtype=torch.int32)])[order]
+
+    def remove(self, lin_keys: torch.Tensor) -> None:
+        """ drop candidates
+
+        Args:
+            lin_keys (torch.Tensor, [N]): linearized candidate keys
+        """
+        keep_mask = ~torch.isin(self.lin_keys, lin_keys.to(self.device))
+        self.lin_keys, self.bounds, self.change_versions = self.lin_keys[keep_mask], self.bounds[keep_mask], self.change_versions[keep_mask]
+
+    @torch.no_grad()
+    def sync(self, explr_map) -> None:
+        """ stamp the candidates overlapping the regions changed since the last sync with the current map version
+
+        Args:
+            explr_map (ExplorationMap): exploration map
+        """
+        if explr_map.map_version == self.synced_version:
+            return
+        regions = explr_map.get_changed_regions(self.synced_version)
+        if regions is None:
+            ### change log does not reach back: every candidate scored before now is outdated ###
+            self.reset_version = explr_map.map_version
+        elif regions.shape[0] > 0 and len(self) > 0:
+            ### inclusive block range of each changed [min, max) voxel region ###
+            regions = regions.to(self.device).long()
+            region_b0 = torch.div(regions[:, 0], self.block_size, rounding_mode='floor')
+            region_b1 = torch.div(regions[:, 1] - 1, self.block_size, rounding_mode='floor')
+            bounds = self.bounds.long()
+            changed = torch.zeros(len(self), dtype=torch.bool, device=self.device)
+            for i in range(0, regions.shape[0], self.batch_size):
+                changed |= ((bounds[:, None, 0] <= region_b1[None, i:i+self.batch_size]) & 
+                            (bounds[:, None, 1] >= region_b0[None, i:i+self.batch_size])).all(dim=-1).any(dim=1)
+            self.change_versions[changed] = explr_map.map_version
+        self.synced_version = explr_map.map_version
+
+    def get_change_versions(self, lin_keys: torch.Tensor) -> torch.Tensor:
+        """ latest change version overlapping the frustum bounds of each candidate
+
+        Args:
+            lin_keys (torch.Tensor, [N]): linearized candidate keys
+
+        Returns:
+            versions (torch.Tensor, [N]): latest change version. -1 if nothing changed within the bounds since indexing (or not indexed)
+        """
+        idx = self.lookup(lin_keys)
+        versions = torch.full_like(idx, -1)
+        versions[idx >= 0] = self.change_versions[idx[idx >= 0]].long()
+        return versions
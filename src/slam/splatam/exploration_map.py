@@ -1,10 +1,20 @@
+import json
+import os
 import torch
 import numpy as np
 import open3d as o3d
-from typing import Tuple
+from typing import Dict, List, Tuple
 
 class ExplorationMap:
-    def __init__(self, bounding_box, voxel_size, device='cpu', transform=None, use_xyz_filter = None, xy_sampling_step = None, gs_z_levels = None):
+    ### voxel states (int8) ###
+    OCCUPIED = 1
+    UNKNOWN = 0
+    FREE = -1       # truncated free space
+    NEGLECTED = -2  # free space too close to the surface
+    DIST_FIELD_EMPTY = torch.iinfo(torch.int16).max # no occupied voxel within truncation
+
+    def __init__(self, bounding_box, voxel_size, device='cpu', transform=None, use_xyz_filter = None, xy_sampling_step = None, gs_z_levels = None,
+                 use_dist_field: bool = True, dist_field_trunc: float = 1.0, level_steps: List = None):
         """
         Initialize the ExplorationMap with a bounding box, voxel size, device, and optional transform.
 
@@ -13,6 +23,9 @@ class ExplorationMap:
             voxel_size (float)                : Size of each voxel in the grid
             device (str)                      : The device to store the tensors ('cpu' or 'cuda')
             transform (torch.Tensor, optional): 4x4 transformation matrix to reposition the origin (sim2slam)
+            use_dist_field (bool)             : maintain an incremental distance-to-occupied field for free-space truncation
+            dist_field_trunc (float)          : truncation distance of the distance field. Unit: meter
+            level_steps (List)                : XY sampling steps of the coarse levels, e.g. planner.xy_sampling_step. Unit: meter
         """
         self.bounding_box = bounding_box
         self.voxel_size = voxel_size
@@ -21,6 +34,10 @@ class ExplorationMap:
         self.slam2sim = torch.inverse(self.sim2slam)
         self.occupancy_grid, self.origin = self.create_occupancy_grid() # self.origin in Sim Space
         self.gs_z_levels = gs_z_levels 
+        self.init_dist_field(use_dist_field, dist_field_trunc)
+        self.frontier_mask = torch.zeros_like(self.occupancy_grid, dtype=torch.bool)
+        self.init_levels(level_steps)
+        self.init_change_log()
         self.update_prev_free_voxels(
             use_xyz_filter=use_xyz_filter, xy_sampling_step=xy_sampling_step, gs_z_levels=gs_z_levels
             )
@@ -30,7 +47,7 @@ class ExplorationMap:
         Create a 3D occupancy grid based on the bounding box and voxel size.
 
         Returns:
-            occupancy_grid (torch.Tensor): A 3D tensor representing the occupancy grid
+            occupancy_grid (torch.Tensor): A 3D int8 tensor of voxel states (OCCUPIED/UNKNOWN/FREE/NEGLECTED)
             origin (torch.Tensor)        : The origin point of the occupancy grid in world coordinates
         """
         # Compute the dimensions of the occupancy grid
@@ -38,12 +55,116 @@ class ExplorationMap:
         max_bound = torch.tensor([self.bounding_box[0][1], self.bounding_box[1][1], self.bounding_box[2][1]], device=self.device)
         grid_dimensions = ((max_bound - min_bound) / self.voxel_size).ceil().long()
 
-        # Create an empty occupancy grid initialized to 0 (unoccupied)
-        occupancy_grid = torch.zeros(*grid_dimensions, dtype=torch.float32, device=self.device, requires_grad=False)
+        # Create an empty occupancy grid initialized to 0 (unexplored). int8 voxel states
+        occupancy_grid = torch.full(tuple(grid_dimensions.tolist()), self.UNKNOWN, dtype=torch.int8, device=self.device)
         
         # Return the occupancy grid and the origin (minimum bound)
         return occupancy_grid, min_bound
 
+    def init_dist_field(self, use_dist_field: bool = True, dist_field_trunc: float = 1.0):
+        """ initialize the truncated distance-to-occupied field.
+        Occupied voxels are never overwritten by update_from_depth_maps(), so the field only decreases 
+        and can be updated incrementally around newly occupied voxels.
+
+        Args:
+            use_dist_field: maintain the distance field. Otherwise, fall back to brute-force distance computation
+            dist_field_trunc: truncation distance. Unit: meter
+
+        Attributes:
+            dist_field (torch.Tensor, [D,H,W]): int16 squared distance to the closest occupied voxel. Unit: voxel^2. DIST_FIELD_EMPTY if beyond truncation
+            dist_field_trunc (int)            : truncation distance. Unit: voxel
+            dist_kernel_offsets (torch.Tensor, [K,3]): voxel offsets within the truncation sphere
+            dist_kernel_dists (torch.Tensor, [K])    : int16 squared length of the offsets. Unit: voxel^2
+        """
+        if not(use_dist_field):
+            self.dist_field = None
+            return
+
+        self.dist_field_trunc = int(np.ceil(dist_field_trunc / self.voxel_size))
+        assert self.dist_field_trunc ** 2 < self.DIST_FIELD_EMPTY, "dist_field_trunc is too large for the int16 distance field"
+        self.dist_field = self.create_dist_field()
+        self.init_dist_kernel(self.dist_field_trunc)
+
+    def init_dist_kernel(self, dist_field_trunc: int) -> None:
+        """ precompute the spherical neighbourhood (squared distances are exact integers)
+
+        Args:
+            dist_field_trunc (int): truncation distance. Unit: voxel
+        """
+        self.dist_field_trunc = dist_field_trunc
+        R = self.dist_field_trunc
+        r = torch.arange(-R, R + 1, device=self.device)
+        offsets = torch.stack(torch.meshgrid(r, r, r, indexing='ij'), dim=-1).reshape(-1, 3)
+        sq_dists = (offsets ** 2).sum(dim=1)
+        self.dist_kernel_offsets = offsets[sq_dists <= R ** 2]
+        self.dist_kernel_dists = sq_dists[sq_dists <= R ** 2].to(torch.int16)
+
+    def create_dist_field(self) -> torch.Tensor:
+        """ allocate an empty distance field matching the occupancy grid """
+        return torch.full(self.occupancy_grid.shape, self.DIST_FIELD_EMPTY, dtype=torch.int16, device=self.device)
+
+    @torch.no_grad()
+    def update_dist_field(self, occupied_indices: torch.Tensor, batch_size: int = 1000):
+        """ update the distance field around newly occupied voxels
+
+        Args:
+            occupied_indices (torch.Tensor, [N,3]): newly occupied voxel indices
+            batch_size: number of occupied voxels processed per batch
+
+        Attributes:
+            dist_field (torch.Tensor, [D,H,W]): updated distance field
+        """
+        if self.dist_field is None or occupied_indices.shape[0] == 0:
+            return
+
+        D, H, W = self.dist_field.shape
+        dims = torch.tensor([D, H, W], device=self.device)
+        dist_flat = self.dist_field.view(-1)
+        for i in range(0, occupied_indices.shape[0], batch_size):
+            ### neighbourhood of every occupied voxel in the batch ###
+            nbrs = occupied_indices[i:i+batch_size].unsqueeze(1) + self.dist_kernel_offsets.unsqueeze(0) # N,K,3
+            dists = self.dist_kernel_dists.unsqueeze(0).expand(nbrs.shape[0], -1)
+            valid_mask = ((nbrs >= 0) & (nbrs < dims)).all(dim=-1)
+            nbrs = nbrs[valid_mask]
+            lin_idx = (nbrs[:, 0] * H + nbrs[:, 1]) * W + nbrs[:, 2]
+
+            ### keep the minimum distance per voxel ###
+            dist_flat.scatter_reduce_(0, lin_idx, dists[valid_mask], reduce='amin')
+
+    def lookup_dist_field(self, vxl: torch.Tensor) -> torch.Tensor:
+        """ read distances from the squared distance field
+
+        Args:
+            vxl (torch.Tensor, [M,3]): in-bound voxel indices
+
+        Returns:
+            min_distances (torch.Tensor, [M]): distance to the closest occupied voxel. Unit: voxel. inf if beyond truncation
+        """
+        sq_dists = self.dist_field[vxl[:, 0], vxl[:, 1], vxl[:, 2]]
+        min_distances = sq_dists.float().sqrt()
+        min_distances[sq_dists == self.DIST_FIELD_EMPTY] = float('inf')
+        return min_distances
+
+    def query_dist_to_occ(self, query_points: torch.Tensor) -> torch.Tensor:
+        """ look up the distance to the closest occupied voxel from the distance field
+
+        Args:
+            query_points (torch.Tensor, [M,3]): query points. Unit: voxel
+
+        Returns:
+            min_distances (torch.Tensor, [M]): distance to the closest occupied voxel. Unit: voxel. inf if beyond truncation
+        """
+        if self.dist_field is None:
+            return self.compute_min_distance_from_occ(self.occupancy_grid, query_points)
+
+        D, H, W = self.dist_field.shape
+        vxl = torch.round(query_points).long()
+        inside_mask = ((vxl >= 0) & (vxl < torch.tensor([D, H, W], device=vxl.device))).all(dim=1)
+        min_distances = torch.full((query_points.shape[0],), float('inf'), device=self.device)
+        vxl = vxl[inside_mask]
+        min_distances[inside_mask] = self.lookup_dist_field(vxl)
+        return min_distances
+
     def mark_voxel_occupied(self, indices):
         """
         Mark a voxel as occupied in the occupancy grid.
@@ -51,10 +172,130 @@ class ExplorationMap:
         Parameters:
             indices (tuple): The indices of the voxel to mark as occupied
         """
-        self.occupancy_grid[indices] = 1.0
+        self.occupancy_grid[indices] = self.OCCUPIED
+        occupied_indices = torch.stack([torch.as_tensor(i, device=self.device).reshape(-1) for i in indices], dim=1)
+        self.update_dist_field(occupied_indices)
+        self.update_levels(occupied_indices)
+        self.update_frontier(occupied_indices)
+        self.log_changed_region(occupied_indices)
+
+    def inside_bounds_mask(self, indices: torch.Tensor) -> torch.Tensor:
+        """ mask of voxel indices inside the grid """
+        dims = torch.tensor(self.occupancy_grid.shape, device=indices.device)
+        return ((indices >= 0) & (indices < dims)).all(dim=1)
+
+    def get_voxel_states(self, indices: torch.Tensor) -> torch.Tensor:
+        """ read voxel states
+
+        Args:
+            indices (torch.Tensor, [N,3]): voxel indices
+
+        Returns:
+            states (torch.Tensor, [N]): int8 voxel states
+        """
+        return self.occupancy_grid[indices[:, 0], indices[:, 1], indices[:, 2]]
+
+    def set_voxel_states(self, indices: torch.Tensor, state: int) -> None:
+        """ write voxel states
+
+        Args:
+            indices (torch.Tensor, [N,3]): voxel indices
+            state (int)                  : voxel state
+        """
+        self.occupancy_grid[indices[:, 0], indices[:, 1], indices[:, 2]] = state
+
+    def export_dense_grid(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        """ dense voxel state grid and its origin, e.g. for the local planner
+
+        Returns:
+            Tuple: 
+                - occupancy_grid (torch.Tensor, [D,H,W]): int8 voxel states
+                - origin (torch.Tensor, [3]): location of voxel (0,0,0) in Sim space
+        """
+        return self.occupancy_grid, self.origin
+
+    def occupied_mask(self) -> torch.Tensor:
+        """ occupied voxel mask, [D,H,W] bool """
+        return self.occupancy_grid == self.OCCUPIED
+
+    def unknown_mask(self) -> torch.Tensor:
+        """ unexplored voxel mask, [D,H,W] bool """
+        return self.occupancy_grid == self.UNKNOWN
+
+    def free_mask(self) -> torch.Tensor:
+        """ truncated free voxel mask, [D,H,W] bool """
+        return self.occupancy_grid == self.FREE
+
+    def neglected_mask(self) -> torch.Tensor:
+        """ neglected free voxel (close to the surface) mask, [D,H,W] bool """
+        return self.occupancy_grid == self.NEGLECTED
+
+    def free_space_mask(self) -> torch.Tensor:
+        """ any observed free voxel (truncated or neglected) mask, [D,H,W] bool """
+        return self.occupancy_grid < self.UNKNOWN
+
+    @classmethod
+    def occ_grid_to_sdf(cls, 
+                        occ_grid    : torch.Tensor,
+                        occupied_val: float = 0.,
+                        free_val    : float = 100.,
+                        unknown_val : float = 0.,
+                        ) -> np.ndarray:
+        """ convert an int8 voxel state grid to a pseudo-SDF volume for the local planner.
+        The compact grid is copied to CPU first and expanded there with a lookup table.
+
+        Args:
+            occ_grid (torch.Tensor, [D,H,W]): voxel states
+            occupied_val (float)            : value for occupied voxels (surface)
+            free_val (float)                : value for free and neglected voxels (+ve free space)
+            unknown_val (float)             : value for unexplored voxels
+
+        Returns:
+            sdf_vol (np.ndarray, [D,H,W]): float32 SDF volume
+        """
+        ### lookup table indexed by (state - NEGLECTED) ###
+        lut = np.empty(cls.OCCUPIED - cls.NEGLECTED + 1, dtype=np.float32)
+        lut[cls.NEGLECTED - cls.NEGLECTED] = free_val
+        lut[cls.FREE - cls.NEGLECTED] = free_val
+        lut[cls.UNKNOWN - cls.NEGLECTED] = unknown_val
+        lut[cls.OCCUPIED - cls.NEGLECTED] = occupied_val
+
+        occ_grid_np = occ_grid.detach().to(torch.int8).cpu().numpy()
+        sdf_vol = lut[occ_grid_np.astype(np.intp) - cls.NEGLECTED]
+        return sdf_vol
+
+    def to_sdf_volume(self, **kwargs) -> np.ndarray:
+        """ convert the voxel state grid to a float32 pseudo-SDF volume on CPU. See occ_grid_to_sdf() """
+        return self.occ_grid_to_sdf(self.occupancy_grid, **kwargs)
+
+    def memory_report(self) -> Dict:
+        """ report memory footprint of the map buffers
+
+        Returns:
+            report (Dict): buffer sizes (MB), voxel state counts, and float32-grid equivalent (MB)
+        """
+        def size_mb(t):
+            return 0. if t is None else t.element_size() * t.nelement() / 1024 ** 2
+
+        report = {
+            "grid_shape": list(self.occupancy_grid.shape),
+            "occupancy_grid (MB)": size_mb(self.occupancy_grid),
+            "dist_field (MB)": size_mb(self.dist_field),
+            "frontier_mask (MB)": size_mb(self.frontier_mask),
+            "free_change_log (MB)": sum(size_mb(t) for t in self.free_change_log),
+            "levels (MB)": sum(size_mb(t) for level in self.levels.values() for t in level.values()),
+            "float32_grid_equivalent (MB)": self.occupancy_grid.nelement() * 4 / 1024 ** 2,
+            "num_occupied": int(self.occupied_mask().sum()),
+            "num_free": int(self.free_mask().sum()),
+            "num_neglected": int(self.neglected_mask().sum()),
+            "num_unknown": int(self.unknown_mask().sum()),
+            "num_frontier": int(self.frontier_mask.sum()),
+        }
+        report["total (MB)"] = report["occupancy_grid (MB)"] + report["dist_field (MB)"] + report["frontier_mask (MB)"] + report["free_change_log (MB)"] + report["levels (MB)"]
+        return report
 
     def get_world_coordinates_from_grid(self, 
-                                        value: float = None, 
+                                        value: int = None, 
                                         in_slam_world: bool = False
                                         ) -> torch.Tensor:
         """
@@ -97,14 +338,14 @@ class ExplorationMap:
         Compute the closest distance to the occupied voxel to each point in a tensor of query points in a 3D occupancy grid,
 
         Args:
-            grid (torch.Tensor): A 3D occupancy grid where occupied voxels are marked by 1, and free space by 0 or -1.
+            grid (torch.Tensor): A 3D occupancy grid where occupied voxels are marked by OCCUPIED (1), and free space by FREE (-1).
             query_points (torch.Tensor): A tensor of shape (M, 3), where each row represents a query point (x, y, z).
 
         Returns:
             min_distance (torch.Tensor): min distance to the occupied grid
         """
         ### Step 1: Get coordinates of all occupied voxels in the grid ###
-        occupied_voxel_coords = torch.nonzero(grid == 1, as_tuple=False)  ### Shape (num_occupied, 3)
+        occupied_voxel_coords = torch.nonzero(grid == self.OCCUPIED, as_tuple=False)  ### Shape (num_occupied, 3)
 
         ### initialization case ###
         if occupied_voxel_coords.size(0) == 0:
@@ -128,7 +369,7 @@ class ExplorationMap:
         along with the distance to each closest occupied voxel.
 
         Args:
-            grid (torch.Tensor): A 3D occupancy grid where occupied voxels are marked by 1, and free space by 0 or -1.
+            grid (torch.Tensor): A 3D occupancy grid where occupied voxels are marked by OCCUPIED (1), and free space by FREE (-1).
             query_points (torch.Tensor): A tensor of shape (M, 3), where each row represents a query point (x, y, z).
             dist_thre (float): distance from the surface threshold
 
@@ -138,7 +379,7 @@ class ExplorationMap:
                 - A tensor of shape (M, 3) with the coordinates of the neglected free regions.
         """
         ### Step 1: Get coordinates of all occupied voxels in the grid ###
-        occupied_voxel_coords = torch.nonzero(grid == 1, as_tuple=False)  ### Shape (num_occupied, 3)
+        occupied_voxel_coords = torch.nonzero(grid == self.OCCUPIED, as_tuple=False)  ### Shape (num_occupied, 3)
 
         ### initialization case ###
         if occupied_voxel_coords.size(0) == 0:
@@ -170,13 +411,98 @@ class ExplorationMap:
         neglected_free_indices = query_points[~valid_free_indices_mask]
         return truncated_free_indices, neglected_free_indices
 
+    @torch.no_grad()
+    def split_free_indices(self, query_points: torch.Tensor, dist_thre: float = 0.5, batch_size: int = 10000) -> Tuple[torch.Tensor, torch.Tensor]:
+        """ split free candidates into truncated free region and neglected free region (close to the surface).
+        Use O(1) distance field lookups if the distance field covers dist_thre, otherwise run find_free_indices().
+
+        Args:
+            query_points (torch.Tensor, [M,3]): free candidate voxel indices
+            dist_thre (float): distance from the surface threshold
+            batch_size (int): batch size for the brute-force fallback
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: truncated free voxel indices and neglected free voxel indices
+        """
+        if self.dist_field is None or dist_thre > self.dist_field_trunc * self.voxel_size:
+            return self.find_free_indices(self.occupancy_grid, query_points, dist_thre=dist_thre, batch_size=batch_size)
+
+        min_distances = self.lookup_dist_field(query_points)
+        valid_free_indices_mask = (min_distances * self.voxel_size) > dist_thre
+        truncated_free_indices = query_points[valid_free_indices_mask]
+        neglected_free_indices = query_points[~valid_free_indices_mask]
+        return truncated_free_indices, neglected_free_indices
+
+    def compute_frustum_aabb(self,
+                             depth_map : torch.Tensor,
+                             intrinsics: torch.Tensor,
+                             extrinsics: torch.Tensor
+                             ) -> torch.Tensor:
+        """ compute the voxel-space axis-aligned bounding box of the camera frustum, truncated at the maximum depth
+
+        Args:
+            depth_map : The depth map of shape (H, W)
+            intrinsics: Camera intrinsic matrix of shape (3, 3)
+            extrinsics: Camera extrinsic matrix of shape (4, 4). world-to-camera
+
+        Returns:
+            aabb (torch.Tensor, [2,3]): [min, max) voxel index range, clamped to the grid. None if the depth map is empty
+        """
+        max_depth = depth_map.max()
+        if max_depth <= 0:
+            return None
+        max_depth = max_depth + self.voxel_size
+
+        ### camera center and image corners at the maximum depth (camera_slam) ###
+        H, W = depth_map.shape
+        fx, fy = intrinsics[0, 0], intrinsics[1, 1]
+        cx, cy = intrinsics[0, 2], intrinsics[1, 2]
+        corners_u = torch.tensor([0., W, 0., W], device=self.device)
+        corners_v = torch.tensor([0., 0., H, H], device=self.device)
+        corners = torch.stack([
+            (corners_u - cx) / fx * max_depth,
+            (corners_v - cy) / fy * max_depth,
+            max_depth.expand(4)
+            ], dim=1)
+        frustum_pts = torch.cat([torch.zeros(1, 3, device=self.device), corners], dim=0)
+
+        ### camera_slam -> world_slam -> world_sim -> voxel ###
+        cam2sim = self.slam2sim @ torch.inverse(extrinsics)
+        frustum_pts_sim = frustum_pts @ cam2sim[:3, :3].T + cam2sim[:3, 3]
+        frustum_vxl = self.transform_xyz_to_vxl(frustum_pts_sim)
+
+        ### pad one voxel for rounding ###
+        dims = torch.tensor(self.occupancy_grid.shape, device=self.device)
+        aabb_min = (torch.floor(frustum_vxl.min(dim=0)[0]).long() - 1).clamp(min=0)
+        aabb_max = torch.minimum(torch.ceil(frustum_vxl.max(dim=0)[0]).long() + 2, dims)
+        return torch.stack([aabb_min, aabb_max])
+
+    def get_unexplored_indices(self, aabb: torch.Tensor = None) -> torch.Tensor:
+        """ get unexplored voxel indices, optionally restricted to an AABB
+
+        Args:
+            aabb (torch.Tensor, [2,3]): [min, max) voxel index range
+
+        Returns:
+            grid_indices (torch.Tensor, [N,3]): unexplored voxel indices
+        """
+        if aabb is None:
+            return torch.nonzero(self.unknown_mask(), as_tuple=False)
+
+        (x0, y0, z0), (x1, y1, z1) = aabb.tolist()
+        sub_grid = self.occupancy_grid[x0:x1, y0:y1, z0:z1]
+        grid_indices = torch.nonzero(sub_grid == self.UNKNOWN, as_tuple=False) + aabb[0]
+        return grid_indices
+
     @torch.no_grad()
     def update_from_depth_map(self, 
                               depth_map : torch.Tensor,
                               intrinsics: torch.Tensor,
                               extrinsics: torch.Tensor,
                               surface_dist_thre: float,
-                              find_free_indices_bs: int = 10000
+                              find_free_indices_bs: int = 10000,
+                              use_frustum_culling: bool = True,
+                              **kwargs
                               ) -> None:
         """
         Update the occupancy grid from a depth map, marking free and occupied space.
@@ -186,66 +512,626 @@ class ExplorationMap:
             intrinsics: Camera intrinsic matrix of shape (3, 3)
             extrinsics: Camera extrinsic matrix of shape (4, 4). world-to-camera
             surface_dist_thre: threshold that free space has to be away from occupied voxel
+            use_frustum_culling: only project unexplored voxels inside the frustum AABB
+            kwargs: integration_mode / ray_pixel_stride / ray_max_range. See update_from_depth_maps()
         """
-        # Get all unexplored voxel coordinates
-        D, H, W = self.occupancy_grid.shape
-        x, y, z = torch.meshgrid(torch.arange(D, device=self.device), torch.arange(H, device=self.device), torch.arange(W, device=self.device), indexing='ij')
-        grid_indices = torch.stack([x, y, z], dim=-1).reshape(-1, 3)
-        unexplored_mask = self.occupancy_grid.flatten() == 0
-        grid_indices = grid_indices[unexplored_mask]
-        
-        # Convert grid indices to world coordinates
-        world_coords_sim = self.origin + grid_indices * self.voxel_size
-        
-        # Transform world coordinates to camera coordinates
-        N = world_coords_sim.shape[0]
-        homogeneous_coords_sim = torch.cat((world_coords_sim, torch.ones(N, 1, device=self.device)), dim=1)
-        homogeneous_coords_slam = torch.mm(homogeneous_coords_sim, self.sim2slam.T)
-        camera_coords = torch.mm(homogeneous_coords_slam, extrinsics.T)[:, :3] # from world_slam to camera_slam
+        self.update_from_depth_maps(
+            depth_map.unsqueeze(0), intrinsics, extrinsics.unsqueeze(0), 
+            surface_dist_thre, find_free_indices_bs, use_frustum_culling,
+            truncate_with_new_occupied=False,
+            **kwargs
+            )
+
+    @torch.no_grad()
+    def update_from_depth_maps(self, 
+                               depth_maps: torch.Tensor,
+                               intrinsics: torch.Tensor,
+                               extrinsics: torch.Tensor,
+                               surface_dist_thre: float,
+                               find_free_indices_bs: int = 10000,
+                               use_frustum_culling: bool = True,
+                               truncate_with_new_occupied: bool = True,
+                               integration_mode: str = "projection",
+                               ray_pixel_stride: int = 4,
+                               ray_max_range: float = None,
+                               ) -> None:
+        """
+        Fuse a stack of depth maps into the occupancy grid in one pass.
+        A voxel observed as occupied in any frame is occupied (occupied beats free). 
+
+        Parameters:
+            depth_maps: The depth maps of shape (F, H, W)
+            intrinsics: Camera intrinsic matrix of shape (3, 3)
+            extrinsics: Camera extrinsic matrices of shape (F, 4, 4). world-to-camera
+            surface_dist_thre: threshold that free space has to be away from occupied voxel
+            use_frustum_culling: only project unexplored voxels inside the frustum AABBs
+            truncate_with_new_occupied: mark occupied voxels of this update before free space truncation, 
+                so free space is kept away from surfaces seen by any frame of the stack. 
+                Otherwise, only previously occupied voxels are used (single frame behaviour)
+            integration_mode: 
+                - projection: project unexplored voxels into the depth maps. cost scales with the (frustum) volume
+                - raycast: traverse subsampled pixel rays with 3D DDA. cost scales with rays x steps
+            ray_pixel_stride: pixel stride of the rays (raycast)
+            ray_max_range: maximum ray depth. Unit: meter. Surfaces beyond are not marked (raycast)
+        """
+        if integration_mode == "projection":
+            # Get unexplored voxel coordinates (inside the view frustums)
+            grid_indices = self.get_unexplored_indices_in_frustums(depth_maps, intrinsics, extrinsics, use_frustum_culling)
+            if grid_indices is None:
+                return
+            free_cand_indices, occupied_indices = self.classify_voxels_from_depth_maps(
+                grid_indices, depth_maps, intrinsics, extrinsics, surface_dist_thre
+                )
+        elif integration_mode == "raycast":
+            free_cand_indices, occupied_indices = self.raycast_voxels_from_depth_maps(
+                depth_maps, intrinsics, extrinsics, surface_dist_thre, ray_pixel_stride, ray_max_range
+                )
+        else:
+            raise NotImplementedError(f"Integration mode [{integration_mode}] is not implemented.")
+
+        # Mark occupied voxels
+        if truncate_with_new_occupied:
+            self.set_voxel_states(occupied_indices, self.OCCUPIED)
+            self.update_dist_field(occupied_indices)
+
+        # Mark free voxels
+        free_indices, neglected_free_indices = self.split_free_indices(free_cand_indices, dist_thre=surface_dist_thre, batch_size=find_free_indices_bs)
+        self.set_voxel_states(free_indices, self.FREE)
+        if free_indices.shape[0] > 0:
+            self.free_change_log.append(free_indices)
+        self.set_voxel_states(neglected_free_indices, self.NEGLECTED)
+
+        # Mark occupied voxels
+        if not(truncate_with_new_occupied):
+            self.set_voxel_states(occupied_indices, self.OCCUPIED)
+            self.update_dist_field(occupied_indices)
+
+        changed_indices = torch.cat([free_indices, neglected_free_indices, occupied_indices])
+        self.update_levels(changed_indices)
+        self.update_frontier(changed_indices)
+        self.log_changed_region(changed_indices)
+
+    def get_unexplored_indices_in_frustums(self,
+                                           depth_maps: torch.Tensor,
+                                           intrinsics: torch.Tensor,
+                                           extrinsics: torch.Tensor,
+                                           use_frustum_culling: bool = True
+                                           ) -> torch.Tensor:
+        """ get unexplored voxel indices inside the union AABB of the view frustums
+
+        Args:
+            depth_maps (torch.Tensor, [F,H,W]): depth maps
+            intrinsics (torch.Tensor, [3,3])  : camera intrinsics
+            extrinsics (torch.Tensor, [F,4,4]): world-to-camera
+            use_frustum_culling (bool)        : restrict to the frustum AABBs. Otherwise, all unexplored voxels
 
-        # Project camera coordinates to pixel coordinates
+        Returns:
+            grid_indices (torch.Tensor, [N,3]): unexplored voxel indices. None if no frame observes the map
+        """
+        if not(use_frustum_culling):
+            return self.get_unexplored_indices(None)
+
+        aabbs = [self.compute_frustum_aabb(depth_map, intrinsics, w2c) for depth_map, w2c in zip(depth_maps, extrinsics)]
+        aabbs = [aabb for aabb in aabbs if aabb is not None and (aabb[1] > aabb[0]).all()]
+        if len(aabbs) == 0:
+            return None
+        aabbs = torch.stack(aabbs)
+        aabb = torch.stack([aabbs[:, 0].min(dim=0)[0], aabbs[:, 1].max(dim=0)[0]])
+        return self.get_unexplored_indices(aabb)
+
+    def classify_voxels_from_depth_maps(self,
+                                        grid_indices : torch.Tensor,
+                                        depth_maps   : torch.Tensor,
+                                        intrinsics   : torch.Tensor,
+                                        extrinsics   : torch.Tensor,
+                                        surface_dist_thre: float,
+                                        proj_batch_size: int = 2 ** 22
+                                        ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """ project unexplored voxels into all depth maps and classify them. Occupied in any frame beats free.
+
+        Args:
+            grid_indices (torch.Tensor, [N,3]): unexplored voxel indices
+            depth_maps : The depth maps of shape (F, H, W)
+            intrinsics : Camera intrinsic matrix of shape (3, 3)
+            extrinsics : Camera extrinsic matrices of shape (F, 4, 4). world-to-camera
+            surface_dist_thre: threshold that free space has to be away from the observed surface
+            proj_batch_size: maximum number of voxel-frame projections per batch
+
+        Returns:
+            Tuple: free candidate (before truncation) and occupied voxel indices. each is (torch.Tensor, [M,3])
+        """
+        F, H, W = depth_maps.shape
         fx, fy = intrinsics[0, 0], intrinsics[1, 1]
         cx, cy = intrinsics[0, 2], intrinsics[1, 2]
-        u = (camera_coords[:, 0] * fx / camera_coords[:, 2]) + cx
-        v = (camera_coords[:, 1] * fy / camera_coords[:, 2]) + cy
-        depth = camera_coords[:, 2]
+        world2cam = extrinsics @ self.sim2slam # from world_sim to camera_slam
+        depth_maps_flat = depth_maps.reshape(F, -1)
 
-        # Filter valid projections within image bounds
-        H, W = depth_map.shape
-        valid_mask = (u >= 0) & (u < W) & (v >= 0) & (v < H) & (depth > 0)
-        u = u[valid_mask].long()
-        v = v[valid_mask].long()
-        depth = depth[valid_mask]
-        grid_indices = grid_indices[valid_mask]
+        occupied_mask, free_mask = [], []
+        batch_size = max(proj_batch_size // F, 1)
+        for i in range(0, grid_indices.shape[0], batch_size):
+            # Convert grid indices to world coordinates and transform to camera coordinates
+            world_coords_sim = self.origin + grid_indices[i:i+batch_size] * self.voxel_size
+            camera_coords = torch.einsum('fij,nj->fni', world2cam[:, :3, :3], world_coords_sim) + world2cam[:, None, :3, 3] # F,N,3
 
-        # Update occupancy grid based on depth map
-        depth_map_values = depth_map[v, u]
-        occupied_mask = (depth_map_values - depth).abs() < self.voxel_size
+            # Project camera coordinates to pixel coordinates
+            depth = camera_coords[..., 2]
+            u = (camera_coords[..., 0] * fx / depth) + cx
+            v = (camera_coords[..., 1] * fy / depth) + cy
 
-        free_mask = (depth_map_values - depth) > surface_dist_thre  # becoz SplaTAM doesn't update when the camera is close to a surface, keep free region away 5 voxels from the surface
-        free_indices, neglected_free_indices = self.find_free_indices(self.occupancy_grid, grid_indices[free_mask], dist_thre=surface_dist_thre, batch_size=find_free_indices_bs)
+            # Filter valid projections within image bounds
+            valid_mask = (u >= 0) & (u < W) & (v >= 0) & (v < H) & (depth > 0)
+            pix_idx = torch.where(valid_mask, v.long() * W + u.long(), torch.zeros_like(depth, dtype=torch.long))
+            depth_map_values = torch.gather(depth_maps_flat, 1, pix_idx)
 
-        # Mark free voxels
-        # new_free_mask = self.occupancy_grid[free_indices[:, 0], free_indices[:, 1], free_indices[:, 2]] != -1
-        # self._new_free_voxels = free_indices[new_free_mask]
-        self.occupancy_grid[free_indices[:, 0], free_indices[:, 1], free_indices[:, 2]] = -1.0
-        self.occupancy_grid[neglected_free_indices[:, 0], neglected_free_indices[:, 1], neglected_free_indices[:, 2]] = -2.0
+            # classify per frame, then fuse over frames
+            occupied_mask.append((valid_mask & ((depth_map_values - depth).abs() < self.voxel_size)).any(dim=0))
+            free_mask.append((valid_mask & ((depth_map_values - depth) > surface_dist_thre)).any(dim=0)) # becoz SplaTAM doesn't update when the camera is close to a surface, keep free region away 5 voxels from the surface
+        occupied_mask = torch.cat(occupied_mask + [torch.zeros(0, dtype=torch.bool, device=self.device)])
+        free_mask = torch.cat(free_mask + [torch.zeros(0, dtype=torch.bool, device=self.device)]) & ~occupied_mask
 
-        # Mark occupied voxels
-        occupied_indices = grid_indices[occupied_mask]
-        self.occupancy_grid[occupied_indices[:, 0], occupied_indices[:, 1], occupied_indices[:, 2]] = 1.0
+        return grid_indices[free_mask], grid_indices[occupied_mask]
     
+    @torch.no_grad()
+    def raycast_voxels_from_depth_maps(self,
+                                       depth_maps   : torch.Tensor,
+                                       intrinsics   : torch.Tensor,
+                                       extrinsics   : torch.Tensor,
+                                       surface_dist_thre: float,
+                                       pixel_stride : int = 4,
+                                       max_range    : float = None,
+                                       ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """ traverse subsampled pixel rays through the grid with 3D DDA (Amanatides & Woo) and classify unexplored voxels.
+        Voxels passed before reaching (depth - surface_dist_thre) are free candidates; the end voxel is occupied.
+        Rays are parameterized by camera z-depth, so the free/occupied rule matches the projection mode along each ray.
+
+        Args:
+            depth_maps : The depth maps of shape (F, H, W)
+            intrinsics : Camera intrinsic matrix of shape (3, 3)
+            extrinsics : Camera extrinsic matrices of shape (F, 4, 4). world-to-camera
+            surface_dist_thre: threshold that free space has to be away from the observed surface
+            pixel_stride: pixel stride of the rays
+            max_range: maximum ray depth. Unit: meter
+
+        Returns:
+            Tuple: free candidate (before truncation) and occupied voxel indices. each is (torch.Tensor, [M,3])
+        """
+        F, H, W = depth_maps.shape
+        fx, fy = intrinsics[0, 0], intrinsics[1, 1]
+        cx, cy = intrinsics[0, 2], intrinsics[1, 2]
+        max_range = float('inf') if max_range is None else max_range
+
+        ### subsampled rays (camera_slam, z = 1) ###
+        v, u = torch.meshgrid(
+            torch.arange(pixel_stride // 2, H, pixel_stride, device=self.device), 
+            torch.arange(pixel_stride // 2, W, pixel_stride, device=self.device), 
+            indexing='ij'
+            )
+        dirs_cam = torch.stack([(u + 0.5 - cx) / fx, (v + 0.5 - cy) / fy, torch.ones_like(u, dtype=torch.float32)], dim=-1).reshape(-1, 3)
+        depths = depth_maps[:, v.reshape(-1), u.reshape(-1)] # F,R
+
+        ### rays in voxel space: voxel i covers [i-0.5, i+0.5) ###
+        cam2sim = self.slam2sim @ torch.inverse(extrinsics) # F,4,4
+        ray_o = ((cam2sim[:, :3, 3] - self.origin) / self.voxel_size + 0.5).unsqueeze(1).expand(-1, dirs_cam.shape[0], -1)
+        ray_d = torch.einsum('fij,rj->fri', cam2sim[:, :3, :3], dirs_cam) / self.voxel_size
+        valid_mask = depths > 0
+        ray_o, ray_d, depths = ray_o[valid_mask], ray_d[valid_mask], depths[valid_mask]
+
+        ### end voxels (surface) within range are occupied ###
+        hit_mask = depths <= max_range
+        occupied_indices = torch.floor(ray_o[hit_mask] + ray_d[hit_mask] * depths[hit_mask, None]).long()
+
+        ### DDA initialization ###
+        t_free_end = torch.clamp(depths, max=max_range) - surface_dist_thre # free if voxel exit <= t_free_end
+        active_mask = t_free_end > 0
+        ray_o, ray_d, t_free_end = ray_o[active_mask], ray_d[active_mask], t_free_end[active_mask]
+        vxl = torch.floor(ray_o).long()
+        step = torch.sign(ray_d).long()
+        inv_d = 1. / ray_d # inf on axis-parallel rays
+        t_delta = inv_d.abs()
+        t_max = (vxl + (step > 0).long() - ray_o) * inv_d
+        t_max[ray_d == 0] = float('inf')
+
+        ### traverse all rays in lockstep; rays are dropped once they pass t_free_end ###
+        free_cand_indices = []
+        while vxl.shape[0] > 0:
+            t_exit, axis = t_max.min(dim=1)
+            inside_mask = t_exit <= t_free_end
+            free_cand_indices.append(vxl[inside_mask])
+
+            ### advance to the next voxel ###
+            ray_idx = torch.arange(vxl.shape[0], device=self.device)
+            vxl[ray_idx, axis] += step[ray_idx, axis]
+            t_max[ray_idx, axis] += t_delta[ray_idx, axis]
+
+            ### compact rays ###
+            vxl, t_max, step, t_delta, t_free_end = vxl[inside_mask], t_max[inside_mask], step[inside_mask], t_delta[inside_mask], t_free_end[inside_mask]
+        free_cand_indices = torch.cat(free_cand_indices + [torch.empty(0, 3, dtype=torch.long, device=self.device)])
+
+        ### unique voxels via linear indices over the traversed extent. occupied beats free ###
+        num_free = free_cand_indices.shape[0]
+        all_indices = torch.cat([free_cand_indices, occupied_indices])
+        if all_indices.shape[0] == 0:
+            return free_cand_indices, occupied_indices
+        idx_min = all_indices.min(dim=0)[0]
+        dims = all_indices.max(dim=0)[0] - idx_min + 1
+        local = all_indices - idx_min
+        lin_idx = (local[:, 0] * dims[1] + local[:, 1]) * dims[2] + local[:, 2]
+        occupied_lin = torch.unique(lin_idx[num_free:])
+        free_lin = torch.unique(lin_idx[:num_free])
+        free_lin = free_lin[~torch.isin(free_lin, occupied_lin)]
+
+        def delinearize(lin):
+            z = lin % dims[2]
+            y = torch.div(lin, dims[2], rounding_mode='floor') % dims[1]
+            x = torch.div(lin, dims[1] * dims[2], rounding_mode='floor')
+            return torch.stack([x, y, z], dim=1) + idx_min
+
+        ### keep in-bound, unexplored voxels ###
+        free_cand_indices, occupied_indices = delinearize(free_lin), delinearize(occupied_lin)
+        occupied_indices = occupied_indices[self.inside_bounds_mask(occupied_indices)]
+        occupied_indices = occupied_indices[self.get_voxel_states(occupied_indices) == self.UNKNOWN]
+        free_cand_indices = free_cand_indices[self.inside_bounds_mask(free_cand_indices)]
+        free_cand_indices = free_cand_indices[self.get_voxel_states(free_cand_indices) == self.UNKNOWN]
+        return free_cand_indices, occupied_indices
+
+    ##################################################
+    ### map versioning
+    ##################################################
+    def init_change_log(self, map_version: int = 0) -> None:
+        """ initialize the map version and the log of changed regions
+
+        Args:
+            map_version (int): initial map version
+
+        Attributes:
+            map_version (int)              : incremented whenever the map (or the scene model built with it) changes
+            change_log_base_version (int)  : changes at or before this version are not logged
+            changed_region_log (List)      : each element is (version, (torch.Tensor, [2,3])), [min, max) voxel index range changed at that version
+        """
+        self.map_version = map_version
+        self.change_log_base_version = map_version
+        self.changed_region_log = []
+
+    def log_changed_region(self, changed_indices: torch.Tensor) -> None:
+        """ bump the map version and log the AABB of the changed voxels
+
+        Args:
+            changed_indices (torch.Tensor, [N,3]): changed voxel indices
+        """
+        if changed_indices.shape[0] == 0:
+            return
+        self.map_version += 1
+        region = torch.stack([changed_indices.min(dim=0)[0], changed_indices.max(dim=0)[0] + 1])
+        self.changed_region_log.append((self.map_version, region))
+
+    def log_changed_points(self, points: torch.Tensor, in_slam_world: bool = True) -> None:
+        """ bump the map version and log the AABB of changed scene points (e.g. newly added Gaussians)
+
+        Args:
+            points (torch.Tensor, [N,3]): changed points
+            in_slam_world (bool)        : points are in SLAM world coordinates. Otherwise, Sim world
+        """
+        if points.shape[0] == 0:
+            return
+        if in_slam_world:
+            points = points @ self.slam2sim[:3, :3].T + self.slam2sim[:3, 3]
+        vxl = self.transform_xyz_to_vxl(points)
+        self.log_changed_region(torch.cat([torch.floor(vxl.min(dim=0, keepdim=True)[0]), torch.ceil(vxl.max(dim=0, keepdim=True)[0])]).long())
+
+    def get_changed_regions(self, since_version: int) -> torch.Tensor:
+        """ get regions changed after a given map version
+
+        Args:
+            since_version (int): map version
+
+        Returns:
+            regions (torch.Tensor, [M,2,3]): [min, max) voxel index ranges. None if the log does not reach back to since_version
+        """
+        if since_version < self.change_log_base_version:
+            return None
+        regions = [region for version, region in self.changed_region_log if version > since_version]
+        if len(regions) == 0:
+            return torch.zeros(0, 2, 3, dtype=torch.long, device=self.device)
+        return torch.stack(regions)
+
+    def regions_in_frustums(self,
+                            regions   : torch.Tensor,
+                            intrinsics: torch.Tensor,
+                            extrinsics: torch.Tensor,
+                            image_hw  : Tuple,
+                            max_depth : float = None
+                            ) -> torch.Tensor:
+        """ conservative region-frustum intersection test: a region is rejected only if all its corners lie outside one frustum plane
+
+        Args:
+            regions (torch.Tensor, [M,2,3])  : [min, max) voxel index ranges
+            intrinsics (torch.Tensor, [3,3]) : camera intrinsics
+            extrinsics (torch.Tensor, [C,4,4]): world-to-camera (SLAM world)
+            image_hw (Tuple)                 : image height and width
+            max_depth (float)                : far plane. Unit: meter. No far plane if None
+
+        Returns:
+            intersect_mask (torch.Tensor, [C]): frustum intersects any region
+        """
+        if regions.shape[0] == 0:
+            return torch.zeros(extrinsics.shape[0], dtype=torch.bool, device=self.device)
+        return self.regions_frustums_overlap(regions, intrinsics, extrinsics, image_hw, max_depth).any(dim=1)
+
+    def regions_frustums_overlap(self,
+                                 regions   : torch.Tensor,
+                                 intrinsics: torch.Tensor,
+                                 extrinsics: torch.Tensor,
+                                 image_hw  : Tuple,
+                                 max_depth : float = None
+                                 ) -> torch.Tensor:
+        """ conservative pairwise region-frustum intersection test, see regions_in_frustums()
+
+        Args:
+            regions (torch.Tensor, [M,2,3] or [C,M,2,3]): [min, max) voxel index ranges, shared by or per frustum
+            intrinsics (torch.Tensor, [3,3])            : camera intrinsics
+            extrinsics (torch.Tensor, [C,4,4])          : world-to-camera (SLAM world)
+            image_hw (Tuple)                            : image height and width
+            max_depth (float)                           : far plane. Unit: meter. No far plane if None
+
+        Returns:
+            intersect_mask (torch.Tensor, [C,M]): frustum c intersects region m
+        """
+        if regions.dim() == 3:
+            regions = regions[None].expand(extrinsics.shape[0], -1, -1, -1)
+
+        ### region corners (voxel -> world_sim), padded by one voxel for rounding ###
+        bits = torch.tensor([[i >> 2 & 1, i >> 1 & 1, i & 1] for i in range(8)], device=self.device)
+        corners_min = (regions[:, :, 0] - 1).float()
+        corners_max = regions[:, :, 1].float()
+        corners = corners_min[:, :, None] + bits * (corners_max - corners_min)[:, :, None] # C,M,8,3
+        corners_sim = self.origin + corners * self.voxel_size
+
+        ### world_sim -> world_slam -> camera_slam ###
+        sim2cam = extrinsics @ self.sim2slam # C,4,4
+        corners_cam = torch.einsum('cij,cmkj->cmki', sim2cam[:, :3, :3], corners_sim) + sim2cam[:, None, None, :3, 3] # C,M,8,3
+        x, y, z = corners_cam.unbind(dim=-1)
+
+        ### frustum planes (inside >= 0) ###
+        H, W = image_hw
+        fx, fy = intrinsics[0, 0], intrinsics[1, 1]
+        cx, cy = intrinsics[0, 2], intrinsics[1, 2]
+        planes = [z, fx * x + cx * z, (W - cx) * z - fx * x, fy * y + cy * z, (H - cy) * z - fy * y]
+        if max_depth is not None:
+            planes.append(max_depth - z)
+        outside_mask = torch.stack([(plane < 0).all(dim=-1) for plane in planes]).any(dim=0) # C,M
+        return ~outside_mask
+
+    ##################################################
+    ### coarse levels
+    ##################################################
+    def get_grid_dims(self) -> torch.Tensor:
+        """ grid dimensions, [3]. None if unbounded """
+        return torch.tensor(self.occupancy_grid.shape, device=self.device)
+
+    def level_stride(self, xy_sampling_step: float) -> int:
+        """ convert an XY sampling step (meter) to a level stride (voxel) """
+        return int(round(xy_sampling_step / self.voxel_size))
+
+    def init_levels(self, level_steps: List = None) -> None:
+        """ initialize coarse levels, one per XY sampling step (e.g. per exploration stage)
+
+        Args:
+            level_steps (List): XY sampling steps. Unit: meter
+
+        Attributes:
+            levels (Dict): stride (voxel) -> level. Each level contains
+                - lattice_free (torch.Tensor, [X/s,Y/s,Z]): free state of the voxels on the XY sampling lattice (x,y multiples of s)
+                - any_free (torch.Tensor, [X/s,Y/s,Z/s])   : cell contains observed free space (FREE or NEGLECTED)
+                - any_unknown (torch.Tensor, [X/s,Y/s,Z/s]): cell contains unexplored voxels
+        """
+        self.levels = {}
+        dims = self.get_grid_dims()
+        if level_steps is None or dims is None:
+            return
+        for step in level_steps:
+            stride = self.level_stride(step)
+            if stride <= 1 or stride in self.levels:
+                continue
+            coarse_dims = torch.div(dims + stride - 1, stride, rounding_mode='floor').tolist()
+            self.levels[stride] = dict(
+                lattice_free = torch.zeros(coarse_dims[0], coarse_dims[1], int(dims[2]), dtype=torch.bool, device=self.device),
+                any_free = torch.zeros(coarse_dims, dtype=torch.bool, device=self.device),
+                any_unknown = torch.ones(coarse_dims, dtype=torch.bool, device=self.device),
+            )
+
+    @torch.no_grad()
+    def update_levels(self, changed_indices: torch.Tensor) -> None:
+        """ update the coarse cells (and lattice voxels) covering changed voxels
+
+        Args:
+            changed_indices (torch.Tensor, [N,3]): voxels whose state changed
+        """
+        if changed_indices.shape[0] == 0:
+            return
+        idx_min, idx_max = changed_indices.min(dim=0)[0], changed_indices.max(dim=0)[0]
+        for stride, level in self.levels.items():
+            ### stride-aligned region ###
+            c0 = torch.div(idx_min, stride, rounding_mode='floor')
+            c1 = torch.div(idx_max, stride, rounding_mode='floor') + 1
+            region = self.clamp_region(torch.stack([c0 * stride, c1 * stride]))
+            states = self.get_region_states(region)
+
+            ### max-pooled states. partial cells at the grid boundary are pooled over the valid voxels ###
+            pooled = torch.nn.functional.max_pool3d(
+                torch.stack([states < self.UNKNOWN, states == self.UNKNOWN]).float()[None],
+                kernel_size=stride, stride=stride, ceil_mode=True
+                )[0] > 0
+            (cx0, cy0, cz0), (cx1, cy1, cz1) = c0.tolist(), (c0 + torch.tensor(pooled.shape[1:], device=c0.device)).tolist()
+            level['any_free'][cx0:cx1, cy0:cy1, cz0:cz1] = pooled[0]
+            level['any_unknown'][cx0:cx1, cy0:cy1, cz0:cz1] = pooled[1]
+
+            ### lattice voxels ###
+            lattice = states[::stride, ::stride] == self.FREE
+            z0, z1 = region[0][2].item(), region[1][2].item()
+            level['lattice_free'][cx0:cx0+lattice.shape[0], cy0:cy0+lattice.shape[1], z0:z1] = lattice
+
+    def get_lattice_free_voxels(self, stride: int, gs_z_levels: List) -> torch.Tensor:
+        """ get free voxels on the XY sampling lattice and the Z levels directly from a coarse level
+
+        Args:
+            stride (int)      : level stride. Unit: voxel
+            gs_z_levels (List): Z levels. Unit: voxel
+
+        Returns:
+            free_voxels: [N, 3]. indices of free voxels
+        """
+        level = self.levels[stride]
+        z_levels = torch.tensor(gs_z_levels, dtype=torch.long, device=self.device)
+        z_levels = z_levels[(z_levels >= 0) & (z_levels < level['lattice_free'].shape[2])]
+        i, j, k = torch.nonzero(level['lattice_free'][:, :, z_levels], as_tuple=True)
+        return torch.stack([i * stride, j * stride, z_levels[k]], dim=1)
+
+    def region_has_unknown(self, region: torch.Tensor) -> bool:
+        """ cheap pre-check whether a region may contain unexplored voxels, using the coarsest level
+
+        Args:
+            region (torch.Tensor, [2,3]): [min, max) voxel index range
+
+        Returns:
+            has_unknown (bool): False only if the region is guaranteed to be explored
+        """
+        if len(self.levels) == 0:
+            return True
+        stride = max(self.levels.keys())
+        c0 = torch.div(region[0], stride, rounding_mode='floor').tolist()
+        c1 = (torch.div(region[1] - 1, stride, rounding_mode='floor') + 1).tolist()
+        return bool(self.levels[stride]['any_unknown'][c0[0]:c1[0], c0[1]:c1[1], c0[2]:c1[2]].any())
+
+    ##################################################
+    ### frontier
+    ##################################################
+    def get_region_states(self, region: torch.Tensor) -> torch.Tensor:
+        """ read the voxel states of a box region
+
+        Args:
+            region (torch.Tensor, [2,3]): [min, max) voxel index range
+
+        Returns:
+            states (torch.Tensor, [X,Y,Z]): int8 voxel states
+        """
+        (x0, y0, z0), (x1, y1, z1) = region.tolist()
+        return self.occupancy_grid[x0:x1, y0:y1, z0:z1]
+
+    def set_region_frontier(self, region: torch.Tensor, frontier: torch.Tensor) -> None:
+        """ write the frontier mask of a box region
+
+        Args:
+            region (torch.Tensor, [2,3])     : [min, max) voxel index range
+            frontier (torch.Tensor, [X,Y,Z]) : frontier mask
+        """
+        (x0, y0, z0), (x1, y1, z1) = region.tolist()
+        self.frontier_mask[x0:x1, y0:y1, z0:z1] = frontier
+
+    def clamp_region(self, region: torch.Tensor) -> torch.Tensor:
+        """ clamp a [min, max) voxel index range to the grid """
+        dims = torch.tensor(self.occupancy_grid.shape, device=region.device)
+        return torch.stack([region[0].clamp(min=0), torch.minimum(region[1], dims)])
+
+    @torch.no_grad()
+    def update_frontier(self, changed_indices: torch.Tensor) -> None:
+        """ update frontier voxels (observed free voxels adjacent to unexplored voxels, 26-neighbourhood) 
+        around changed voxels. Only the AABB of the changes, dilated by one voxel, can change frontier state.
+
+        Args:
+            changed_indices (torch.Tensor, [N,3]): voxels whose state changed
+
+        Attributes:
+            frontier_mask: updated frontier mask
+        """
+        if changed_indices.shape[0] == 0:
+            return
+        region = self.clamp_region(torch.stack([changed_indices.min(dim=0)[0] - 1, changed_indices.max(dim=0)[0] + 2]))
+        ### read one more voxel around the region for the neighbourhood ###
+        crop = self.clamp_region(torch.stack([region[0] - 1, region[1] + 1]))
+        if not(self.region_has_unknown(crop)):
+            shape = (region[1] - region[0]).tolist()
+            self.set_region_frontier(region, torch.zeros(shape, dtype=torch.bool, device=self.device))
+            return
+        states = self.get_region_states(crop)
+
+        unknown = (states == self.UNKNOWN).float()[None, None]
+        near_unknown = torch.nn.functional.max_pool3d(unknown, kernel_size=3, stride=1, padding=1)[0, 0] > 0
+        frontier = near_unknown & (states < self.UNKNOWN)
+
+        lo = region[0] - crop[0]
+        hi = region[1] - crop[0]
+        self.set_region_frontier(region, frontier[lo[0]:hi[0], lo[1]:hi[1], lo[2]:hi[2]])
+
+    def get_frontier_voxels(self) -> torch.Tensor:
+        """ get frontier voxel indices
+
+        Returns:
+            frontier_voxels (torch.Tensor, [N,3]): indices of frontier voxels
+        """
+        return torch.nonzero(self.frontier_mask, as_tuple=False)
+
+    def get_frontier_clusters(self, cluster_size: float = 0.5, min_cluster_voxels: int = 10) -> Tuple[torch.Tensor, torch.Tensor]:
+        """ cluster frontier voxels on a coarse grid
+
+        Args:
+            cluster_size (float)    : cluster cell size. Unit: meter
+            min_cluster_voxels (int): minimum number of frontier voxels in a cluster
+
+        Returns:
+            Tuple:
+                - centroids (torch.Tensor, [C,3]): cluster centroids. Unit: voxel
+                - sizes (torch.Tensor, [C]): number of frontier voxels per cluster
+        """
+        frontier_voxels = self.get_frontier_voxels()
+        if frontier_voxels.shape[0] == 0:
+            return torch.empty(0, 3, device=self.device), torch.empty(0, dtype=torch.long, device=self.device)
+        cells = torch.div(frontier_voxels, max(int(round(cluster_size / self.voxel_size)), 1), rounding_mode='floor')
+        _, cluster_ids, sizes = torch.unique(cells, dim=0, return_inverse=True, return_counts=True)
+        centroids = torch.zeros(sizes.shape[0], 3, device=self.device).index_add_(0, cluster_ids, frontier_voxels.float()) / sizes[:, None]
+        keep_mask = sizes >= min_cluster_voxels
+        return centroids[keep_mask], sizes[keep_mask]
+
+    def near_frontier_mask(self, 
+                           query_points      : torch.Tensor,
+                           radius            : float,
+                           cluster_size      : float = 0.5,
+                           min_cluster_voxels: int = 10,
+                           ) -> torch.Tensor:
+        """ check whether query points are within a radius of frontier clusters
+
+        Args:
+            query_points (torch.Tensor, [M,3]): query points. Unit: voxel
+            radius (float)                    : radius. Unit: meter
+            cluster_size (float)              : cluster cell size. Unit: meter
+            min_cluster_voxels (int)          : minimum number of frontier voxels in a cluster
+
+        Returns:
+            mask (torch.Tensor, [M]): near frontier mask
+        """
+        centroids, _ = self.get_frontier_clusters(cluster_size, min_cluster_voxels)
+        if centroids.shape[0] == 0 or query_points.shape[0] == 0:
+            return torch.zeros(query_points.shape[0], dtype=torch.bool, device=self.device)
+        min_dists = torch.cdist(query_points.float(), centroids).min(dim=1)[0]
+        return min_dists * self.voxel_size <= radius
+
     def update_prev_free_voxels(self, use_xyz_filter: bool = True, xy_sampling_step: float = 1.0, gs_z_levels = None):
-        """ update last stored free grid
+        """ take a snapshot of the free space: voxels freed so far are no longer reported as new.
+        Free voxels never change state in update_from_depth_maps(), so the snapshot only needs to drop the change log.
         
         Attributes:
-            prev_free_voxles: [N, 3]. indices of free voxels
-            
+            free_change_log (List): each element is (torch.Tensor, [N,3]). voxels marked free since the last snapshot
+            free_log_full_scan (bool): next query has to scan the whole grid (after a reset)
         """
-        self.prev_free_voxels = self.get_free_voxels(use_xyz_filter, xy_sampling_step, gs_z_levels)
+        self.free_change_log = []
+        self.free_log_full_scan = False
+
+    def reset_prev_free_voxels(self):
+        """ forget the last snapshot so that all free voxels are reported as new again (e.g. a new exploration stage) """
+        self.free_change_log = []
+        self.free_log_full_scan = True
 
     def get_new_free_voxels(self, use_xyz_filter: bool = True, xy_sampling_step: float = 1.0, gs_z_levels = None) -> torch.Tensor:
-        """ get free voxels compared to last stored free grid
+        """ get free voxels compared to last stored free grid, in O(delta) from the change log
 
         Args:
             use_xyz_filter: use XYZ location filter
@@ -253,19 +1139,32 @@ class ExplorationMap:
         Returns:
             new_free_voxels: [N, 3]. indices of free voxels
         """
-        prev_free_voxels = self.prev_free_voxels
-        new_free_voxels = self.get_free_voxels(use_xyz_filter, xy_sampling_step, gs_z_levels)
+        if self.free_log_full_scan:
+            return self.get_free_voxels(use_xyz_filter, xy_sampling_step, gs_z_levels)
 
-        # Flatten each row into a single unique value (row-wise hashing)
-        prev_flat = prev_free_voxels.view(-1, 1, 3)
-        new_flat = new_free_voxels.view(1, -1, 3)
-        
-        # Find elements in new_free_voxels that don't match any in prev_free_voxels
-        mask = (prev_flat == new_flat).all(dim=-1).any(dim=0)
-        unique_new_voxels = new_free_voxels[~mask]
+        if len(self.free_change_log) == 0:
+            return torch.empty(0, 3, dtype=torch.long, device=self.device)
+        new_free_voxels = torch.cat(self.free_change_log, dim=0)
+        self.free_change_log = [new_free_voxels]
+
+        ### drop voxels that are no longer free (e.g. mark_voxel_occupied) ###
+        still_free_mask = self.get_voxel_states(new_free_voxels) == self.FREE
+        new_free_voxels = new_free_voxels[still_free_mask]
+        return self.filter_free_voxels(new_free_voxels, use_xyz_filter, xy_sampling_step, gs_z_levels)
 
-        return unique_new_voxels
-        # return self._new_free_voxels
+    def pop_new_free_voxels(self, use_xyz_filter: bool = True, xy_sampling_step: float = 1.0, gs_z_levels = None) -> torch.Tensor:
+        """ get free voxels compared to last stored free grid and update the snapshot
+
+        Args:
+            use_xyz_filter: use XYZ location filter
+            xy_sampling_step: XY sampling step unit(meter)
+    
+        Returns:
+            new_free_voxels: [N, 3]. indices of free voxels
+        """
+        new_free_voxels = self.get_new_free_voxels(use_xyz_filter, xy_sampling_step, gs_z_levels)
+        self.update_prev_free_voxels(use_xyz_filter, xy_sampling_step, gs_z_levels)
+        return new_free_voxels
     
     def get_free_voxels(self, use_xyz_filter: bool = True, xy_sampling_step: float = 1.0, gs_z_levels = None) -> torch.Tensor:
         """ get free voxels in the global map
@@ -277,9 +1176,26 @@ class ExplorationMap:
         Returns:
             free_voxels: [N, 3]. indices of free voxels
         """
-        free_mask = self.occupancy_grid == -1.0
+        if use_xyz_filter:
+            stride = self.level_stride(xy_sampling_step)
+            if stride in self.levels:
+                return self.get_lattice_free_voxels(stride, gs_z_levels)
+
+        free_mask = self.free_mask()
         free_voxels = torch.stack(torch.where(free_mask), dim=1)
+        return self.filter_free_voxels(free_voxels, use_xyz_filter, xy_sampling_step, gs_z_levels)
 
+    def filter_free_voxels(self, free_voxels: torch.Tensor, use_xyz_filter: bool = True, xy_sampling_step: float = 1.0, gs_z_levels = None) -> torch.Tensor:
+        """ keep free voxels on the XY sampling lattice and the Z levels
+        
+        Args:
+            free_voxels (torch.Tensor, [N,3]): indices of free voxels
+            use_xyz_filter: use XYZ location filter
+            xy_sampling_step: XY sampling step unit(meter)
+
+        Returns:
+            free_voxels: [M, 3]. filtered indices of free voxels
+        """
         if use_xyz_filter:
             gs_z_levels = torch.tensor(gs_z_levels, dtype=free_voxels.dtype, device=free_voxels.device)
             num_skip_vxl = xy_sampling_step / self.voxel_size # voxel_size = 0.05
@@ -310,6 +1226,262 @@ class ExplorationMap:
         
         return camera_coords[:, :3]
 
+    ##################################################
+    ### render-free information gain
+    ##################################################
+    def get_state_points(self, value: int, stride: int = 1) -> torch.Tensor:
+        """ get Sim-world locations of voxels with a given state on a lattice
+
+        Args:
+            value (int) : voxel state
+            stride (int): lattice stride. Unit: voxel
+
+        Returns:
+            points (torch.Tensor, [N,3]): voxel locations in Sim space
+        """
+        grid, grid_origin = self.export_dense_grid()
+        indices = torch.nonzero(grid[::stride, ::stride, ::stride] == value) * stride
+        return grid_origin + indices * self.voxel_size
+
+    @torch.no_grad()
+    def estimate_unobserved_pixels(self,
+                                   extrinsics    : torch.Tensor,
+                                   intrinsics    : torch.Tensor,
+                                   image_hw      : Tuple,
+                                   image_scale   : float = 1 / 16,
+                                   unknown_stride: int = 2,
+                                   max_depth     : float = None,
+                                   batch_size    : int = 16
+                                   ) -> torch.Tensor:
+        """ render-free exploration information gain: number of pixels whose first visible voxel is unknown.
+        Occupied voxels and (lattice-subsampled) unknown voxels are projected into a coarse image per candidate,
+        and a pixel counts if its closest unknown voxel is in front of its closest occupied voxel (coarse occlusion test).
+
+        Args:
+            extrinsics (torch.Tensor, [C,4,4]): world-to-camera (SLAM world)
+            intrinsics (torch.Tensor, [3,3]) : camera intrinsics
+            image_hw (Tuple)                 : full-resolution image height and width
+            image_scale (float)              : coarse image scale
+            unknown_stride (int)             : lattice stride of the unknown voxels. Unit: voxel
+            max_depth (float)                : ignore voxels beyond this depth. Unit: meter
+            batch_size (int)                 : number of candidates projected at once
+
+        Returns:
+            unobserved_pixels (torch.Tensor, [C]): estimated number of unobserved pixels at full resolution
+        """
+        H, W = image_hw
+        h, w = max(1, round(H * image_scale)), max(1, round(W * image_scale))
+        fx, fy = intrinsics[0, 0] * w / W, intrinsics[1, 1] * h / H
+        cx, cy = intrinsics[0, 2] * w / W, intrinsics[1, 2] * h / H
+
+        ### voxel locations (world_sim -> world_slam) ###
+        occ_pts = self.get_state_points(self.OCCUPIED)
+        unk_pts = self.get_state_points(self.UNKNOWN, unknown_stride)
+        pts = torch.cat([occ_pts, unk_pts])
+        pts = pts @ self.sim2slam[:3, :3].T + self.sim2slam[:3, 3]
+        is_unknown = torch.arange(pts.shape[0], device=self.device) >= occ_pts.shape[0]
+
+        unobserved_pixels = []
+        extrinsics = extrinsics.to(self.device)
+        for i in range(0, extrinsics.shape[0], batch_size):
+            w2cs = extrinsics[i:i+batch_size]
+            C = w2cs.shape[0]
+            pts_cam = torch.einsum('cij,nj->cni', w2cs[:, :3, :3], pts) + w2cs[:, None, :3, 3] # C,N,3
+            z = pts_cam[..., 2]
+            u = torch.floor(pts_cam[..., 0] / z * fx + cx).long()
+            v = torch.floor(pts_cam[..., 1] / z * fy + cy).long()
+            valid = (z > 0) & (u >= 0) & (u < w) & (v >= 0) & (v < h)
+            if max_depth is not None:
+                valid &= z <= max_depth
+
+            ### coarse z-buffers of occupied and unknown voxels ###
+            cam_idx = torch.arange(C, device=self.device)[:, None].expand_as(u)
+            pix = (cam_idx * h * w + v * w + u)
+            zbuf = torch.full((2, C * h * w), float('inf'), device=self.device)
+            for k, mask in enumerate([valid & ~is_unknown, valid & is_unknown]):
+                zbuf[k].scatter_reduce_(0, pix[mask], z[mask], reduce='amin')
+            unobserved = (zbuf[1] < zbuf[0]).reshape(C, h * w)
+            unobserved_pixels.append(unobserved.sum(dim=1).float() * (H * W) / (h * w))
+        return torch.cat(unobserved_pixels)
+
+    ##################################################
+    ### geodesic travel cost
+    ##################################################
+    @torch.no_grad()
+    def compute_geodesic_field(self, source: torch.Tensor, stride: int = 2, max_dist: float = None) -> Dict:
+        """ single-source geodesic distance over observed free space. 
+        Wavefront expansion on a stride-downsampled grid, alternating 6- and 26-neighbour steps (octagonal approximation of the Euclidean metric).
+        A cell is passable if it contains observed free voxels and no occupied voxel
+
+        Args:
+            source (torch.Tensor, [3]): source location in Sim space
+            stride (int)              : downsampling stride. Unit: voxel
+            max_dist (float)          : stop expanding beyond this distance. Unit: meter. Unbounded if None
+
+        Returns:
+            field (Dict): 
+                - dist (torch.Tensor, [X/s,Y/s,Z/s]): geodesic distance to the source. Unit: meter. inf if unreachable
+                - origin (torch.Tensor, [3])        : location of cell (0,0,0) in Sim space
+                - stride (int)                      : downsampling stride. Unit: voxel
+        """
+        grid, grid_origin = self.export_dense_grid()
+        pooled = torch.nn.functional.max_pool3d(
+            torch.stack([grid < self.UNKNOWN, grid == self.OCCUPIED]).float()[None],
+            kernel_size=stride, stride=stride, ceil_mode=True
+            )[0] > 0
+        passable = pooled[0] & ~pooled[1]
+        field = dict(dist=torch.full(passable.shape, float('inf'), device=self.device), origin=grid_origin, stride=stride)
+
+        ### source cell ###
+        src = torch.floor((source.to(self.device) - grid_origin) / (self.voxel_size * stride)).long()
+        if not ((src >= 0) & (src < torch.tensor(passable.shape, device=self.device))).all():
+            return field
+        reached = torch.zeros_like(passable)
+        reached[src[0], src[1], src[2]] = True
+        field['dist'][src[0], src[1], src[2]] = 0
+
+        ### wavefront expansion ###
+        step_size = stride * self.voxel_size
+        max_steps = int(np.ceil(max_dist / step_size)) if max_dist is not None else passable.numel()
+        for k in range(1, max_steps + 1):
+            front = reached[None, None].float()
+            if k % 2 == 1:
+                grown = torch.stack([
+                    torch.nn.functional.max_pool3d(front, kernel_size=kernel, stride=1, padding=[i // 2 for i in kernel])
+                    for kernel in [(3, 1, 1), (1, 3, 1), (1, 1, 3)]
+                    ]).amax(dim=0)
+            else:
+                grown = torch.nn.functional.max_pool3d(front, kernel_size=3, stride=1, padding=1)
+            new_mask = (grown[0, 0] > 0) & passable & ~reached
+            if not new_mask.any():
+                break
+            field['dist'][new_mask] = k * step_size
+            reached |= new_mask
+        return field
+
+    def lookup_geodesic_field(self, field: Dict, points: torch.Tensor) -> torch.Tensor:
+        """ look up geodesic distances
+
+        Args:
+            field (Dict)                 : geodesic field, see compute_geodesic_field()
+            points (torch.Tensor, [N,3]) : query locations in Sim space
+
+        Returns:
+            dist (torch.Tensor, [N]): geodesic distance. Unit: meter. inf if unreachable or outside the field
+        """
+        dist = torch.full((points.shape[0],), float('inf'), device=self.device)
+        cells = torch.floor((points.to(self.device) - field['origin']) / (self.voxel_size * field['stride'])).long()
+        inside_mask = ((cells >= 0) & (cells < torch.tensor(field['dist'].shape, device=self.device))).all(dim=1)
+        dist[inside_mask] = field['dist'][cells[inside_mask, 0], cells[inside_mask, 1], cells[inside_mask, 2]]
+        return dist
+
+    ##################################################
+    ### serialization
+    ##################################################
+    def get_map_state(self) -> Dict:
+        """ map buffers to persist. Derived coarse levels are rebuilt on load
+
+        Returns:
+            state (Dict): name -> torch.Tensor
+        """
+        state = {
+            "occupancy_grid": self.occupancy_grid,
+            "frontier_mask": self.frontier_mask,
+            "free_change_log": torch.cat(self.free_change_log) if len(self.free_change_log) > 0 else torch.zeros(0, 3, dtype=torch.long),
+        }
+        if self.dist_field is not None:
+            state["dist_field"] = self.dist_field
+        return state
+
+    def set_map_state(self, state: Dict) -> None:
+        """ restore map buffers from get_map_state()
+
+        Args:
+            state (Dict): name -> torch.Tensor
+        """
+        self.occupancy_grid = state["occupancy_grid"].to(self.device)
+        self.frontier_mask = state["frontier_mask"].to(self.device)
+        self.dist_field = state["dist_field"].to(self.device) if "dist_field" in state else None
+        self.free_change_log = [state["free_change_log"].to(self.device)]
+        self.rebuild_levels()
+
+    def rebuild_levels(self) -> None:
+        """ recompute all coarse levels from the voxel states """
+        if len(self.levels) > 0:
+            dims = self.get_grid_dims()
+            self.update_levels(torch.stack([torch.zeros_like(dims), dims - 1]))
+
+    def get_map_meta(self) -> Dict:
+        """ JSON-serializable metadata required to rebuild the map
+
+        Returns:
+            meta (Dict): map class, grid geometry, transform and options
+        """
+        return {
+            "class": type(self).__name__,
+            "bounding_box": self.bounding_box,
+            "voxel_size": self.voxel_size,
+            "sim2slam": self.sim2slam.cpu().tolist(),
+            "gs_z_levels": self.gs_z_levels,
+            "dist_field_trunc": self.dist_field_trunc if self.dist_field is not None else None,
+            "level_strides": list(self.levels.keys()),
+            "free_log_full_scan": self.free_log_full_scan,
+            "map_version": self.map_version,
+            "init_kwargs": {},
+        }
+
+    def save(self, save_dir: str) -> None:
+        """ save the map as one .npy per buffer (int8 states, memory-mappable) plus meta.json
+
+        Args:
+            save_dir (str): output directory
+        """
+        os.makedirs(save_dir, exist_ok=True)
+        for name, tensor in self.get_map_state().items():
+            np.save(os.path.join(save_dir, f"{name}.npy"), tensor.cpu().numpy())
+        with open(os.path.join(save_dir, "meta.json"), "w") as f:
+            json.dump(self.get_map_meta(), f, indent=4)
+
+    @classmethod
+    def load(cls, load_dir: str, device: str = 'cpu', mmap: bool = True) -> 'ExplorationMap':
+        """ load a map saved by save()
+
+        Args:
+            load_dir (str): directory written by save()
+            device (str)  : device of the loaded map
+            mmap (bool)   : memory-map the buffers (copy-on-write) instead of reading them. Only effective on CPU
+
+        Returns:
+            explr_map (ExplorationMap): restored map
+        """
+        with open(os.path.join(load_dir, "meta.json"), "r") as f:
+            meta = json.load(f)
+        assert meta["class"] == cls.__name__, f"map was saved by {meta['class']}, not {cls.__name__}"
+
+        ### the distance field is restored from disk instead of being allocated ###
+        explr_map = cls(
+            meta["bounding_box"], 
+            meta["voxel_size"], 
+            device, 
+            transform=torch.tensor(meta["sim2slam"]), 
+            gs_z_levels=meta["gs_z_levels"],
+            use_dist_field=False,
+            level_steps=[s * meta["voxel_size"] for s in meta["level_strides"]],
+            **meta["init_kwargs"]
+            )
+        if meta["dist_field_trunc"] is not None:
+            explr_map.init_dist_kernel(meta["dist_field_trunc"])
+
+        state = {}
+        for name in os.listdir(load_dir):
+            if name.endswith(".npy"):
+                array = np.load(os.path.join(load_dir, name), mmap_mode='c' if mmap else None)
+                state[name[:-4]] = torch.from_numpy(array)
+        explr_map.set_map_state(state)
+        explr_map.free_log_full_scan = meta["free_log_full_scan"]
+        explr_map.init_change_log(meta.get("map_version", 0))
+        return explr_map
+
     def visualize(self, time_idx: int = 0, in_slam_world: bool = False):
         """
         Visualize the exploration map using Open3D. (in the SLAM coordinate system)
@@ -321,9 +1493,9 @@ class ExplorationMap:
         import open3d as o3d
 
         # Get world coordinates of occupied, free, and unexplored voxels
-        occupied_coords = self.get_world_coordinates_from_grid(1.0, in_slam_world).cpu().numpy()
-        free_coords = self.get_world_coordinates_from_grid(-1.0, in_slam_world).cpu().numpy()
-        unexplored_coords = self.get_world_coordinates_from_grid(0.0, in_slam_world).cpu().numpy()
+        occupied_coords = self.get_world_coordinates_from_grid(self.OCCUPIED, in_slam_world).cpu().numpy()
+        free_coords = self.get_world_coordinates_from_grid(self.FREE, in_slam_world).cpu().numpy()
+        unexplored_coords = self.get_world_coordinates_from_grid(self.UNKNOWN, in_slam_world).cpu().numpy()
 
         # Create point clouds for each type of voxel
         occupied_pcd = o3d.geometry.PointCloud()
@@ -0,0 +1,673 @@
+import torch
+import numpy as np
+from typing import Dict, List, Tuple
+
+from src.slam.splatam.exploration_map import ExplorationMap
+
+class SparseExplorationMap(ExplorationMap):
+    """ Exploration map stored as a hash of B^3 voxel blocks, allocated on first observation.
+    Unallocated space is UNKNOWN. Voxel indices are global integers w.r.t. self.origin and may be negative when no bounding box is given.
+    """
+    ### block hash key: per-axis offset and stride (supports |block index| < 2^20) ###
+    KEY_OFFSET = 2 ** 20
+    KEY_STRIDE = 2 ** 21
+
+    def __init__(self, bounding_box, voxel_size, device='cpu', transform=None, use_xyz_filter = None, xy_sampling_step = None, gs_z_levels = None,
+                 use_dist_field: bool = True, dist_field_trunc: float = 1.0, level_steps: List = None, block_size: int = 8, init_block_capacity: int = 1024):
+        """
+        Initialize the SparseExplorationMap.
+
+        Parameters:
+            bounding_box (list, optional)     : [[x_min, x_max], [y_min, y_max], [z_min, z_max]]. None for an unbounded map
+            voxel_size (float)                : Size of each voxel in the grid
+            device (str)                      : The device to store the tensors ('cpu' or 'cuda')
+            transform (torch.Tensor, optional): 4x4 transformation matrix to reposition the origin (sim2slam)
+            use_dist_field (bool)             : maintain an incremental distance-to-occupied field for free-space truncation
+            dist_field_trunc (float)          : truncation distance of the distance field. Unit: meter
+            level_steps (List)                : XY sampling steps of the coarse levels. Requires a bounding box
+            block_size (int)                  : block size. Unit: voxel
+            init_block_capacity (int)         : initial number of preallocated blocks. Doubled when full
+        """
+        self.bounding_box = bounding_box
+        self.voxel_size = voxel_size
+        self.device = device
+        self.sim2slam = transform.to(self.device) if transform is not None else torch.eye(4, device=device)
+        self.slam2sim = torch.inverse(self.sim2slam)
+        self.block_size = block_size
+        self.gs_z_levels = gs_z_levels
+
+        ### origin and (optional) grid bounds in Sim Space ###
+        if bounding_box is not None:
+            self.origin = torch.tensor([bounding_box[0][0], bounding_box[1][0], bounding_box[2][0]], device=self.device)
+            max_bound = torch.tensor([bounding_box[0][1], bounding_box[1][1], bounding_box[2][1]], device=self.device)
+            self.grid_dims = ((max_bound - self.origin) / self.voxel_size).ceil().long()
+        else:
+            self.origin = torch.zeros(3, device=self.device)
+            self.grid_dims = None
+
+        self.init_blocks(init_block_capacity)
+        self.init_dist_field(use_dist_field, dist_field_trunc)
+        self.frontier_mask = None # stored per block, see block_frontier
+        self.init_levels(level_steps)
+        self.init_change_log()
+        self.update_prev_free_voxels(
+            use_xyz_filter=use_xyz_filter, xy_sampling_step=xy_sampling_step, gs_z_levels=gs_z_levels
+            )
+
+    def get_grid_dims(self) -> torch.Tensor:
+        """ grid dimensions, [3]. None if unbounded """
+        return self.grid_dims
+
+    ##################################################
+    ### block storage
+    ##################################################
+    def init_blocks(self, capacity: int) -> None:
+        """ initialize the block storage
+
+        Args:
+            capacity (int): number of preallocated blocks
+
+        Attributes:
+            num_blocks (int)                          : number of allocated blocks
+            block_coords (torch.Tensor, [C,3])        : block indices. valid for the first num_blocks
+            block_states (torch.Tensor, [C,B,B,B])    : int8 voxel states
+            block_frontier (torch.Tensor, [C,B,B,B])  : frontier mask
+            block_keys_sorted (torch.Tensor, [N])     : sorted hash keys of allocated blocks
+            block_slots_sorted (torch.Tensor, [N])    : block slot of each sorted key
+            local_offsets (torch.Tensor, [B^3,3])     : voxel offsets within a block
+        """
+        B = self.block_size
+        self.num_blocks = 0
+        self.block_coords = torch.zeros(capacity, 3, dtype=torch.long, device=self.device)
+        self.block_states = torch.full((capacity, B, B, B), self.UNKNOWN, dtype=torch.int8, device=self.device)
+        self.block_frontier = torch.zeros((capacity, B, B, B), dtype=torch.bool, device=self.device)
+        self.block_keys_sorted = torch.empty(0, dtype=torch.long, device=self.device)
+        self.block_slots_sorted = torch.empty(0, dtype=torch.long, device=self.device)
+        r = torch.arange(B, device=self.device)
+        self.local_offsets = torch.stack(torch.meshgrid(r, r, r, indexing='ij'), dim=-1).reshape(-1, 3)
+
+    def grow_blocks(self, capacity: int) -> None:
+        """ grow block buffers to hold at least capacity blocks (amortized doubling)
+
+        Args:
+            capacity (int): required number of blocks
+        """
+        old_capacity = self.block_coords.shape[0]
+        if capacity <= old_capacity:
+            return
+        new_capacity = max(capacity, old_capacity * 2)
+        B = self.block_size
+        block_coords = torch.zeros(new_capacity, 3, dtype=torch.long, device=self.device)
+        block_coords[:old_capacity] = self.block_coords
+        self.block_coords = block_coords
+        block_states = torch.full((new_capacity, B, B, B), self.UNKNOWN, dtype=torch.int8, device=self.device)
+        block_states[:old_capacity] = self.block_states
+        self.block_states = block_states
+        block_frontier = torch.zeros((new_capacity, B, B, B), dtype=torch.bool, device=self.device)
+        block_frontier[:old_capacity] = self.block_frontier
+        self.block_frontier = block_frontier
+        if self.dist_field is not None:
+            block_dists = torch.full((new_capacity, B, B, B), self.DIST_FIELD_EMPTY, dtype=torch.int16, device=self.device)
+            block_dists[:old_capacity] = self.dist_field
+            self.dist_field = block_dists
+
+    def block_keys(self, block_coords: torch.Tensor) -> torch.Tensor:
+        """ hash block indices to int64 keys
+
+        Args:
+            block_coords (torch.Tensor, [N,3]): block indices
+
+        Returns:
+            keys (torch.Tensor, [N]): hash keys
+        """
+        bc = block_coords + self.KEY_OFFSET
+        return (bc[:, 0] * self.KEY_STRIDE + bc[:, 1]) * self.KEY_STRIDE + bc[:, 2]
+
+    def find_blocks(self, block_coords: torch.Tensor) -> torch.Tensor:
+        """ look up block slots
+
+        Args:
+            block_coords (torch.Tensor, [N,3]): block indices
+
+        Returns:
+            slots (torch.Tensor, [N]): block slots. -1 if not allocated
+        """
+        slots = torch.full((block_coords.shape[0],), -1, dtype=torch.long, device=self.device)
+        if self.num_blocks == 0 or block_coords.shape[0] == 0:
+            return slots
+        keys = self.block_keys(block_coords)
+        pos = torch.searchsorted(self.block_keys_sorted, keys).clamp(max=self.num_blocks - 1)
+        found_mask = self.block_keys_sorted[pos] == keys
+        slots[found_mask] = self.block_slots_sorted[pos[found_mask]]
+        return slots
+
+    def allocate_blocks(self, block_coords: torch.Tensor) -> torch.Tensor:
+        """ allocate missing blocks and look up block slots
+
+        Args:
+            block_coords (torch.Tensor, [N,3]): block indices
+
+        Returns:
+            slots (torch.Tensor, [N]): block slots
+        """
+        slots = self.find_blocks(block_coords)
+        missing_mask = slots < 0
+        if missing_mask.any():
+            new_coords = torch.unique(block_coords[missing_mask], dim=0)
+            num_new = new_coords.shape[0]
+            self.grow_blocks(self.num_blocks + num_new)
+            new_slots = torch.arange(self.num_blocks, self.num_blocks + num_new, device=self.device)
+            self.block_coords[new_slots] = new_coords
+
+            ### rebuild the sorted key index ###
+            keys = torch.cat([self.block_keys_sorted, self.block_keys(new_coords)])
+            block_slots = torch.cat([self.block_slots_sorted, new_slots])
+            self.block_keys_sorted, order = torch.sort(keys)
+            self.block_slots_sorted = block_slots[order]
+            self.num_blocks += num_new
+
+            slots[missing_mask] = self.find_blocks(block_coords[missing_mask])
+        return slots
+
+    def split_block_indices(self, indices: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """ split global voxel indices into block indices and linear in-block indices
+
+        Args:
+            indices (torch.Tensor, [N,3]): voxel indices
+
+        Returns:
+            Tuple:
+                - block_coords (torch.Tensor, [N,3]): block indices
+                - local_lin (torch.Tensor, [N]): linear voxel index within the block
+        """
+        B = self.block_size
+        block_coords = torch.div(indices, B, rounding_mode='floor')
+        local = indices - block_coords * B
+        local_lin = (local[:, 0] * B + local[:, 1]) * B + local[:, 2]
+        return block_coords, local_lin
+
+    def inside_bounds_mask(self, indices: torch.Tensor) -> torch.Tensor:
+        """ mask of voxel indices inside the bounding box (all True for an unbounded map) """
+        if self.grid_dims is None:
+            return torch.ones(indices.shape[0], dtype=torch.bool, device=self.device)
+        return ((indices >= 0) & (indices < self.grid_dims)).all(dim=1)
+
+    ##################################################
+    ### voxel states
+    ##################################################
+    def get_voxel_states(self, indices: torch.Tensor) -> torch.Tensor:
+        """ read voxel states. Unallocated voxels are UNKNOWN
+
+        Args:
+            indices (torch.Tensor, [N,3]): voxel indices
+
+        Returns:
+            states (torch.Tensor, [N]): int8 voxel states
+        """
+        states = torch.full((indices.shape[0],), self.UNKNOWN, dtype=torch.int8, device=self.device)
+        block_coords, local_lin = self.split_block_indices(indices)
+        slots = self.find_blocks(block_coords)
+        found_mask = slots >= 0
+        B3 = self.block_size ** 3
+        states[found_mask] = self.block_states.view(-1)[slots[found_mask] * B3 + local_lin[found_mask]]
+        return states
+
+    def set_voxel_states(self, indices: torch.Tensor, state: int) -> None:
+        """ write voxel states, allocating blocks on first observation
+
+        Args:
+            indices (torch.Tensor, [N,3]): voxel indices
+            state (int)                  : voxel state
+        """
+        if indices.shape[0] == 0:
+            return
+        block_coords, local_lin = self.split_block_indices(indices)
+        slots = self.allocate_blocks(block_coords)
+        self.block_states.view(-1)[slots * self.block_size ** 3 + local_lin] = state
+
+    def mark_voxel_occupied(self, indices):
+        """
+        Mark a voxel as occupied in the occupancy grid.
+
+        Parameters:
+            indices (tuple): The indices of the voxel to mark as occupied
+        """
+        occupied_indices = torch.stack([torch.as_tensor(i, device=self.device).reshape(-1) for i in indices], dim=1)
+        self.set_voxel_states(occupied_indices, self.OCCUPIED)
+        self.update_dist_field(occupied_indices)
+        self.update_levels(occupied_indices)
+        self.update_frontier(occupied_indices)
+        self.log_changed_region(occupied_indices)
+
+    def get_indices_with_state(self, value: int = None) -> torch.Tensor:
+        """ get voxel indices of allocated voxels with a given state
+
+        Args:
+            value: voxel state. If None, all non-UNKNOWN voxels
+
+        Returns:
+            indices (torch.Tensor, [N,3]): voxel indices
+        """
+        blocks = self.block_states[:self.num_blocks]
+        mask = blocks != self.UNKNOWN if value is None else blocks == value
+        slot, x, y, z = torch.nonzero(mask, as_tuple=True)
+        return self.block_coords[slot] * self.block_size + torch.stack([x, y, z], dim=1)
+
+    ##################################################
+    ### frontier
+    ##################################################
+    def region_indices(self, region: torch.Tensor) -> torch.Tensor:
+        """ voxel indices of a box region in x-major order, [X*Y*Z,3] """
+        ranges = [torch.arange(region[0][i], region[1][i], device=self.device) for i in range(3)]
+        return torch.stack(torch.meshgrid(*ranges, indexing='ij'), dim=-1).reshape(-1, 3)
+
+    def clamp_region(self, region: torch.Tensor) -> torch.Tensor:
+        """ clamp a [min, max) voxel index range to the bounding box (if any) """
+        if self.grid_dims is None:
+            return region
+        return torch.stack([region[0].clamp(min=0), torch.minimum(region[1], self.grid_dims)])
+
+    def get_region_states(self, region: torch.Tensor) -> torch.Tensor:
+        """ read the voxel states of a box region, [X,Y,Z] int8 """
+        shape = (region[1] - region[0]).tolist()
+        return self.get_voxel_states(self.region_indices(region)).reshape(shape)
+
+    def set_region_frontier(self, region: torch.Tensor, frontier: torch.Tensor) -> None:
+        """ write the frontier mask of a box region. Frontier voxels are free, hence allocated """
+        indices = self.region_indices(region)
+        block_coords, local_lin = self.split_block_indices(indices)
+        slots = self.find_blocks(block_coords)
+        found_mask = slots >= 0
+        self.block_frontier.view(-1)[slots[found_mask] * self.block_size ** 3 + local_lin[found_mask]] = frontier.reshape(-1)[found_mask]
+
+    def get_frontier_voxels(self) -> torch.Tensor:
+        """ get frontier voxel indices, [N,3] """
+        slot, x, y, z = torch.nonzero(self.block_frontier[:self.num_blocks], as_tuple=True)
+        return self.block_coords[slot] * self.block_size + torch.stack([x, y, z], dim=1)
+
+    ##################################################
+    ### distance field
+    ##################################################
+    def create_dist_field(self) -> torch.Tensor:
+        """ allocate an empty per-block distance field, [C,B,B,B] int16 squared distances. Unit: voxel^2 """
+        B = self.block_size
+        return torch.full((self.block_coords.shape[0], B, B, B), self.DIST_FIELD_EMPTY, dtype=torch.int16, device=self.device)
+
+    @torch.no_grad()
+    def update_dist_field(self, occupied_indices: torch.Tensor, batch_size: int = 1000):
+        """ update the distance field around newly occupied voxels.
+        Blocks within the truncation distance of a surface are allocated so that later observations see the field.
+
+        Args:
+            occupied_indices (torch.Tensor, [N,3]): newly occupied voxel indices
+            batch_size: number of occupied voxels processed per batch
+        """
+        if self.dist_field is None or occupied_indices.shape[0] == 0:
+            return
+
+        B3 = self.block_size ** 3
+        for i in range(0, occupied_indices.shape[0], batch_size):
+            nbrs = (occupied_indices[i:i+batch_size].unsqueeze(1) + self.dist_kernel_offsets.unsqueeze(0)).reshape(-1, 3)
+            dists = self.dist_kernel_dists.repeat(min(batch_size, occupied_indices.shape[0] - i))
+            inside_mask = self.inside_bounds_mask(nbrs)
+            nbrs, dists = nbrs[inside_mask], dists[inside_mask]
+
+            block_coords, local_lin = self.split_block_indices(nbrs)
+            slots = self.allocate_blocks(block_coords)
+            self.dist_field.view(-1).scatter_reduce_(0, slots * B3 + local_lin, dists, reduce='amin')
+
+    def lookup_dist_field(self, vxl: torch.Tensor) -> torch.Tensor:
+        """ read distances from the squared distance field
+
+        Args:
+            vxl (torch.Tensor, [M,3]): voxel indices
+
+        Returns:
+            min_distances (torch.Tensor, [M]): distance to the closest occupied voxel. Unit: voxel. inf if beyond truncation
+        """
+        min_distances = torch.full((vxl.shape[0],), float('inf'), device=self.device)
+        block_coords, local_lin = self.split_block_indices(vxl)
+        slots = self.find_blocks(block_coords)
+        found_mask = slots >= 0
+        sq_dists = self.dist_field.view(-1)[slots[found_mask] * self.block_size ** 3 + local_lin[found_mask]]
+        dists = sq_dists.float().sqrt()
+        dists[sq_dists == self.DIST_FIELD_EMPTY] = float('inf')
+        min_distances[found_mask] = dists
+        return min_distances
+
+    def query_dist_to_occ(self, query_points: torch.Tensor) -> torch.Tensor:
+        """ look up the distance to the closest occupied voxel
+
+        Args:
+            query_points (torch.Tensor, [M,3]): query points. Unit: voxel
+
+        Returns:
+            min_distances (torch.Tensor, [M]): distance to the closest occupied voxel. Unit: voxel. inf if beyond truncation
+        """
+        if self.dist_field is None:
+            return self.compute_min_distance_from_occ(None, query_points)
+        return self.lookup_dist_field(torch.round(query_points).long())
+
+    def compute_min_distance_from_occ(self, grid: torch.Tensor, query_points: torch.Tensor) -> torch.Tensor:
+        """ brute-force closest distance to the occupied voxels. grid is ignored; occupied voxels are read from the blocks """
+        occupied_voxel_coords = self.get_indices_with_state(self.OCCUPIED)
+        if occupied_voxel_coords.size(0) == 0:
+            return torch.full((query_points.shape[0],), float('inf'), device=self.device)
+        return torch.cdist(query_points.float(), occupied_voxel_coords.float()).min(dim=1)[0]
+
+    @torch.no_grad()
+    def split_free_indices(self, query_points: torch.Tensor, dist_thre: float = 0.5, batch_size: int = 10000) -> Tuple[torch.Tensor, torch.Tensor]:
+        """ split free candidates into truncated free region and neglected free region (close to the surface)
+
+        Args:
+            query_points (torch.Tensor, [M,3]): free candidate voxel indices
+            dist_thre (float): distance from the surface threshold
+            batch_size (int): batch size for the brute-force fallback
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: truncated free voxel indices and neglected free voxel indices
+        """
+        if self.dist_field is None or dist_thre > self.dist_field_trunc * self.voxel_size:
+            occupied_voxel_coords = self.get_indices_with_state(self.OCCUPIED).float()
+            if occupied_voxel_coords.shape[0] == 0:
+                return query_points, query_points.new_empty((0, 3))
+            min_distances = torch.cat([
+                torch.cdist(query_points[i:i+batch_size].float(), occupied_voxel_coords).min(dim=1)[0]
+                for i in range(0, query_points.shape[0], batch_size)
+                ] + [torch.empty(0, device=self.device)])
+        else:
+            min_distances = self.lookup_dist_field(query_points)
+        valid_free_indices_mask = (min_distances * self.voxel_size) > dist_thre
+        return query_points[valid_free_indices_mask], query_points[~valid_free_indices_mask]
+
+    ##################################################
+    ### depth integration
+    ##################################################
+    def compute_frustum_aabb(self,
+                             depth_map : torch.Tensor,
+                             intrinsics: torch.Tensor,
+                             extrinsics: torch.Tensor
+                             ) -> torch.Tensor:
+        """ compute the voxel-space AABB of the camera frustum, truncated at the maximum depth.
+        Clamped to the bounding box only if the map is bounded.
+
+        Returns:
+            aabb (torch.Tensor, [2,3]): [min, max) voxel index range. None if the depth map is empty
+        """
+        max_depth = depth_map.max()
+        if max_depth <= 0:
+            return None
+        max_depth = max_depth + self.voxel_size
+
+        H, W = depth_map.shape
+        fx, fy = intrinsics[0, 0], intrinsics[1, 1]
+        cx, cy = intrinsics[0, 2], intrinsics[1, 2]
+        corners_u = torch.tensor([0., W, 0., W], device=self.device)
+        corners_v = torch.tensor([0., 0., H, H], device=self.device)
+        corners = torch.stack([
+            (corners_u - cx) / fx * max_depth,
+            (corners_v - cy) / fy * max_depth,
+            max_depth.expand(4)
+            ], dim=1)
+        frustum_pts = torch.cat([torch.zeros(1, 3, device=self.device), corners], dim=0)
+        cam2sim = self.slam2sim @ torch.inverse(extrinsics)
+        frustum_vxl = self.transform_xyz_to_vxl(frustum_pts @ cam2sim[:3, :3].T + cam2sim[:3, 3])
+
+        aabb_min = torch.floor(frustum_vxl.min(dim=0)[0]).long() - 1
+        aabb_max = torch.ceil(frustum_vxl.max(dim=0)[0]).long() + 2
+        if self.grid_dims is not None:
+            aabb_min = aabb_min.clamp(min=0)
+            aabb_max = torch.minimum(aabb_max, self.grid_dims)
+        return torch.stack([aabb_min, aabb_max])
+
+    def get_frustum_blocks(self,
+                           aabb      : torch.Tensor,
+                           depth_map : torch.Tensor,
+                           intrinsics: torch.Tensor,
+                           extrinsics: torch.Tensor
+                           ) -> torch.Tensor:
+        """ get blocks in the frustum AABB whose bounding sphere intersects the frustum (conservative)
+
+        Args:
+            aabb (torch.Tensor, [2,3]): [min, max) voxel index range
+
+        Returns:
+            block_coords (torch.Tensor, [N,3]): block indices
+        """
+        B = self.block_size
+        block_min = torch.div(aabb[0], B, rounding_mode='floor')
+        block_max = torch.div(aabb[1] - 1, B, rounding_mode='floor')
+        ranges = [torch.arange(block_min[i], block_max[i] + 1, device=self.device) for i in range(3)]
+        block_coords = torch.stack(torch.meshgrid(*ranges, indexing='ij'), dim=-1).reshape(-1, 3)
+
+        ### project block centers with a block-radius margin ###
+        centers_sim = self.origin + (block_coords * B + (B - 1) / 2) * self.voxel_size
+        world2cam = extrinsics @ self.sim2slam
+        centers_cam = centers_sim @ world2cam[:3, :3].T + world2cam[:3, 3]
+        radius = np.sqrt(3) / 2 * B * self.voxel_size
+        z = centers_cam[:, 2]
+        z_safe = z.clamp(min=1e-6)
+        H, W = depth_map.shape
+        fx, fy = intrinsics[0, 0], intrinsics[1, 1]
+        cx, cy = intrinsics[0, 2], intrinsics[1, 2]
+        u = centers_cam[:, 0] * fx / z_safe + cx
+        v = centers_cam[:, 1] * fy / z_safe + cy
+        margin_u = radius * fx / z_safe
+        margin_v = radius * fy / z_safe
+        near_mask = z <= radius # block around the camera center
+        in_view_mask = (z > 0) & (u > -margin_u) & (u < W + margin_u) & (v > -margin_v) & (v < H + margin_v)
+        depth_mask = z - radius <= depth_map.max() + self.voxel_size
+        return block_coords[(near_mask | in_view_mask) & depth_mask]
+
+    def get_unexplored_indices(self, aabb: torch.Tensor = None, block_coords: torch.Tensor = None) -> torch.Tensor:
+        """ get unexplored voxel indices within the given blocks (allocated or not)
+
+        Args:
+            aabb (torch.Tensor, [2,3])        : [min, max) voxel index range
+            block_coords (torch.Tensor, [N,3]): candidate blocks. Required for the sparse map
+
+        Returns:
+            grid_indices (torch.Tensor, [M,3]): unexplored voxel indices
+        """
+        if block_coords is None:
+            ### only allocated space is known to an unbounded map ###
+            return self.get_indices_with_state(self.UNKNOWN)
+
+        B3 = self.block_size ** 3
+        slots = self.find_blocks(block_coords)
+        states = torch.full((block_coords.shape[0], B3), self.UNKNOWN, dtype=torch.int8, device=self.device)
+        found_mask = slots >= 0
+        states[found_mask] = self.block_states[slots[found_mask]].reshape(-1, B3)
+        block_idx, local_idx = torch.nonzero(states == self.UNKNOWN, as_tuple=True)
+        grid_indices = block_coords[block_idx] * self.block_size + self.local_offsets[local_idx]
+
+        inside_mask = self.inside_bounds_mask(grid_indices)
+        if aabb is not None:
+            inside_mask &= ((grid_indices >= aabb[0]) & (grid_indices < aabb[1])).all(dim=1)
+        return grid_indices[inside_mask]
+
+    def get_unexplored_indices_in_frustums(self,
+                                           depth_maps: torch.Tensor,
+                                           intrinsics: torch.Tensor,
+                                           extrinsics: torch.Tensor,
+                                           use_frustum_culling: bool = True
+                                           ) -> torch.Tensor:
+        """ get unexplored voxel indices in the blocks intersecting the view frustums.
+        Frustum culling is always used since unobserved space is not allocated.
+
+        Args:
+            depth_maps (torch.Tensor, [F,H,W]): depth maps
+            intrinsics (torch.Tensor, [3,3])  : camera intrinsics
+            extrinsics (torch.Tensor, [F,4,4]): world-to-camera
+
+        Returns:
+            grid_indices (torch.Tensor, [N,3]): unexplored voxel indices. None if no frame observes the map
+        """
+        aabbs, block_coords = [], []
+        for depth_map, w2c in zip(depth_maps, extrinsics):
+            aabb = self.compute_frustum_aabb(depth_map, intrinsics, w2c)
+            if aabb is None or (aabb[1] <= aabb[0]).any():
+                continue
+            aabbs.append(aabb)
+            block_coords.append(self.get_frustum_blocks(aabb, depth_map, intrinsics, w2c))
+        if len(aabbs) == 0:
+            return None
+        aabbs = torch.stack(aabbs)
+        aabb = torch.stack([aabbs[:, 0].min(dim=0)[0], aabbs[:, 1].max(dim=0)[0]])
+        block_coords = torch.unique(torch.cat(block_coords), dim=0)
+        return self.get_unexplored_indices(aabb, block_coords)
+
+    ##################################################
+    ### queries
+    ##################################################
+    def get_free_voxels(self, use_xyz_filter: bool = True, xy_sampling_step: float = 1.0, gs_z_levels = None) -> torch.Tensor:
+        """ get free voxels in the global map
+
+        Args:
+            use_xyz_filter: use XYZ location filter
+            xy_sampling_step: XY sampling step unit(meter)
+
+        Returns:
+            free_voxels: [N, 3]. indices of free voxels
+        """
+        free_voxels = self.get_indices_with_state(self.FREE)
+        return self.filter_free_voxels(free_voxels, use_xyz_filter, xy_sampling_step, gs_z_levels)
+
+    def get_world_coordinates_from_grid(self,
+                                        value: int = None,
+                                        in_slam_world: bool = False
+                                        ) -> torch.Tensor:
+        """
+        Get the world coordinates of allocated voxels.
+
+        Parameters:
+            value: If specified, return coordinates of voxels with this value
+
+        Returns:
+            world_coords: Coordinates in the world frame, shape (N, 3)
+        """
+        indices = self.get_indices_with_state(value)
+        world_coords_sim = self.origin + indices * self.voxel_size
+        if in_slam_world:
+            return world_coords_sim @ self.sim2slam[:3, :3].T + self.sim2slam[:3, 3]
+        return world_coords_sim
+
+    def export_dense_grid(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        """ materialize a dense voxel state grid over the allocated blocks (or the bounding box if given)
+
+        Returns:
+            Tuple:
+                - occupancy_grid (torch.Tensor, [D,H,W]): int8 voxel states
+                - origin (torch.Tensor, [3]): location of voxel (0,0,0) of the dense grid in Sim space
+        """
+        B = self.block_size
+        block_coords = self.block_coords[:self.num_blocks]
+        if self.grid_dims is not None:
+            idx_min = torch.zeros(3, dtype=torch.long, device=self.device)
+            dims = self.grid_dims
+        elif self.num_blocks > 0:
+            idx_min = block_coords.min(dim=0)[0] * B
+            dims = (block_coords.max(dim=0)[0] + 1) * B - idx_min
+        else:
+            idx_min = torch.zeros(3, dtype=torch.long, device=self.device)
+            dims = torch.ones(3, dtype=torch.long, device=self.device)
+
+        occupancy_grid = torch.full(tuple(dims.tolist()), self.UNKNOWN, dtype=torch.int8, device=self.device)
+        if self.num_blocks > 0:
+            slot, x, y, z = torch.nonzero(self.block_states[:self.num_blocks] != self.UNKNOWN, as_tuple=True)
+            indices = block_coords[slot] * B + torch.stack([x, y, z], dim=1) - idx_min
+            inside_mask = ((indices >= 0) & (indices < dims)).all(dim=1)
+            indices = indices[inside_mask]
+            occupancy_grid[indices[:, 0], indices[:, 1], indices[:, 2]] = self.block_states[slot, x, y, z][inside_mask]
+        return occupancy_grid, self.origin + idx_min * self.voxel_size
+
+    @property
+    def occupancy_grid(self) -> torch.Tensor:
+        """ dense copy of the voxel states, see export_dense_grid(). Prefer the sparse accessors """
+        return self.export_dense_grid()[0]
+
+    def memory_report(self) -> Dict:
+        """ report memory footprint of the map buffers
+
+        Returns:
+            report (Dict): buffer sizes (MB), voxel state counts, and float32 dense-grid equivalent (MB)
+        """
+        def size_mb(t):
+            return 0. if t is None else t.element_size() * t.nelement() / 1024 ** 2
+
+        blocks = self.block_states[:self.num_blocks]
+        block_coords = self.block_coords[:self.num_blocks]
+        if self.num_blocks > 0:
+            extent = ((block_coords.max(dim=0)[0] - block_coords.min(dim=0)[0] + 1) * self.block_size).tolist()
+        else:
+            extent = [0, 0, 0]
+        report = {
+            "num_blocks": self.num_blocks,
+            "block_capacity": self.block_coords.shape[0],
+            "allocated_extent": extent,
+            "block_states (MB)": size_mb(self.block_states),
+            "dist_field (MB)": size_mb(self.dist_field),
+            "block_frontier (MB)": size_mb(self.block_frontier),
+            "block_index (MB)": size_mb(self.block_coords) + size_mb(self.block_keys_sorted) + size_mb(self.block_slots_sorted),
+            "free_change_log (MB)": sum(size_mb(t) for t in self.free_change_log),
+            "levels (MB)": sum(size_mb(t) for level in self.levels.values() for t in level.values()),
+            "float32_grid_equivalent (MB)": float(np.prod(extent)) * 4 / 1024 ** 2,
+            "num_occupied": int((blocks == self.OCCUPIED).sum()),
+            "num_free": int((blocks == self.FREE).sum()),
+            "num_neglected": int((blocks == self.NEGLECTED).sum()),
+            "num_frontier": int(self.block_frontier[:self.num_blocks].sum()),
+        }
+        report["total (MB)"] = report["block_states (MB)"] + report["dist_field (MB)"] + report["block_frontier (MB)"] + report["block_index (MB)"] + report["free_change_log (MB)"] + report["levels (MB)"]
+        return report
+
+    ##################################################
+    ### serialization
+    ##################################################
+    def get_map_state(self) -> Dict:
+        """ allocated blocks to persist. Derived coarse levels are rebuilt on load
+
+        Returns:
+            state (Dict): name -> torch.Tensor
+        """
+        n = self.num_blocks
+        state = {
+            "block_coords": self.block_coords[:n],
+            "block_states": self.block_states[:n],
+            "block_frontier": self.block_frontier[:n],
+            "free_change_log": torch.cat(self.free_change_log) if len(self.free_change_log) > 0 else torch.zeros(0, 3, dtype=torch.long),
+        }
+        if self.dist_field is not None:
+            state["dist_field"] = self.dist_field[:n]
+        return state
+
+    def set_map_state(self, state: Dict) -> None:
+        """ restore allocated blocks from get_map_state() and rebuild the block index
+
+        Args:
+            state (Dict): name -> torch.Tensor
+        """
+        n = state["block_coords"].shape[0]
+        self.init_blocks(max(n, 1))
+        self.block_coords[:n] = state["block_coords"].to(self.device)
+        self.block_states[:n] = state["block_states"].to(self.device)
+        self.block_frontier[:n] = state["block_frontier"].to(self.device)
+        if "dist_field" in state:
+            self.dist_field = self.create_dist_field()
+            self.dist_field[:n] = state["dist_field"].to(self.device)
+        else:
+            self.dist_field = None
+        self.num_blocks = n
+        self.block_keys_sorted, order = torch.sort(self.block_keys(self.block_coords[:n]))
+        self.block_slots_sorted = torch.arange(n, device=self.device)[order]
+        self.free_change_log = [state["free_change_log"].to(self.device)]
+        self.rebuild_levels()
+
+    def get_map_meta(self) -> Dict:
+        """ JSON-serializable metadata required to rebuild the map
+
+        Returns:
+            meta (Dict): map class, grid geometry, transform and options
+        """
+        meta = super().get_map_meta()
+        meta["init_kwargs"] = {"block_size": self.block_size}
+        return meta
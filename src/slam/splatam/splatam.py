@@ -23,6 +23,7 @@ from src.slam.slam_model import SlamModel
 from src.slam.splatam.eval_helper import eval, report_progress
 from src.utils.general_utils import InfoPrinter
 from src.slam.splatam.exploration_map import ExplorationMap
+from src.slam.splatam.sparse_exploration_map import SparseExplorationMap
 
 from third_party.splatam.utils.slam_external import calc_psnr
 
@@ -33,7 +34,8 @@ from scripts.splatam import initialize_first_timestep, get_dataset, initialize_c
 from datasets.gradslam_datasets import (load_dataset_config,)
 from utils.recon_helpers import setup_camera
 from utils.slam_helpers import (
-    matrix_to_quaternion, transform_to_frame, transformed_params2rendervar, transformed_params2depthplussilhouette
+    matrix_to_quaternion, transform_to_frame, transformed_params2rendervar, transformed_params2depthplussilhouette, get_depth_and_silhouette,
+    quat_mult
 )
 from utils.keyframe_selection import keyframe_selection_overlap
 from utils.slam_external import calc_ssim, build_rotation, prune_gaussians, densify
@@ -122,18 +124,53 @@ class SplatamOurs(SlamModel):
             sim2slam: transformation that transform points from simulation coordinate system to SplaTAM system
     
         Attributes:
-            explr_map (ExplorationMap)
+            explr_map (ExplorationMap): dense grid, or SparseExplorationMap if slam.explr_map_backend is "sparse"
+            explr_map_frame_buffer (List): buffered (depth, c2w) since the last map update
             
         """
-        self.explr_map = ExplorationMap(
-            self.slam_cfg.bbox_bound, 
-            self.slam_cfg.bbox_voxel_size, 
-            self.device, 
-            sim2slam,
+        explr_map_kwargs = dict(
             use_xyz_filter=True, 
             xy_sampling_step=self.main_cfg.planner.xy_sampling_step[0], 
-            gs_z_levels=self.main_cfg.planner.gs_z_levels[0]
-            )
+            gs_z_levels=self.main_cfg.planner.gs_z_levels[0],
+            use_dist_field=self.slam_cfg.get("use_dist_field", True),
+            dist_field_trunc=self.slam_cfg.get("dist_field_trunc", self.slam_cfg.surface_dist_thre),
+            level_steps=self.main_cfg.planner.xy_sampling_step if self.slam_cfg.get("explr_map_use_levels", True) else None,
+        )
+        explr_map_backend = self.slam_cfg.get("explr_map_backend", "dense")
+        if explr_map_backend == "dense":
+            self.explr_map = ExplorationMap(
+                self.slam_cfg.bbox_bound, 
+                self.slam_cfg.bbox_voxel_size, 
+                self.device, 
+                sim2slam,
+                **explr_map_kwargs
+                )
+        elif explr_map_backend == "sparse":
+            ### bounding box is optional for the sparse backend ###
+            self.explr_map = SparseExplorationMap(
+                self.slam_cfg.get("bbox_bound", None), 
+                self.slam_cfg.bbox_voxel_size, 
+                self.device, 
+                sim2slam,
+                block_size=self.slam_cfg.get("explr_map_block_size", 8),
+                **explr_map_kwargs
+                )
+        else:
+            raise NotImplementedError(f"Exploration map backend [{explr_map_backend}] is not implemented.")
+        self.explr_map_frame_buffer = []
+
+    def save_explr_map_snapshot(self, step: int) -> None:
+        """ save the exploration map next to the SplaTAM checkpoints every slam.explr_map_snapshot_interval steps.
+        Reload with ExplorationMap.load() (or SparseExplorationMap.load()) for offline replay.
+
+        Args:
+            step (int): planning step
+        """
+        interval = self.slam_cfg.get("explr_map_snapshot_interval", 0)
+        if interval <= 0 or step % interval != 0:
+            return
+        snapshot_dir = os.path.join(self.config["workdir"], self.config["run_name"], "explr_map", f"{step:04}")
+        self.explr_map.save(snapshot_dir)
 
     def load_params(self, stage="final"):
         """ load checkpoint parameters
@@ -368,6 +405,25 @@ class SplatamOurs(SlamModel):
         self.intrinsics = intrinsics
         self.first_frame_w2c = first_frame_w2c
         self.cam = cam
+        self.explore_cams = {}
+
+    def get_explore_cam(self, scale: float):
+        """ get (and cache) a downscaled copy of the canonical camera for low-resolution proxy renders
+    
+        Args:
+            scale (float): image scale w.r.t. the canonical camera
+    
+        Returns:
+            explore_cam: camera with scaled resolution and intrinsics
+        """
+        if scale not in self.explore_cams:
+            H, W = self.cam.image_height, self.cam.image_width
+            h, w = max(1, round(H * scale)), max(1, round(W * scale))
+            explore_intrinsics = self.intrinsics.clone()
+            explore_intrinsics[0] *= w / W
+            explore_intrinsics[1] *= h / H
+            self.explore_cams[scale] = setup_camera(w, h, explore_intrinsics.cpu().numpy(), self.first_frame_w2c.detach().cpu().numpy())
+        return self.explore_cams[scale]
 
     def initialize_cam_params(self, num_frames):# num_frames: int
         '''
@@ -396,49 +452,58 @@ class SplatamOurs(SlamModel):
             c2w: [4,4]. camera-to-world pose, in SplaTAM system
         
         Returns:
-            im: (H,W,3) # render image
-            depth: (H,W) # render depth
-            mask: (H,W) valid rendering mask
+            im: (3,H,W) # render image
+            depth: (1,H,W) # render depth
+            mask: (1,H,W) valid rendering mask
         '''
-        cam = self.cam
-        first_frame_w2c = self.first_frame_w2c
-        gt_w2c = torch.linalg.inv(c2w)
-        cam_params = self.initialize_cam_params(1)
-        sil_thres = self.config['mapping']['sil_thres']
-        with torch.no_grad():
-            # Get the ground truth pose relative to frame 0
-            rel_w2c = gt_w2c
-            rel_w2c_rot = rel_w2c[:3, :3].unsqueeze(0).detach()
-            rel_w2c_rot_quat = matrix_to_quaternion(rel_w2c_rot)
-            rel_w2c_tran = rel_w2c[:3, 3].detach()
-            # Update the camera parameters
-            cam_params['cam_unnorm_rots'][..., 0] = rel_w2c_rot_quat
-            cam_params['cam_trans'][..., 0] = rel_w2c_tran
+        ims, depths, valid_depth_masks = self.render_batch(c2w.unsqueeze(0))
+        return ims[0], depths[0], valid_depth_masks[0]
 
-        params = self.params
-        cam_trans_og = self.params['cam_trans']
-        cam_rot_og = self.params['cam_unnorm_rots']
-        params['cam_trans'] = cam_params['cam_trans']
-        params['cam_unnorm_rots'] = cam_params['cam_unnorm_rots']
-        transformed_gaussians = transform_to_frame(params, 0,
-                                                   gaussians_grad=False,
-                                                   camera_grad=False)
-
-        # Initialize Render Variables
-        rendervar = transformed_params2rendervar(params, transformed_gaussians)
-        depth_sil_rendervar = transformed_params2depthplussilhouette(params, first_frame_w2c, 
-                                                                     transformed_gaussians)
-    
-        im, _, _, = Renderer(raster_settings=cam)(**rendervar)
-        depth_sil, _, _, = Renderer(raster_settings=cam)(**depth_sil_rendervar)
-        rastered_depth = depth_sil[0, :, :].unsqueeze(0)
-        valid_depth_mask = (depth_sil[0:1] > 0)
-        silhouette = depth_sil[1, :, :]
-        presence_sil_mask = (silhouette > sil_thres)
+    @torch.no_grad()
+    def render_batch(self, c2ws: torch.Tensor, cam = None) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        ''' render rgb, mask, and depth for a batch of poses.
+        View-independent Gaussian attributes (opacities, scales, colors) are prepared once and shared by all views;
+        the Gaussian centers and the depth/silhouette colors are recomputed per view, and so are the rotations of
+        anisotropic Gaussians (see transform_to_frame()). Isotropic Gaussians share their rotations as well.
+        The rasterizer itself still runs once per view (color and depth/silhouette passes); only the per-view parameter 
+        preparation is shared, and the output matches render() pose by pose.
 
-        self.params['cam_trans'] = cam_trans_og
-        self.params['cam_unnorm_rots'] = cam_rot_og
-        return im, rastered_depth, valid_depth_mask
+        Args:
+            c2ws: [V,4,4]. camera-to-world poses, in SplaTAM system
+            cam: raster settings, e.g. get_explore_cam(). Canonical camera if None
+        
+        Returns:
+            ims: (V,3,H,W) # render images
+            depths: (V,1,H,W) # render depths
+            valid_depth_masks: (V,1,H,W) valid rendering masks
+        '''
+        cam = self.cam if cam is None else cam
+        first_frame_w2c = self.first_frame_w2c
+        w2cs = torch.linalg.inv(c2ws)
+        means3D = self.params['means3D'].detach()
+        unnorm_rots = self.params['unnorm_rotations'].detach()
+        transform_rots = self.params['log_scales'].shape[1] != 1 # Anisotropic Gaussians
+
+        ### shared render variables ###
+        rendervar = transformed_params2rendervar(self.params, {'means3D': means3D, 'unnorm_rotations': unnorm_rots})
+        norm_rots = F.normalize(unnorm_rots)
+
+        ims, depths = [], []
+        for w2c in w2cs:
+            transformed_pts = means3D @ w2c[:3, :3].T + w2c[:3, 3]
+            view_rendervar = dict(rendervar, means3D=transformed_pts)
+            if transform_rots:
+                cam_rot = F.normalize(matrix_to_quaternion(w2c[:3, :3].unsqueeze(0)))
+                view_rendervar['rotations'] = F.normalize(quat_mult(cam_rot, norm_rots))
+            im, _, _, = Renderer(raster_settings=cam)(**view_rendervar)
+            depth_sil_colors = get_depth_and_silhouette(transformed_pts, first_frame_w2c)
+            depth_sil, _, _, = Renderer(raster_settings=cam)(**dict(view_rendervar, colors_precomp=depth_sil_colors))
+            ims.append(im)
+            depths.append(depth_sil[0:1])
+        ims = torch.stack(ims)
+        depths = torch.stack(depths)
+        valid_depth_masks = depths > 0
+        return ims, depths, valid_depth_masks
 
     def plot_render_depth(self, c2w: torch.Tensor):
         """ plot rendered depth at the given pose
@@ -597,6 +662,7 @@ class SplatamOurs(SlamModel):
                            force_map_update: bool = False,
                          ) -> List         : 
         ''' Run one step of the co-slam process.
+        Frames between map updates are buffered and fused together at the next map update (if slam.explr_map_batch_frames).
 
         Args:
             time_idx        : Current frame step
@@ -606,18 +672,43 @@ class SplatamOurs(SlamModel):
         
         Attributes:
             explr_map: update exploration map
+            explr_map_frame_buffer (List): buffered (depth, c2w) since the last map update
         '''
         config = self.config
         depth = depth.to(self.device)
         c2w = c2w.to(self.device)
+        if self.slam_cfg.get("explr_map_batch_frames", True):
+            self.explr_map_frame_buffer.append((depth, c2w))
+
         if time_idx == 0 or (time_idx+1) % config['map_every'] == 0 or force_map_update:
-            self.explr_map.update_from_depth_map(
-                depth, 
-                self.intrinsics, 
-                torch.inverse(c2w),
-                self.slam_cfg.surface_dist_thre,
-                self.slam_cfg.get("find_free_indices_bs", 10000)
-                )
+            integration_kwargs = dict(
+                integration_mode=self.slam_cfg.get("explr_map_integration", "projection"),
+                ray_pixel_stride=self.slam_cfg.get("explr_map_ray_stride", 4),
+                ray_max_range=self.slam_cfg.get("explr_map_ray_max_range", None),
+            )
+            if len(self.explr_map_frame_buffer) > 0:
+                depths = torch.stack([i[0] for i in self.explr_map_frame_buffer])
+                c2ws = torch.stack([i[1] for i in self.explr_map_frame_buffer])
+                self.explr_map_frame_buffer = []
+                self.explr_map.update_from_depth_maps(
+                    depths, 
+                    self.intrinsics, 
+                    torch.inverse(c2ws),
+                    self.slam_cfg.surface_dist_thre,
+                    self.slam_cfg.get("find_free_indices_bs", 10000),
+                    self.slam_cfg.get("explr_map_frustum_culling", True),
+                    **integration_kwargs
+                    )
+            else:
+                self.explr_map.update_from_depth_map(
+                    depth, 
+                    self.intrinsics, 
+                    torch.inverse(c2w),
+                    self.slam_cfg.surface_dist_thre,
+                    self.slam_cfg.get("find_free_indices_bs", 10000),
+                    self.slam_cfg.get("explr_map_frustum_culling", True),
+                    **integration_kwargs
+                    )
             
             ## FIXME: debug visualization ##
             # self.explr_map.visualize(time_idx, in_slam_world=False)
@@ -839,10 +930,15 @@ class SplatamOurs(SlamModel):
                     densify_curr_data = curr_data
 
                 # Add new Gaussians to the scene based on the Silhouette
+                pre_num_pts = params['means3D'].shape[0]
                 params, variables = add_new_gaussians(params, variables, densify_curr_data, 
                                                       config['mapping']['sil_thres'], time_idx,
                                                       config['mean_sq_dist_method'], config['gaussian_distribution'])
                 post_num_pts = params['means3D'].shape[0]
+
+                ### log the new Gaussians as a map change (invalidates cached exploration I.G.) ###
+                if getattr(self, "explr_map", None) is not None:
+                    self.explr_map.log_changed_points(params['means3D'][pre_num_pts:].detach())
                 if config['use_wandb']:
                     wandb_run.log({"Mapping/Number of Gaussians": post_num_pts,
                                    "Mapping/step": wandb_time_step})